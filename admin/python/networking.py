@@ -1,4 +1,5 @@
 from rkweb.auth import perm_required
+from rkweb.config import WebConfig
 from rkweb.flaskutils import Blueprint, respond
 from rkweb.protoflask import args_to_proto, proto_to_dict
 from rkweb.rkserver import ServerConn, ExcryptMsg
@@ -53,6 +54,8 @@ def define_set(blp):
 
         # Forward to microservice
         await NetworkingIfx.send(msg, None)
+        # The valid origins follow the addresses
+        WebConfig.invalidate()
         respond(200)
 
 def define_vrrp_devices(blp):
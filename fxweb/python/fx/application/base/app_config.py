@@ -61,6 +61,7 @@ class AppConfig(ConfigParser):
 
         self.__jwt_headers = ['Authorization']
         self.__api_key_headers = ['X-API-Key']
+        self.__database = None
 
     def get_app_options(self, fields):
         """
@@ -131,11 +132,21 @@ class AppConfig(ConfigParser):
     @property
     def jwt_headers(self):
         """Get a copy of the JWT header list"""
+        if self.__database is not None:
+            try:
+                self.__jwt_headers = self.__database.get_jwt_headers()
+            except psycopg2.Error as e:
+                Log.warn(f"Failed to reload JWT headers: {e}")
         return self.__jwt_headers[:]
 
     @property
     def api_key_headers(self):
         """Get a copy of the API Key header list"""
+        if self.__database is not None:
+            try:
+                self.__api_key_headers = self.__database.get_api_key_headers()
+            except psycopg2.Error as e:
+                Log.warn(f"Failed to reload API key headers: {e}")
         return self.__api_key_headers[:]
 
     @property
@@ -174,6 +185,8 @@ class AppConfig(ConfigParser):
         if database is not None:
             self.__jwt_headers = database.get_jwt_headers()
             self.__api_key_headers = database.get_api_key_headers()
+            # Reloaded from the database's cache when they are used, so changes apply without a restart
+            self.__database = database
 
     # Global configuration instance
     __config_instance = None
@@ -125,23 +125,22 @@ def check_token(request_token):
 
 # Bridge async rkweb with sync fxweb
 import asyncio
-import datetime
 import threading
 class RkWebConfigInit:
-    last_update = None
     lock = threading.Lock()
     def init() -> None:
+        # WebConfig decides when it is due for a refresh
+        if WebConfig.fresh():
+            return None
         try:
             RkWebConfigInit.lock.acquire()
-            # Only refresh once every 5 minutes
-            if RkWebConfigInit.last_update and (RkWebConfigInit.last_update + datetime.timedelta(minutes=5)) > datetime.datetime.utcnow():
-                return None
             try:
                 loop = asyncio.get_event_loop()
             except:
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
-            coro = WebConfig.get_origins()
+            # Nothing keeps this loop running between requests, so wait for the refresh here
+            coro = WebConfig.ensure_fresh()
             loop.run_until_complete(coro)
         finally:
             RkWebConfigInit.lock.release()
@@ -16,25 +16,155 @@ Wrapper for database connections
 """
 
 import contextlib
+import os
+import time
+
+import gevent.lock
 import psycopg2
+from gevent.socket import wait_read, wait_write
+from psycopg2 import extensions
+
+# Connections each process keeps open to a database
+DB_POOL_SIZE = 4
+# Seconds a pooled connection may sit idle before it is checked again before use
+DB_HEALTH_CHECK_AFTER = 30
+
+
+def gevent_wait_callback(connection, timeout=None):
+    '''
+    Waits on a psycopg2 connection through the gevent hub. psycopg2 calls it whenever
+    connecting or a query would block, so other greenlets run in the meantime
+    '''
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(connection.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(connection.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError('Bad result from poll: {}'.format(state))
+
+
+# psycopg2 otherwise blocks the whole process, the hub included, on every connect and query
+extensions.set_wait_callback(gevent_wait_callback)
+
+
+class ConnectionPool(object):
+    '''
+    Pool of open database connections shared by the greenlets of a process.
+
+    At most max_size connections are in use at once, other greenlets wait for one to be
+    returned. Greenlets waiting on a query let the others run through gevent_wait_callback,
+    so a slow query holds up only its own request. Connections idle for longer than health_check_after seconds are checked
+    before they are handed out, and broken ones are closed and replaced.
+    '''
+    def __init__(self, connect, max_size=DB_POOL_SIZE, health_check_after=DB_HEALTH_CHECK_AFTER):
+        self.connect = connect
+        self.max_size = max_size
+        self.health_check_after = health_check_after
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.idle = []  # (connection, idle since)
+        self.slots = gevent.lock.BoundedSemaphore(self.max_size)
+
+    def _check_fork(self):
+        # Connections opened by the parent process must not be used by its children
+        if self.pid != os.getpid():
+            self._reset()
+
+    @contextlib.contextmanager
+    def connection(self):
+        '''
+        Yields a connection, returning it to the pool afterwards unless it broke
+        '''
+        self._check_fork()
+        with self.slots:
+            connection = self._take()
+            try:
+                yield connection
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._close(connection)
+                raise
+            finally:
+                if not connection.closed:
+                    self.idle.append((connection, time.monotonic()))
+
+    def _take(self):
+        now = time.monotonic()
+        while self.idle:
+            connection, since = self.idle.pop()
+            if connection.closed:
+                continue
+            if now - since < self.health_check_after or self._healthy(connection):
+                return connection
+            self._close(connection)
+        return self.connect()
+
+    @staticmethod
+    def _healthy(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def close(self):
+        '''
+        Close the idle connections
+        '''
+        while self.idle:
+            self._close(self.idle.pop()[0])
+
+
+# (connect, db_name, user_name) -> ConnectionPool
+_pools = {}
+
 
 class AppDatabase(object):
     '''
     Base class wrapper for making database connections
     using psycopg2
     '''
-    def __init__(self, db_name="postgres", user_name="postgres", app_name="ra"):
+    def __init__(self, db_name="postgres", user_name="postgres", app_name="ra", connect=None):
         self.db_name = db_name
         self.user_name = user_name
         self.app_name = app_name
+        self.connect = connect or psycopg2.connect
+
+    @property
+    def pool(self):
+        '''
+        The connection pool shared by every AppDatabase for this database and user
+        '''
+        key = self.connect, self.db_name, self.user_name
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                lambda: self.connect(dbname=self.db_name, user=self.user_name))
+        return pool
 
     @contextlib.contextmanager
     def db_connection(self):
         '''
-        Yields a cursor to the database
+        Yields a cursor to the database, the queries made with it are one transaction
         '''
-        with psycopg2.connect(dbname=self.db_name, user=self.user_name) as connection:
-            yield connection.cursor()
+        with self.pool.connection() as connection:
+            with connection:
+                with connection.cursor() as cursor:
+                    yield cursor
 
     def db_query(self, query, query_params):
         '''
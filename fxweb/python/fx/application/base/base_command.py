@@ -15,8 +15,12 @@ Copyright by:  Futurex, LP. 2020
 Interface for using Excrypt commands with a "Translator"
 """
 
-from functools import lru_cache
-from typing import Hashable
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from flask import g, has_request_context
+from flask_login import current_user
 
 from lib.utils.data_structures import ExcryptMessage
 
@@ -62,35 +66,114 @@ class BaseCommand:
         return response
 
 
+class CommandCache:
+    """
+    Size bounded LRU cache of command results, each kept for its command's time to live.
+
+    Results are keyed by command name, server interface, auth scope and request data, and can be
+    invalidated by any of the first three.
+    """
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.entries: 'OrderedDict[tuple, Tuple[float, dict]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, response = entry
+            if time.monotonic() < expires:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return response
+            del self.entries[key]
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def set(self, key: tuple, response: dict, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, name: str = None, server_interface=None, scope: Hashable = None) -> int:
+        """
+        Drop cached results, limited to the given command name, server interface and/or auth scope
+        """
+        stale = [key for key in self.entries
+                 if (name is None or key[0] == name)
+                 and (server_interface is None or key[1] is server_interface)
+                 and (scope is None or key[2] == scope)]
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+command_cache = CommandCache()
+
+
 class CachedCommandMixin:
     """
     Mixin class to cache command results.
 
-    Maintains LRU cache on distinct calls to send() for each derived class.
+    Successful results are kept in command_cache for cache_ttl seconds, separately for each
+    server interface and authenticated user. Commands which change what a cached command returns
+    should call invalidate_cached() with its name once they succeed.
     """
 
-    class SameHash:
+    cache_ttl = 300
+
+    def cache_scope(self) -> Hashable:
         """
-        Utility class to clobber dicts.
+        The auth context the result is cached for, None outside of a request
         """
-
-        def __init__(self, this):
-            self.this = this
-        def __hash__(self):
-            return id(self.this.__class__)
-        def __eq__(self, other):
-            same_class = isinstance(other.this, self.this.__class__)
-            same_interface = other.this.server_interface is self.this.server_interface
-            return same_class and same_interface # don't clobber other Commands
-
-    @classmethod
-    @lru_cache()
-    def _cached_send(cls, args: SameHash, data: Hashable) -> dict:
-        # bind to the 'self' hidden from lru_cache and restore data:
-        return super(CachedCommandMixin, args.this).send(dict(data))
+        if not has_request_context():
+            return None
+        jwt = getattr(g, 'jwt', None)
+        if jwt is not None:
+            return 'jwt', jwt
+        context = getattr(current_user, 'context', None)
+        return 'context', getattr(context, 'token', None)
 
     def send(self, data):
-        return self.__class__._cached_send(
-            CachedCommandMixin.SameHash(self), # need to masquerade as a singleton
-            frozenset(data.items()) # need to make data dict hashable
-            )
+        try:
+            # the registered name, commands may change self.name to the AO tag they send
+            key = (type(self).name, self.server_interface, self.cache_scope(), frozenset(data.items()))
+        except TypeError:  # unhashable request values
+            return super().send(data)
+
+        response = command_cache.get(key)
+        if response is None:
+            response = super().send(data)
+            if response.get('AN', 'Y') == 'Y':  # don't hold on to failures
+                command_cache.set(key, response, self.cache_ttl)
+        return response
+
+    @staticmethod
+    def invalidate_cached(name: str, server_interface=None) -> int:
+        """
+        Drop the cached results of a command, for every user or only one server interface
+        """
+        return command_cache.invalidate(name=name, server_interface=server_interface)
@@ -14,11 +14,16 @@ Copyright by:  Futurex, LP. 2020
 @section DESCRIPTION
 Interface for translating HTTP requests to commands
 """
+import contextvars
+import time
 import typing
 from functools import partial, reduce
+from types import FunctionType
 
+import gevent
 from werkzeug.datastructures import MultiDict
 
+from application_log import ApplicationLogger as Log
 from base.base_exceptions import SerializationError
 from lib.utils.data_structures import ExcryptMessage, ExcryptMessageResponse
 from lib.utils.container_filters import dot_notation_get
@@ -85,7 +90,13 @@ class BaseTranslator(object):
         # Default result is the un-translated request
         result = request
 
-        if self.request_map is not None:
+        plan = self._compiled_map('request', self.request_map, _compile_request_field)
+        if plan is not None:
+            result = self._output_type()
+            for translate_field in plan:
+                translate_field(request, result)
+
+        elif self.request_map is not None:
             result = self._output_type()
 
             for json_key in self.request_map:
@@ -124,7 +135,13 @@ class BaseTranslator(object):
         result = response
 
         # Translation is skipped if there is no map dict
-        if self.response_map is not None:
+        plan = self._compiled_map('response', self.response_map, _compile_response_field)
+        if plan is not None:
+            result = self._output_type()
+            for translate_field in plan:
+                translate_field(response, result)
+
+        elif self.response_map is not None:
             result = self._output_type()
 
             for tag in self.response_map:
@@ -161,6 +178,22 @@ class BaseTranslator(object):
     def __call__(self, request):
         return self.translate(request)
 
+    @classmethod
+    def _compiles_maps(cls):
+        """
+        Whether the maps can be run as compiled plans, which bake in the base field translation
+        """
+        return (cls._translate_field is BaseTranslator._translate_field
+                and cls._add_to_dict is BaseTranslator._add_to_dict)
+
+    def _compiled_map(self, direction, mapping, compile_field):
+        """
+        Get the compiled plan for the request or response map, None to interpret the map instead
+        """
+        if mapping is None or not self._compiles_maps():
+            return None
+        return compiled_map(type(self), direction, mapping, compile_field)
+
     # Support dot notation for dict key mapping
     def _add_to_dict(self, input_dict, accessor, value, clobber=False):
         index_dict = input_dict
@@ -214,27 +247,330 @@ class BaseTranslator(object):
         return destination, value
 
 
+# (translator class, 'request' or 'response') -> [(map, compiled plan)], most recently used first
+_compiled_maps: typing.Dict[typing.Tuple[type, str], typing.List[tuple]] = {}
+_COMPILED_MAPS_PER_CLASS = 8
+# (translator class, 'request' or 'response') whose maps are bound to each instance
+_uncompiled_maps: typing.Set[typing.Tuple[type, str]] = set()
+
+
+def compiled_map(cls, direction, mapping, compile_field):
+    """
+    Get the compiled plan for a translator's request or response map, compiling it on first use.
+
+    Translators build their maps in __init__, once per request, so plans are kept per class and
+    reused for any map that translates the same way as the one they were compiled from. Maps using
+    the instance's own methods never do, those return None and are interpreted.
+    """
+    key = cls, direction
+    if key in _uncompiled_maps:
+        return None
+    plans = _compiled_maps.setdefault(key, [])
+    for position, (source, plan) in enumerate(plans):
+        if source is mapping or source == mapping or _same_map(source, mapping):
+            if position:
+                plans.insert(0, plans.pop(position))
+            return plan
+        if source.keys() == mapping.keys():  # same fields translated differently by each instance
+            _uncompiled_maps.add(key)
+            del _compiled_maps[key]
+            return None
+
+    plan = [compile_field(field, map_to) for field, map_to in mapping.items()]
+    plans.insert(0, (mapping, plan))
+    del plans[_COMPILED_MAPS_PER_CLASS:]
+    return plan
+
+
+def _same_map(a, b):
+    return len(a) == len(b) and all(field in b and _same_map_value(map_to, b[field]) for field, map_to in a.items())
+
+
+def _same_map_value(a, b):
+    """
+    Whether two map values translate the same way, allowing for lambdas and partials recreated by each __init__
+    """
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all(map(_same_map_value, a, b))
+    if isinstance(a, partial):
+        return (_same_map_value(a.func, b.func) and _same_map_value(a.args, b.args)
+                and _same_map(a.keywords, b.keywords))
+    if isinstance(a, FunctionType):
+        return (a.__code__ is b.__code__ and a.__globals__ is b.__globals__
+                and a.__defaults__ == b.__defaults__ and a.__kwdefaults__ == b.__kwdefaults__
+                and _same_cells(a.__closure__, b.__closure__))
+    return a == b
+
+
+def _same_cells(a, b):
+    if a is None or b is None:
+        return a is b
+    try:
+        return len(a) == len(b) and all(x.cell_contents is y.cell_contents for x, y in zip(a, b))
+    except ValueError:  # empty cell
+        return False
+
+
+# Kinds of parser in a map value tuple
+_FIXED, _CALL, _LOOKUP, _UNSUPPORTED = 'fixed', 'call', 'lookup', 'unsupported'
+
+
+def _compile_field(field, map_to):
+    """
+    Compile one map entry into a function from the raw value to (destination, value),
+    doing what BaseTranslator._translate_field does for it
+    """
+    if callable(map_to):
+        def translate(value):
+            if value is Ellipsis:
+                return map_to, value
+            return map_to(value, field)
+        return translate
+
+    if not isinstance(map_to, tuple) or len(map_to) == 1:
+        destination = map_to[0] if isinstance(map_to, tuple) else map_to
+        return lambda value: (destination, value)
+
+    destination, *parsers = map_to
+    steps = []
+    for parser in parsers:
+        if type(parser) is str:
+            steps.append((_FIXED, parser))
+        elif callable(parser):
+            steps.append((_CALL, parser))
+        elif isinstance(parser, typing.Mapping):
+            steps.append((_LOOKUP, parser.__getitem__))
+        else:
+            steps.append((_UNSUPPORTED, parser))
+
+    if len(steps) == 1 and steps[0][0] in (_CALL, _LOOKUP):
+        parse = steps[0][1]
+
+        def translate(value):
+            if value is Ellipsis:
+                return destination, None
+            return destination, parse(value)
+        return translate
+
+    def translate(value):
+        for kind, parser in steps:
+            if kind is _FIXED:
+                value = parser  # maps to a fixed value
+            elif value is Ellipsis:
+                value = None
+                break
+            elif kind is _UNSUPPORTED:
+                raise NotImplementedError('Not a supported parser type' + repr(parser))
+            else:
+                value = parser(value)
+        return destination, value
+    return translate
+
+
+def _compile_getter(path):
+    """
+    Compile a dot notation path into a function like dot_notation_get(data, path, default=Ellipsis)
+    """
+    keys = path.split('.')
+    if len(keys) == 1:
+        key = keys[0]
+
+        def get(data):
+            try:
+                return data[key]
+            except (TypeError, LookupError):
+                return Ellipsis
+        return get
+
+    def get(data):
+        try:
+            for key in keys:
+                data = data[key]
+        except (TypeError, LookupError):
+            return Ellipsis
+        return data
+    return get
+
+
+def _add_path(result, destination, value):
+    """
+    BaseTranslator._add_to_dict without clobbering
+    """
+    if '.' not in destination:
+        result[destination] = value
+        return
+    *parents, key = destination.split('.')
+    for parent in parents:
+        if parent not in result:
+            result[parent] = {}
+        result = result[parent]
+    result[key] = value
+
+
+def _compile_request_field(json_key, map_to):
+    get = _compile_getter(json_key)
+    translate = _compile_field(json_key, map_to)
+    check_invalid = ExcryptMessage.check_invalid
+
+    def translate_field(request, result):
+        try:
+            tag, value = translate(get(request))
+        except SerializationError as e:
+            e.field_name = json_key
+            raise
+        except Exception:
+            raise SerializationError(field_name=json_key)
+        if value is None or value is Ellipsis:
+            return  # field missing from request or explicitly ignored, skip
+
+        invalid = check_invalid(value)
+        if invalid:
+            raise SerializationError(f"Invalid character '{invalid}'", json_key)
+
+        _add_path(result, tag, value)
+    return translate_field
+
+
+def _compile_response_field(tag, map_to):
+    get = _compile_getter(tag)
+    translate = _compile_field(tag, map_to)
+
+    def translate_field(response, result):
+        raw_value = get(response)
+        if raw_value is None or raw_value is Ellipsis:
+            return  # field missing from response or explicitly ignored, skip
+
+        destination, value = translate(raw_value)
+        _add_path(result, destination, value)
+    return translate_field
+
+
+class StepTiming(typing.NamedTuple):
+    command: str
+    started: float  # seconds after the pipeline started
+    seconds: float  # round trip of the command
+
+
+class CommandPipeline(object):
+    """
+    Sends the commands of a multi command translator, each once the commands it depends on answered.
+
+    Commands that don't depend on each other are in flight together. They are sent from greenlets
+    running in a copy of the request's context, over the same connection, which matches the
+    responses to them by synch tag. Responses are handled in command order.
+
+    @param commands: Names of the commands, for the step timings
+    @param dependencies: For each command, the indices of the earlier commands it depends on.
+        None makes every command depend on the one before it, sending them one at a time.
+    """
+
+    def __init__(self, commands, dependencies=None):
+        if dependencies is None:
+            dependencies = [range(i) for i in range(len(commands))]
+        if len(dependencies) != len(commands):
+            raise ValueError('Expected dependencies for each of {} commands'.format(len(commands)))
+        for i, depends_on in enumerate(dependencies):
+            if any(not 0 <= dependency < i for dependency in depends_on):
+                raise ValueError('Command {} can only depend on earlier commands'.format(i))
+        self.commands = list(commands)
+        self.dependencies = [frozenset(depends_on) for depends_on in dependencies]
+        self.timings = []
+
+    def run(self, send, receive):
+        """
+        Send every command, stopping early if a response says so
+
+        @param send: Called with a command's index to send it, returns its response
+        @param receive: Called with each command's index and response in command order,
+            returns False to stop without sending the commands that were not sent yet
+        @return: False if receive stopped the pipeline, True otherwise
+        """
+        start = time.monotonic()
+        self.timings = [None] * len(self.commands)
+        greenlets = {}
+        received = set()
+
+        def timed(i):
+            # Failures are raised from run, rather than reported by the hub as a crashed greenlet
+            started = time.monotonic()
+            try:
+                return send(i), None
+            except Exception as e:
+                return None, e
+            finally:
+                self.timings[i] = StepTiming(self.commands[i], started - start, time.monotonic() - started)
+
+        def send_ready():
+            for i, depends_on in enumerate(self.dependencies):
+                if i not in greenlets and depends_on <= received:
+                    greenlets[i] = gevent.spawn(contextvars.copy_context().run, timed, i)
+
+        try:
+            send_ready()
+            for i in range(len(self.commands)):
+                response, error = greenlets[i].get()
+                if error is not None:
+                    raise error
+                if receive(i, response) is False:
+                    return False
+                received.add(i)
+                send_ready()
+            return True
+        finally:
+            # Commands sent alongside one that failed are still answered, don't leave them dangling
+            gevent.joinall(list(greenlets.values()))
+            Log.debug('Command pipeline: {}'.format(', '.join(
+                '{} +{:.1f}ms {:.1f}ms'.format(timing.command, timing.started * 1000, timing.seconds * 1000)
+                for timing in self.timings if timing is not None)))
+
+
 class MultiCommandTranslator(BaseTranslator):
     """
     Interface for translating HTTP requests to multiple commands.
+
+    Commands are sent one after the other, unless command_dependencies lists the earlier commands
+    each one needs answered first, then independent commands are in flight together.
     """
 
+    command_dependencies = None
+
     def makeRequest(self, mw_req):
         mw_resp = ExcryptMessageResponse()
-        for category, name in zip(self.command_category, self.command_name):
-            rk_resp = self.server_interface.send_command(category, name, mw_req)
+        commands = list(zip(self.command_category, self.command_name))
+
+        def send(i):
+            return self.server_interface.send_command(*commands[i], mw_req)
+
+        def receive(i, rk_resp):
             rk_resp = self.on_receipt(rk_resp)
             mw_resp.update(rk_resp)
+
+        pipeline = CommandPipeline(self.command_name, self.command_dependencies)
+        pipeline.run(send, receive)
+        self.step_timings = pipeline.timings
         return mw_resp
 
     def on_receipt(self, response):
         """
-        Hook to handle a raw partial response before another command is issued.
+        Hook to handle a raw partial response before the commands depending on it are issued.
+        Responses are received in command order.
         """
 
         return response
 
 class SequentialTranslator(BaseTranslator):
+    """
+    Interface for translating HTTP requests to a sequence of commands, each with its own maps.
+
+    Each command is sent after the one before it succeeded, unless command_dependencies lists the
+    earlier commands each one needs answered first. Responses are translated in command order.
+    """
+
+    command_dependencies = None
 
     def __init__(self, server_interface):
         self.server_interface = server_interface
@@ -248,15 +584,27 @@ class SequentialTranslator(BaseTranslator):
         response = ExcryptMessageResponse()
         request = self.validateRequest(request)
         request = self.preprocess_request(request)
+        steps = list(zip(*zip(*self.commands), self.request_maps, self.response_maps))
+        failure = []
+
+        def send(i):
+            # Both run before the command yields to other greenlets, so no other step changes the maps
+            self.command_category, self.command_name, self.request_map, self.response_map = steps[i]
+            return self.makeRequest(self.translateRequest(request))
 
-        params = zip(*zip(*self.commands), self.request_maps, self.response_maps)
-        for self.command_category, self.command_name, self.request_map, self.response_map in params:
-            partial_request = self.translateRequest(request)
-            partial_response = self.makeRequest(partial_request)
+        def receive(i, partial_response):
+            self.command_category, self.command_name, self.request_map, self.response_map = steps[i]
             self.translateResponse(partial_response, response)
             failure_message = self.check_failure(response)
             if failure_message is not None:
-                return failure_message
+                failure.append(failure_message)
+                return False
+
+        pipeline = CommandPipeline([name for _, name in self.commands], self.command_dependencies)
+        completed = pipeline.run(send, receive)
+        self.step_timings = pipeline.timings
+        if not completed:
+            return failure[0]
 
         response = self.finalize_response(response)
         return response
@@ -58,6 +58,12 @@ class ServerConnectionTimeout(MiddlewareException):
     """
 
 
+class StreamAbortedException(MiddlewareException):
+    """
+    A streamed request was dropped because its consumer fell behind
+    """
+
+
 class InvalidMessageException(MiddlewareException):
     """
     For when an invalid message is received
@@ -103,4 +109,5 @@ CONNECTION_EXCEPTIONS = [
     InvalidExcryptMessage,
     ServerConnectionTimeout,
     NoSuchExcryptCommand,
+    StreamAbortedException,
 ]
@@ -0,0 +1,66 @@
+"""
+@file      object_stream.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Streams retrieved objects to the client as a chunked JSON response
+"""
+import json
+
+from application_log import ApplicationLogger as Log
+
+
+class ObjectStream(object):
+    """
+    Lazily serialized objectData of a retrieve response. Iterating yields the
+    same JSON document the object view would otherwise build with jsonify, but
+    each object is written out as soon as it is received from the server.
+    Objects of a manager other than the queried one are held back and written last.
+    An error raised before anything is written propagates. Once writing has started,
+    the document is completed with a Failure result and the objects received so far.
+    :param manager: Manager that was queried for
+    :param objects: Iterable of (manager name, object JSON string) pairs
+    """
+    # Message of a response that failed after it started
+    FAILURE_MESSAGE = 'Could not retrieve all objects'
+
+    def __init__(self, manager, objects):
+        self.manager = manager
+        self.objects = objects
+
+    def __iter__(self):
+        others = {}
+        objects = iter(self.objects)
+
+        # Wait for the first object so a failed request is raised before anything is written
+        item = next(objects, None)
+
+        yield '{{"objectData": {{{}: ['.format(json.dumps(self.manager))
+
+        result = '"result": "Success"'
+        separator = ''
+        try:
+            while item is not None:
+                mo_name, mo_json = item
+                if mo_name == self.manager:
+                    yield separator + json.dumps(mo_json)
+                    separator = ', '
+                else:
+                    others.setdefault(mo_name, []).append(mo_json)
+                item = next(objects, None)
+        except Exception as e:
+            Log.error('Streaming {} objects failed: {}'.format(self.manager, e))
+            result = '"result": "Failure", "message": {}'.format(json.dumps(self.FAILURE_MESSAGE))
+
+        yield ']'
+        for mo_name, mo_jsons in others.items():
+            yield ', {}: {}'.format(json.dumps(mo_name), json.dumps(mo_jsons))
+        yield '}}, {}}}'.format(result)
@@ -15,7 +15,7 @@ Copyright by:  Futurex, LP. 2016
 Base Views implementation that abstracts out URI to server interface implementation
 """
 
-from flask import request, jsonify, redirect, url_for, make_response
+from flask import request, jsonify, redirect, url_for, make_response, Response, stream_with_context
 from flask_login import current_user, logout_user
 import jsonschema
 import urllib
@@ -23,6 +23,7 @@ import urllib
 import fx
 from fx_view import FxView
 from server_request import ServerRequest
+from object_stream import ObjectStream
 from rk_login_status import LoginStatus
 from static_content_view import StaticContentView, create_static_response
 from auth import User, token_authentication, rkweb_session, rkweb_sync
@@ -77,19 +78,15 @@ class ServerTranslatedView(FxView):
         self.translator_category = translator_category
 
     def translate(self, operation, request_data, *, translator_category=None):
-        result = {}
-
-        translator_class = TranslatorFactory.get_translator(
+        translator = TranslatorFactory.translator(
             self.translator_type,
             translator_category or self.translator_category,
-            operation
+            operation,
+            self.server_interface
         )
 
-        if translator_class is not None:
-            translator_instance = translator_class(self.server_interface)
-            result = translator_instance.translate(request_data)
-
-        return result
+        with translator as translator_instance:
+            return translator_instance.translate(request_data)
 
 
 class ServerLoginView(ServerDefaultView):
@@ -304,7 +301,9 @@ class ServerObjectView(FxView):
         elif post_data["method"] == "validate":
             frontend_response = self.server_interface.validate(ServerRequest(request, post_data["objectData"]))
         else:
-            frontend_response = self.server_interface.retrieve(ServerRequest(request, None))
+            frontend_response = self.server_interface.retrieve(ServerRequest(request, None), stream=True)
+            if isinstance(frontend_response, ObjectStream):
+                return self._stream_response(frontend_response)
 
         result = 'Failure'
         message = 'Could not {} objects'.format(post_data['method'])
@@ -317,6 +316,20 @@ class ServerObjectView(FxView):
 
         return jsonify(result=result, objectData=frontend_response)
 
+    def _stream_response(self, object_stream):
+        """
+        Writes retrieved objects to the client as they are received from the server
+        """
+        chunks = iter(object_stream)
+        # Send errors are raised here, before the response has started
+        first = next(chunks)
+
+        def generate():
+            yield first
+            yield from chunks
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
     def put(self, *args, **kwargs):
         put_data = request.get_json()
 
@@ -16,14 +16,171 @@ Base View for serving static content
 """
 
 import os
+import time
 import mimetypes
+from typing import NamedTuple, Optional
 
 from fx_view import FxView
 from auth import login_required
-from flask import make_response
+from flask import make_response, request
+from werkzeug.http import http_date
 from app_config import AppConfig
 from lib.utils.response_generator import APIResponses
 
+# Seconds between checks of the web roots for added, removed or renamed files
+STATIC_INDEX_CHECK = 5
+
+
+class StaticFile(NamedTuple):
+    path: str
+    redirect: str  # X-Accel-Redirect location
+    etag: str  # the ETag nginx sends for the file, unquoted
+    mtime: int
+    last_modified: str
+    mimetype: Optional[str]
+    mtime_ns: int
+    size: int
+
+
+def _static_file(path, stat):
+    mtime = int(stat.st_mtime)
+    mime, _ = mimetypes.guess_type(path)
+    return StaticFile(
+        path=path,
+        redirect=path.replace('/var/www/', '/protected/'),
+        etag='{:x}-{:x}'.format(mtime, stat.st_size),
+        mtime=mtime,
+        last_modified=http_date(mtime),
+        mimetype=mime,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+    )
+
+
+class StaticIndex(object):
+    """
+    Index of the files under the web roots, so finding one doesn't walk the disk.
+
+    The files of each name are kept in the order os.walk finds them, so a lookup finds the
+    same file walking would. The roots are scanned again once one of their directories
+    changed, which is checked at most every check_interval seconds. Files already found
+    are checked then too, since overwriting a file doesn't change its directory.
+    """
+
+    def __init__(self, roots, check_interval=STATIC_INDEX_CHECK):
+        self.roots = list(roots)
+        self.check_interval = check_interval
+        self.checked = None
+        self.scans = 0
+        self.directories = {}  # directory -> st_mtime_ns
+        self.files = {}  # file name -> [(directory, StaticFile)]
+        self.found = {}  # (base uri, file name) -> StaticFile
+
+    def _scan(self):
+        directories = {}
+        files = {}
+        for root in self.roots:
+            # A missing root is watched for being created
+            directories[root] = None
+            for curdir, subdirs, names in os.walk(root):
+                try:
+                    directories[curdir] = os.stat(curdir).st_mtime_ns
+                except OSError:
+                    continue
+                for name in names:
+                    path = os.path.join(curdir, name)
+                    try:
+                        static_file = _static_file(path, os.stat(path))
+                    except OSError:
+                        continue
+                    files.setdefault(name, []).append((curdir, static_file))
+        self.directories, self.files, self.found = directories, files, {}
+        self.scans += 1
+
+    def _changed(self):
+        for directory, mtime in self.directories.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                if mtime is not None:
+                    return True
+        return False
+
+    def _restat_found(self):
+        """
+        Stat the files already found again, and forget the ones that were overwritten
+        """
+        for key, static_file in list(self.found.items()):
+            try:
+                stat = os.stat(static_file.path)
+            except OSError:
+                stat = None
+            if stat is not None and (stat.st_mtime_ns, stat.st_size) == (static_file.mtime_ns, static_file.size):
+                continue
+            del self.found[key]
+            name = os.path.basename(static_file.path)
+            files = []
+            for curdir, other in self.files.get(name, ()):
+                if other is static_file:
+                    if stat is None:
+                        continue
+                    other = _static_file(other.path, stat)
+                files.append((curdir, other))
+            self.files[name] = files
+
+    def refresh(self):
+        """
+        Scan the roots if they were not scanned yet, or changed since
+        """
+        self.checked = time.monotonic()
+        if not self.scans or self._changed():
+            self._scan()
+        else:
+            self._restat_found()
+
+    def find(self, base_uri, filename):
+        """Finds the protected file the user wants
+        Args:
+            base_uri: The sub directory the file should be in (Ex: 'components/')
+            filename: The exact name of the file (Ex: 'fxTemplate.js')
+
+        Returns:
+            The StaticFile of the file referenced
+            None if not found
+        """
+        if self.checked is None or time.monotonic() - self.checked >= self.check_interval:
+            self.refresh()
+
+        key = base_uri, filename
+        static_file = self.found.get(key)
+        if static_file is None:
+            # Truncate trailing '/'
+            trunc_base_uri = base_uri[:-1] if base_uri.endswith('/') else base_uri
+            static_file = next((static_file for curdir, static_file in self.files.get(filename, ())
+                                if curdir.find(trunc_base_uri) != -1), None)
+            if static_file is not None:
+                # Only files that exist, file names come from requests
+                self.found[key] = static_file
+        return static_file
+
+
+# web roots -> StaticIndex
+_static_indexes = {}
+
+
+def static_index():
+    """
+    The index of the web roots of this application
+    """
+    # Find matching file in base uri relative to var/www
+    roots = ('/var/www/' + AppConfig.server_type, '/var/www/fxweb')
+    index = _static_indexes.get(roots)
+    if index is None:
+        index = _static_indexes[roots] = StaticIndex(roots)
+    return index
+
+
 # XXX: Requires python and js to be same on nginx/python containers
 def find_file(base_uri, filename):
     """Finds the location on filesystem of the protected file the user wants
@@ -35,22 +192,22 @@ def find_file(base_uri, filename):
         The absolute filesystem path of the file referenced
         None if not found
     """
-    # Truncate trailing '/'
-    trunc_base_uri = base_uri
-    if len(trunc_base_uri) > 0 and trunc_base_uri[-1] == "/":
-        trunc_base_uri = trunc_base_uri[0:-1]
+    static_file = static_index().find(base_uri, filename)
+    return static_file.path if static_file else None
 
-    # Find matching file in base uri relative to var/www
-    for topdir in ['/var/www/' + AppConfig.server_type, '/var/www/fxweb']:
-        for curdir, subdirs, files in os.walk(topdir):
-            if not filename in files:
-                continue
-            if curdir.find(trunc_base_uri) == -1:
-                continue
 
-            return os.path.join(curdir, filename)
+def _not_modified(static_file):
+    """
+    Whether the browser's copy of the file is current, per its conditional GET headers
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(static_file.etag)
+    if request.if_modified_since:
+        return request.if_modified_since.timestamp() >= static_file.mtime
+    return False
 
-    return None
 
 def create_static_response(base_uri, filename=None, code=None):
     """Create the response for the filename
@@ -61,18 +218,21 @@ def create_static_response(base_uri, filename=None, code=None):
     Return: An HTTP response
     """
     response = None
-    filepath = find_file(base_uri, filename)
-    if not filepath:
+    static_file = static_index().find(base_uri, filename)
+    if not static_file:
         response = APIResponses.not_found("Could not locate file {} in {}".format(filename, base_uri))
+    elif code is None and _not_modified(static_file):
+        # nginx would answer the same, without the file being opened
+        response = make_response("", 304)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['ETag'] = '"{}"'.format(static_file.etag)
+        response.headers['Last-Modified'] = static_file.last_modified
     else:
-        filepath = filepath.replace('/var/www/', '/protected/')
-
         response = make_response("")
         response.headers['Cache-Control'] = 'no-cache'
-        response.headers['X-Accel-Redirect'] = filepath
-        mime, _ = mimetypes.guess_type(filepath)
-        if mime is not None:
-            response.headers['Content-Type'] = mime
+        response.headers['X-Accel-Redirect'] = static_file.redirect
+        if static_file.mimetype is not None:
+            response.headers['Content-Type'] = static_file.mimetype
 
     if code is not None:
         response.status_code = code
@@ -15,35 +15,168 @@ Copyright by:  Futurex, LP. 2020
 A factory for the translators the MethodViews look up
 """
 
-import kmes.kmes_translators
-import regauth.regauth_translators
+import contextlib
+import importlib
+import time
+from collections.abc import Mapping
+
+# Idle instances kept of each translator, per server interface
+MAX_IDLE_TRANSLATORS = 16
+
+
+class TranslatorRegistry(Mapping):
+    """
+    The translators of an application type, by category and operation.
+
+    The module mapping them is imported on the first lookup. Its map_translators can name
+    translators as strings, resolved with the module's load_translator once they are looked up,
+    so the modules defining them are only imported when they are used.
+    """
+
+    def __init__(self, module_name):
+        self.module_name = module_name
+        self.module = None
+        self.names = None
+        self.loaded = {}
+        self.load_seconds = 0.0
+
+    def _map(self):
+        if self.names is None:
+            start = time.perf_counter()
+            self.module = importlib.import_module(self.module_name)
+            self.names = self.module.map_translators()
+            self.load_seconds += time.perf_counter() - start
+        return self.names
+
+    def get_translator(self, category, operation):
+        name = self._map().get(category, {}).get(operation)
+        if not isinstance(name, str):
+            return name
+        translator = self.loaded.get(name)
+        if translator is None:
+            start = time.perf_counter()
+            translator = self.loaded[name] = self.module.load_translator(name)
+            self.load_seconds += time.perf_counter() - start
+        return translator
+
+    def __getitem__(self, category):
+        return {operation: self.get_translator(category, operation) for operation in self._map()[category]}
+
+    def __iter__(self):
+        return iter(self._map())
+
+    def __len__(self):
+        return len(self._map())
 
 
 Translators = {
-    'KMES': kmes.kmes_translators.map_translators(),
-    'RA': regauth.regauth_translators.map_translators(),
+    'KMES': TranslatorRegistry('kmes.kmes_translators'),
+    'RA': TranslatorRegistry('regauth.regauth_translators'),
 }
 
 
+class TranslatorStats(object):
+    """Counts how often a translator is constructed and reused"""
+
+    def __init__(self):
+        self.constructed = 0
+        self.construct_seconds = 0.0
+        self.reused = 0
+
+    @property
+    def hit_rate(self):
+        uses = self.constructed + self.reused
+        return self.reused / uses if uses else 0.0
+
+    def to_dict(self):
+        return dict(vars(self), hit_rate=self.hit_rate)
+
+
+class TranslatorPool(object):
+    """
+    Idle translator instances kept for reuse across requests, per class and server interface.
+
+    Translators build their maps in __init__, then keep the state of the request they translate
+    on the instance. An instance is used by one request at a time, and put back with only the
+    attributes __init__ left on it.
+    """
+
+    def __init__(self, max_idle=MAX_IDLE_TRANSLATORS):
+        self.max_idle = max_idle
+        self.idle = {}  # (class, server interface) -> [(instance, attributes after __init__)]
+        self.stats = {}  # class -> TranslatorStats
+
+    @contextlib.contextmanager
+    def acquire(self, translator_class, server_interface):
+        stats = self.stats.get(translator_class)
+        if stats is None:
+            stats = self.stats[translator_class] = TranslatorStats()
+
+        idle = self.idle.setdefault((translator_class, server_interface), [])
+        if idle:
+            translator, attributes = idle.pop()
+            stats.reused += 1
+        else:
+            start = time.perf_counter()
+            translator = translator_class(server_interface)
+            stats.construct_seconds += time.perf_counter() - start
+            stats.constructed += 1
+            attributes = dict(vars(translator))
+
+        try:
+            yield translator
+        finally:
+            state = vars(translator)
+            if state.keys() != attributes.keys() or any(state[name] is not value for name, value in attributes.items()):
+                state.clear()
+                state.update(attributes)
+            if len(idle) < self.max_idle:
+                idle.append((translator, attributes))
+
+    def clear(self):
+        self.idle.clear()
+
+
+translator_pool = TranslatorPool()
+
+
 class TranslatorFactory(object):
     @staticmethod
     def get_translator(translator_type, translator_category, translator_operation):
-        selected_translators = {}
         translator = None
 
-        # Find translator type
+        # Find translator type, then operation category and operation
         if translator_type in Translators:
-            selected_translators = Translators[translator_type]
-
-        # Find translator operation category
-        if translator_category in selected_translators:
-            selected_translators = selected_translators[translator_category]
-
-        # Find translator operation
-        if translator_operation in selected_translators:
-            translator = selected_translators[translator_operation]
+            translator = Translators[translator_type].get_translator(translator_category, translator_operation)
 
         if not translator:
             raise NotImplementedError(f'{translator_type}.{translator_category}.{translator_operation}')
 
         return translator
+
+    @staticmethod
+    def translator(translator_type, translator_category, translator_operation, server_interface):
+        """
+        Context manager yielding an instance of the translator, reused across requests
+        """
+        translator_class = TranslatorFactory.get_translator(translator_type, translator_category, translator_operation)
+        return translator_pool.acquire(translator_class, server_interface)
+
+    @staticmethod
+    def stats():
+        """
+        How often translators were reused, what constructing them cost, and how long loading
+        their modules took
+        """
+        translators = {f'{cls.__module__}.{cls.__qualname__}': stats.to_dict()
+                       for cls, stats in translator_pool.stats.items()}
+        constructed = sum(stats['constructed'] for stats in translators.values())
+        reused = sum(stats['reused'] for stats in translators.values())
+        return {
+            'hit_rate': reused / (constructed + reused) if constructed + reused else 0.0,
+            'constructed': constructed,
+            'reused': reused,
+            'translators': translators,
+            'modules': {translator_type: {'loaded': len(registry.loaded), 'load_seconds': registry.load_seconds}
+                        for translator_type, registry in Translators.items()},
+        }
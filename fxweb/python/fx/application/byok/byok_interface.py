@@ -16,14 +16,17 @@ A server interface to communicate with a Guardian
 """
 
 from multiprocessing import BoundedSemaphore
+import time
 import typing
 
 import gevent
+import gevent.lock
 from flask_login import current_user
 
 from lib.utils.container_filters import first
 from lib.utils.fx_decorators import singledispatchmethod
 from lib.utils.data_structures import ExcryptMessage
+from envelope import Envelope
 import rk_host_application.rk_host_application_server_interface as rkasi
 
 if typing.TYPE_CHECKING:
@@ -31,6 +34,11 @@ if typing.TYPE_CHECKING:
     from lib.comm.middleware_context import MiddlewareContext
     current_user: User
 
+# Seconds before a connection's roles and permissions on a cluster session are read again
+KEYSLOT_VISIBILITY_MAX_AGE = 120
+# Roles and permissions a connection has on a cluster session, they decide which key slots it is listed
+Visibility = typing.Tuple[typing.FrozenSet[str], typing.FrozenSet[str]]
+
 
 class ContextLocalData:
     """Extra data associated with an apps session"""
@@ -38,12 +46,17 @@ class ContextLocalData:
         self.keyslot_cache = {}
         self.session_cache: typing.Dict[str, bool] = {}
         self.keyslot_lock = BoundedSemaphore(1)
+        # cluster session -> (this connection's roles and permissions on it, when they were read)
+        self.keyslot_visibility: typing.Dict[str, typing.Tuple[typing.Optional[Visibility], float]] = {}
 
 
 class ByokServerInterface(rkasi.RKHostApplicationServerInterface):
     def __init__(self, program):
         super().__init__(program)
         self._context_locals: typing.Dict[str, ContextLocalData] = {}
+        # Key tables by cluster session, shared by every connection with the same roles and permissions on it
+        self._shared_keyslot_cache: typing.Dict[typing.Tuple[str, int, Visibility], 'KeyTable'] = {}
+        self._shared_keyslot_lock = gevent.lock.BoundedSemaphore(1)
 
     @property
     def _context_token(self) -> str:
@@ -60,6 +73,10 @@ class ByokServerInterface(rkasi.RKHostApplicationServerInterface):
     def _session_cache(self):
         return self._context_locals.setdefault(self._context_token, ContextLocalData()).session_cache
 
+    @property
+    def _keyslot_visibility(self):
+        return self._context_locals.setdefault(self._context_token, ContextLocalData()).keyslot_visibility
+
     @singledispatchmethod
     def send_msg(self, msg, *, context: typing.Optional['MiddlewareContext'] = None) -> typing.Any:
         raise NotImplementedError()
@@ -101,6 +118,9 @@ class ByokServerInterface(rkasi.RKHostApplicationServerInterface):
                                                 message=msg.getText(sanitized=True))
         if not isinstance(response, (str, bytes)):
             response = response[0]
+        if isinstance(response, Envelope):
+            # Already parsed by the connection handler
+            return response.message()
         return ExcryptMessage(response)
 
     @send_msg.register(str)
@@ -112,12 +132,20 @@ class ByokServerInterface(rkasi.RKHostApplicationServerInterface):
         pass
 
     def _get_key_table(self, session_id: str, key_type: int) -> 'KeyTable':
-        key_table = self._keyslot_cache.get((session_id, key_type))
-        if key_table is None:
-            from byok.utils.key_table import KeyTable
-            key_table = KeyTable(self, session_id, key_type)
-            key_table.table
-            self._keyslot_cache[(session_id, key_type)] = key_table
+        # The device group lists key slots by the connection's roles and permissions, so a cluster's
+        # key table is built once for everyone who has the same ones. If they can't be read the
+        # connection gets its own table.
+        visibility = self._session_visibility(session_id)
+        if visibility is not None:
+            cache, lock, key = self._shared_keyslot_cache, self._shared_keyslot_lock, (session_id, key_type, visibility)
+        else:
+            cache, lock, key = self._keyslot_cache, self._keyslot_lock, (session_id, key_type)
+        with lock:
+            key_table = cache.get(key)
+            if key_table is None:
+                from byok.utils.key_table import KeyTable
+                key_table = KeyTable(self, session_id, key_type)
+                cache[key] = key_table
         return key_table
 
     def query_keyslots(self, session_id: str, key_type: int, search: str, order_by: str, ascending: bool, empty: bool):
@@ -129,15 +157,57 @@ class ByokServerInterface(rkasi.RKHostApplicationServerInterface):
 
         return result
 
+    def _keyslot_caches(self):
+        return ((self._keyslot_cache, self._keyslot_lock),
+                (self._shared_keyslot_cache, self._shared_keyslot_lock))
+
     def _cleanup_keyslot_cache(self):
-        with self._keyslot_lock:
-            for session_and_type, key_table in tuple(self._keyslot_cache.items()):
-                if key_table.is_expired:
-                    del self._keyslot_cache[session_and_type]
+        for cache, lock in self._keyslot_caches():
+            with lock:
+                for session_and_type, key_table in tuple(cache.items()):
+                    if key_table.is_expired:
+                        del cache[session_and_type]
+
+    @staticmethod
+    def _cached_tables(cache, session_id: str, key_type: int):
+        """Keys of the cached tables of a cluster session, whichever roles and permissions they were built for"""
+        return [key for key in cache if key[:2] == (session_id, key_type)]
+
+    def invalidate_keyslots(self, session_id: str, key_type: int, slots: typing.Iterable[int]):
+        slots = tuple(slots)
+        for cache, lock in self._keyslot_caches():
+            with lock:
+                for key in self._cached_tables(cache, session_id, key_type):
+                    cache[key].invalidate_slots(slots)
 
     def invalidate_keyslot_cache(self, session_id: str, key_type: int):
-        with self._keyslot_lock:
-            self._keyslot_cache.pop((session_id, key_type), None)
+        # Whole tables are dropped after a logout or other session change, which may change the roles too
+        self.forget_session_visibility(session_id)
+        for cache, lock in self._keyslot_caches():
+            with lock:
+                for key in self._cached_tables(cache, session_id, key_type):
+                    del cache[key]
+
+    def forget_session_visibility(self, session_id: str):
+        """Read this connection's roles and permissions again, after it logged in or out of the cluster session"""
+        self._keyslot_visibility.pop(session_id, None)
+
+    def _session_visibility(self, session_id: str) -> typing.Optional[Visibility]:
+        """This connection's roles and permissions on a cluster session, None if they can't be read"""
+        visibility, read_at = self._keyslot_visibility.get(session_id, (None, 0))
+        if read_at + KEYSLOT_VISIBILITY_MAX_AGE < time.time():
+            response = self.send_msg(ExcryptMessage({
+                'AO': 'GDGD',
+                'OP': 'login-status',
+                'SI': session_id,
+            }))
+            if response.get('CN') in ('Y', 'C'):
+                visibility = (frozenset(filter(None, response.get('RO', '').split(','))),
+                              frozenset(filter(None, response.get('PR', '').split(','))))
+            else:
+                visibility = None
+            self._keyslot_visibility[session_id] = (visibility, time.time())
+        return visibility
 
     def session_is_gp_mode(self, session_id: str):
         gp_mode = self._session_cache.get(session_id, None)
@@ -16,15 +16,19 @@ Utilities for managing cluster key tables
 """
 
 import enum
+import json
 import sys
 import time
+from collections.abc import Sequence as SequenceABC
 from functools import partial, reduce, wraps
 from operator import attrgetter
-from typing import Any, Callable, Iterable, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 import gevent
+import gevent.lock
 from flask_login import current_user
 
+from application_log import ApplicationLogger
 from lib.utils.data_structures import ExcryptMessage
 
 from byok.models.keys import KEY_TABLE_TYPES, KeySlotSummary
@@ -152,6 +156,163 @@ class GpkmMode(enum.IntEnum):
     securityUsage = 11
 
 
+class KeyTableMetrics:
+    """Process wide counters of how key tables are refreshed"""
+
+    def __init__(self) -> None:
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.last_rebuild_seconds = 0.0
+        self.slot_refreshes = 0
+        self.slot_refresh_seconds = 0.0
+
+    def record_rebuild(self, seconds: float) -> None:
+        self.rebuilds += 1
+        self.rebuild_seconds += seconds
+        self.last_rebuild_seconds = seconds
+
+    def record_slot_refresh(self, slots: int, seconds: float) -> None:
+        self.slot_refreshes += slots
+        self.slot_refresh_seconds += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+metrics = KeyTableMetrics()
+
+
+class KeySearchResults(SequenceABC):
+    """Read-only view of matching key slots in result order, only materialized when sliced"""
+
+    def __init__(self, entries: Sequence[KeySlotSummary], positions: Sequence[int]) -> None:
+        self.entries = entries
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            entries = self.entries
+            return [entries[position] for position in self.positions[index]]
+        return self.entries[self.positions[index]]
+
+
+class KeyTableIndex:
+    """
+    Search and sort index over a key table snapshot
+
+    Substring searches of at least `ngram` characters only check the slots whose merged search
+    string contains the query's rarest indexed n-gram. The slots holding an n-gram are found the
+    first time a query contains it, indexing every n-gram up front takes hundreds of times longer
+    than one search. Orderings by each column are sorted once per snapshot and filtered instead of
+    re-sorting the results of every search.
+    """
+
+    ngram = 3
+
+    def __init__(self, table: 'OrderedDict[MergedSearchStr, KeySlotSummary]') -> None:
+        self.search_strs: List[MergedSearchStr] = list(table.keys())
+        self.entries: List[KeySlotSummary] = list(table.values())
+        self.empty = bytearray(entry.type == 'Empty' for entry in self.entries)
+
+        self.postings: Dict[str, List[int]] = {}
+        self.orderings: Dict[Tuple[str, bool, bool], List[int]] = {}
+        self.ranks: Dict[Tuple[str, bool], List[int]] = {}
+
+        # Narrow down the next search when the user adds to the query
+        self.prev_search_str = ''
+        self.prev_matches: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _posting(self, gram: str) -> List[int]:
+        posting = self.postings.get(gram)
+        if posting is None:
+            posting = [position for position, search_str in enumerate(self.search_strs) if gram in search_str]
+            self.postings[gram] = posting
+        return posting
+
+    def match(self, substr: str) -> Sequence[int]:
+        """Positions of the slots whose merged search string contains substr, in slot order"""
+        search_strs = self.search_strs
+        n = self.ngram
+
+        candidates: Sequence[int] = range(len(search_strs))
+        if self.prev_search_str and self.prev_search_str in substr:
+            candidates = self.prev_matches
+        if len(substr) >= n:
+            grams = [substr[i:i + n] for i in range(len(substr) - n + 1)]
+            postings = self.postings
+            known = [postings[gram] for gram in grams if gram in postings]
+            if not known and len(candidates) == len(search_strs):
+                # Index the query's first n-gram, later queries containing it start from there
+                known = [self._posting(grams[0])]
+            for posting in known:
+                if len(posting) < len(candidates):
+                    candidates = posting
+
+        matches = [position for position in candidates if substr in search_strs[position]]
+        self.prev_search_str, self.prev_matches = substr, matches
+        return matches
+
+    def ordering(self, order_by: str, ascending: bool, empty: bool) -> List[int]:
+        """Positions of the slots sorted by a column, in the order sorted() gives the keys"""
+        key = (order_by, ascending, empty)
+        ordering = self.orderings.get(key)
+        if ordering is None:
+            if empty:
+                getter = attrgetter(order_by)
+                entries = self.entries
+
+                def sort_key(position):
+                    # Empty slots have no value for most columns, sort them after the keys
+                    value = getter(entries[position])
+                    return value is None, value
+
+                ordering = sorted(range(len(entries)), key=sort_key, reverse=not ascending)
+            else:
+                # Stable sorts order a subset the same way they order the whole
+                is_empty = self.empty
+                ordering = [position for position in self.ordering(order_by, ascending, True)
+                            if not is_empty[position]]
+            self.orderings[key] = ordering
+        return ordering
+
+    def _rank(self, order_by: str, ascending: bool) -> List[int]:
+        key = (order_by, ascending)
+        rank = self.ranks.get(key)
+        if rank is None:
+            rank = [0] * len(self.entries)
+            for index, position in enumerate(self.ordering(order_by, ascending, True)):
+                rank[position] = index
+            self.ranks[key] = rank
+        return rank
+
+    def search(self, substr: str, order_by: str, ascending: bool, empty: bool) -> KeySearchResults:
+        """Slots matching a lowercase substring (all of them if empty), sorted by a column"""
+        if not substr:
+            return KeySearchResults(self.entries, self.ordering(order_by, ascending, empty))
+
+        matches = self.match(substr)
+        if not empty:
+            is_empty = self.empty
+            matches = [position for position in matches if not is_empty[position]]
+
+        # Filter the presorted column when most slots match, otherwise sort just the matches
+        if len(matches) * 4 > len(self.entries):
+            selected = bytearray(len(self.entries))
+            for position in matches:
+                selected[position] = 1
+            positions = [position for position in self.ordering(order_by, ascending, empty)
+                         if selected[position]]
+        else:
+            positions = sorted(matches, key=self._rank(order_by, ascending).__getitem__)
+        return KeySearchResults(self.entries, positions)
+
+
 class KeyTable:
 
     xd_tag_parsers = {
@@ -172,11 +333,17 @@ class KeyTable:
         self.dense_table_size = 25450  # assumed max key slots # for preallocated index
         self.table: OrderedDict[MergedSearchStr, KeySlotSummary] = {}
 
+        self.index = KeyTableIndex(self.table)
+
         self.max_table_age = 120  # when searching, rebuild if older than N seconds
         self.table_build_time = 0
 
-        self.prev_search_results = {}
-        self.prev_search_str = ''
+        # Slots changed through this app since the table was built, re-read before searching
+        self.stale_slots: Set[int] = set()
+        self.rebuild_count = 0
+        self.rebuild_seconds = 0.0
+        # Everyone sharing the table waits on one rebuild instead of starting their own
+        self.refresh_lock = gevent.lock.BoundedSemaphore(1)
 
     def _query_key_attrs(self, mode: GpkmMode, destination, context: 'MiddlewareContext'):
         parser = self.xd_tag_parsers[mode]
@@ -200,8 +367,10 @@ class KeyTable:
     def rebuild_table(self) -> None:
         """Repeatedly call GPKM via GDKM to fill table"""
 
+        start = time.time()
         table = self.table
         table.clear()
+        self.stale_slots.clear()
 
         # Map from an XA tag to key slot to the parsed value for that tag and slot
         destinations = {
@@ -226,53 +395,122 @@ class KeyTable:
                     setattr(entry, attr_name, value)
             # Store it under its "searchable" string
             # Preserves order, table_entries is sorted by key slot # and table is OrderedDict
-            search_str = '\0'.join(
-                ('/'.join(value) if isinstance(value, (tuple, list)) else str(value)).lower()
-                for value in vars(entry).values()
-                if value is not None
-            )
-            table[search_str] = entry
+            table[self.merged_search_str(entry)] = entry
+
+        # Search and sort orderings are built as they are first needed
+        self.index = KeyTableIndex(table)
 
         # All done, update table age
         self.table_build_time = time.time()
 
-    def search(self, substr: str, order_by: str, ascending: bool, empty: bool) -> Sequence[KeySlotSummary]:
-        """Naively search the table for a substring in one of its fields, maybe rebuild if old"""
+        elapsed = self.table_build_time - start
+        self.rebuild_count += 1
+        self.rebuild_seconds += elapsed
+        metrics.record_rebuild(elapsed)
+        ApplicationLogger.debug(f'Rebuilt key table {self.table_type} ({len(table)} slots) in {elapsed:.3f}s')
 
-        if self.is_expired:
-            self.rebuild_table()
+    def invalidate_slots(self, slots: Iterable[int]) -> None:
+        """Re-read these slots before the next search instead of rebuilding the whole table"""
+        self.stale_slots.update(slots)
 
-        # do case-insensitive search
-        substr = substr.lower()
+    @staticmethod
+    def slot_summary(slot: int, gpks: ExcryptMessage) -> Optional[KeySlotSummary]:
+        """Summarize a GPKS (read-keyslot) response like the list-keyslots pages, None if it failed"""
+        if 'CT' not in gpks:
+            return None
 
-        # maybe use a suffix array / trie for speeds instead of searching all the "merged" strings
-        # for now just cache the previous search result since the user "probably" adds one char
-        # at a time so we can narrow it down
-        if substr and self.prev_search_str and self.prev_search_str in substr:
-            search_space = self.prev_search_results
-        else:
-            search_space = self.table
-
-        if empty and not substr:
-            results = search_space
-        elif not empty and not substr:
-            results = {_: entry for _, entry in search_space.items() if entry.type != 'Empty'}
-        elif empty:
-            results = {
-                merged_search_str: entry
-                for merged_search_str, entry in search_space.items() if substr in merged_search_str
-            }
-        else:
-            results = {
-                merged_search_str: entry
-                for merged_search_str, entry in search_space.items()
-                if entry.type != 'Empty' and substr in merged_search_str
-            }
+        key_type = KEY_TYPE_CONSTS.get(gpks['CT'], 'Unknown')
+        if key_type == 'Empty':
+            return KeySlotSummary(slot=slot, type=key_type, kcv=None, label=None, modifier=None,
+                                  majorKey=None, usage=None, securityUsage=None)
+
+        entry = KeySlotSummary(slot=slot, type=key_type)
+        values = {
+            'kcv': gpks.get('AE'),
+            'label': gpks.get('LB'),
+            'modifier': int(gpks['AS']) if 'AS' in gpks else None,  # base 10, unlike GPKM
+            'majorKey': MAJOR_KEY_CONSTS.get(gpks['FS']) if 'FS' in gpks else None,
+            'usage': fw_multi_key_usage_to_name(gpks['CY']) if 'CY' in gpks else None,
+            'securityUsage': fw_multi_sec_usage_to_name(gpks['SF']) if 'SF' in gpks else None,
+        }
+        for attr_name, value in values.items():
+            if value is not None:
+                setattr(entry, attr_name, value)
+        return entry
+
+    def refresh_stale_slots(self) -> None:
+        """Patch the stale slots into the table with GPKS via GDKM, or rebuild if that fails"""
+        start = time.time()
+        slots = sorted(self.stale_slots)
+        self.stale_slots.clear()
+
+        asymmetric = '1' if self.table_type == KEY_TABLE_TYPES['asymmetric'] else '0'
+        try:
+            responses = self.server_interface.send_msg([
+                ExcryptMessage({
+                    'AO': 'GDKM',
+                    'OP': 'read-keyslot',
+                    'SI': self.session_id,
+                    'BE': asymmetric,
+                    'BD': str(slot),
+                })
+                for slot in slots
+            ], context=current_user.context)
+        except Exception:
+            # The table still holds the old entries, rebuild it on the next search
+            self.stale_slots.update(slots)
+            self.table_build_time = 0
+            raise
+
+        entries = {}
+        for slot, response in zip(slots, responses):
+            entry = self.slot_summary(slot, response)
+            if entry is None:
+                self.rebuild_table()
+                return
+            entries[slot] = entry
+
+        # Replace the entries in place, the table stays in slot order
+        patched = {}
+        replaced = 0
+        for search_str, entry in self.table.items():
+            new_entry = entries.get(entry.slot)
+            if new_entry is None:
+                patched[search_str] = entry
+            else:
+                patched[self.merged_search_str(new_entry)] = new_entry
+                replaced += 1
+        if replaced < len(entries):
+            # Not a slot of this table
+            self.rebuild_table()
+            return
+        self.table.clear()
+        self.table.update(patched)
+        self.index = KeyTableIndex(self.table)
+
+        metrics.record_slot_refresh(len(slots), time.time() - start)
+
+    @staticmethod
+    def merged_search_str(entry: KeySlotSummary) -> MergedSearchStr:
+        """All of a slot's fields as one lowercase string to search"""
+        return '\0'.join(
+            ('/'.join(value) if isinstance(value, (tuple, list)) else str(value)).lower()
+            for value in vars(entry).values()
+            if value is not None
+        )
+
+    def search(self, substr: str, order_by: str, ascending: bool, empty: bool) -> Sequence[KeySlotSummary]:
+        """Search the table for a substring in one of its fields, maybe rebuild if old"""
 
-        self.prev_search_str = substr
-        self.prev_search_results = results
+        if self.is_expired or self.stale_slots:
+            with self.refresh_lock:
+                if self.is_expired:
+                    self.rebuild_table()
+                elif self.stale_slots:
+                    self.refresh_stale_slots()
 
-        return sorted(results.values(), key=attrgetter(order_by), reverse=not ascending)
+        # do case-insensitive search
+        return self.index.search(substr.lower(), order_by, ascending, empty)
 
     @property
     def is_expired(self):
@@ -295,13 +533,32 @@ def invalidates_keytable_cache(fn):
         if not any(b'Success' in rsp for rsp in view_response.response):
             return view_response
 
+        # Only the slots that were written need to be read again
+        slots = mutated_slots(view_response, kwargs.get('slot'))
+        table_with_slots = KEY_TABLE_TYPES.get(tableType, 1)
+
         if tableType is None:
             tables_to_invalidate = KEY_TABLE_TYPES.values()
         else:
             tables_to_invalidate = ( KEY_TABLE_TYPES.get(tableType, 1), )
         for key_type_int in tables_to_invalidate:
-            self.server_interface.invalidate_keyslot_cache(sessionId, key_type_int)
+            if slots and key_type_int == table_with_slots:
+                self.server_interface.invalidate_keyslots(sessionId, key_type_int, slots)
+            else:
+                self.server_interface.invalidate_keyslot_cache(sessionId, key_type_int)
 
         return view_response
 
     return wrapper
+
+
+def mutated_slots(view_response, slot: Optional[int]) -> Set[int]:
+    """Slots a successful view changed, from its URL or the slots reported in its response"""
+    slots = set() if slot is None else {slot}
+    try:
+        body = json.loads(b''.join(view_response.response))
+    except (TypeError, ValueError):
+        return slots
+    if isinstance(body, dict):
+        slots.update(body[name] for name in ('slot', 'tpkSlot') if isinstance(body.get(name), int))
+    return slots
@@ -146,7 +146,11 @@ class SessionLoginView(ByokView):
         }
         translator = TYPES[req.authType]
         translator = translate_with(translator)(lambda: ...)
-        return translator(self, req.authCredentials, sessionId=sessionId)
+        try:
+            return translator(self, req.authCredentials, sessionId=sessionId)
+        finally:
+            # Logging in changes which key slots the device group lists for this connection
+            self.server_interface.forget_session_visibility(sessionId)
 
     @bp.success(models.ClusterAuthorizationState)
     @translate_with(translators.GDGD_login_status)
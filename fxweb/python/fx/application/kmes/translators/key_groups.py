@@ -84,7 +84,7 @@ class RetrieveKeyGroup(SequentialTranslator):
     """
     JSON to excrypt map for retrieving the permissions and info of a specified key group
 
-    Calls RKVS to retrieve the key group, then calls RKPD to retrieve the permissions for it
+    Calls RKVS to retrieve the key group and RKPD to retrieve the permissions for it
     """
 
     request_schema = KeyGroupsSchemas.RetrieveKeyGroup()
@@ -94,6 +94,9 @@ class RetrieveKeyGroup(SequentialTranslator):
         ("Misc", "RKPD"),
     ]
 
+    # Both only read, so they are sent together
+    command_dependencies = [(), ()]
+
     request_maps = [
         {
             # RKVS:
@@ -16,6 +16,8 @@ Copyright by:  Futurex, LP. 2020
 Translators defined for the System method view
 """
 
+# Not base.base_command, that imports a second copy of the module with its own command_cache
+from base_command import CachedCommandMixin
 from marshmallow import ValidationError
 
 from base.base_translator import BaseTranslator
@@ -199,6 +201,13 @@ class UpdateGlobalPermissions(BaseTranslator):
         request["settings"] = settings
         return request
 
+    def finalize_response(self, response):
+        if response.get("status") == "Y":
+            CachedCommandMixin.invalidate_cached(
+                "internal_cached_perm_options", self.server_interface
+            )
+        return response
+
 
 class RetrieveNtp(BaseTranslator):
     """
@@ -108,6 +108,9 @@ class RetrieveUserGroup(MultiCommandTranslator):
 
     request_schema = schemas.RetrieveUserGroup()
 
+    # Both only read, so they are sent together
+    command_dependencies = [(), ()]
+
     def __init__(self, server_interface):
         request_map = {
             # RKRP:
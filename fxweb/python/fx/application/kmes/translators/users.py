@@ -100,6 +100,9 @@ class RetrieveUser(MultiCommandTranslator):
 
     request_schema = schemas.RetrieveUser()
 
+    # Both only read, so they are sent together
+    command_dependencies = [(), ()]
+
     def __init__(self, server_interface):
         request_map = {
             # both PGUS and RKRI:
@@ -140,7 +143,7 @@ class RetrieveUser(MultiCommandTranslator):
         return request
 
     def on_receipt(self, response):
-        # If the first command fails, do not attempt the second command:
+        # If the first command fails, do not use the second command's response:
         if response.get("AN", "Y") != "Y" or response.get("BB", ""):
             raise NotImplementedError(response["AN"])  # TODO(@dneathery): KAPI-270
         return response
@@ -15,17 +15,54 @@ Copyright by:  Futurex, LP. 2016
 Performs queries on the RemoteKey database common to all RK based applications
 """
 
-from app_database import AppDatabase
+import time
 from urllib.parse import urlsplit
 
+import psycopg2
+
+from app_database import AppDatabase
+from application_log import ApplicationLogger as Log
+
+# Seconds the expected origins and the JWT and API key header lists are cached for
+CONFIG_CACHE_TTL = 60
+
+VRRP_ADDRESSES_QUERY = (
+    "SELECT value FROM ethernet_attributes WHERE key='vrrpvip' AND ethernet_name IN "
+    "(SELECT ethernet_name FROM ethernet_attributes WHERE key='vrrpenabled' and value='1')"
+)
+
 class RKApplicationDatabase(AppDatabase):
     '''
     Contains methods for common RK queries
     '''
-    def __init__(self, db_name, app_name):
-        self.db_name = db_name
-        self.user_name = "futurex"
-        self.app_name = app_name
+    # (db_name, name) -> (expires, value), shared by every instance
+    _cached = {}
+
+    def __init__(self, db_name, app_name, connect=None):
+        super().__init__(db_name, "futurex", app_name, connect=connect)
+
+    def cached(self, name, load, ttl=CONFIG_CACHE_TTL):
+        '''
+        Get a value loaded from the database at most ttl seconds ago. If loading it again
+        fails the previous value is kept, and retried after another ttl.
+        '''
+        key = self.db_name, name
+        expires, value = self._cached.get(key, (0, None))
+        now = time.monotonic()
+        if now < expires:
+            return value
+        try:
+            value = load()
+        except psycopg2.Error as e:
+            if key not in self._cached:
+                raise
+            Log.warn(f"Failed to reload {name} from the database, keeping the previous value: {e}")
+        self._cached[key] = now + ttl, value
+        return value
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cached.clear()
 
     def get_config(self, item_name):
         '''
@@ -38,6 +75,21 @@ class RKApplicationDatabase(AppDatabase):
         except (LookupError, ValueError):
             return None
 
+    def get_configs(self, *item_names, cursor=None):
+        '''
+        Get the values of several items from the configuration table in one query
+        Returns: A dict of item name to value, None for items that are not configured
+        '''
+        query = "SELECT item, value FROM configuration WHERE item IN %s"
+        if cursor is None:
+            rows = self.db_query(query, [tuple(item_names)])
+        else:
+            cursor.execute(query, [tuple(item_names)])
+            rows = cursor.fetchall()
+        values = dict.fromkeys(item_names)
+        values.update(rows)
+        return values
+
     def get_device_addresses(self):
         '''
         Gets a list of all the device's interface's addresses.
@@ -52,9 +104,7 @@ class RKApplicationDatabase(AppDatabase):
         Gets a list of all the device's vrrp addresses.
         '''
         try:
-            query = ("SELECT value FROM ethernet_attributes WHERE key='vrrpvip' AND ethernet_name IN "
-                     "(SELECT ethernet_name FROM ethernet_attributes WHERE key='vrrpenabled' and value='1')")
-            return self.db_query(query, None);
+            return self.db_query(VRRP_ADDRESSES_QUERY, None)
         except (LookupError, ValueError):
             return None
 
@@ -71,10 +121,23 @@ class RKApplicationDatabase(AppDatabase):
         '''
         Define the expected "Origin" header value from configured interface addressess.
         '''
+        return self.cached("expected_origins", self.load_expected_origins)[:]
+
+    def load_expected_origins(self):
+        '''
+        Query the expected origins, with all the queries made on one connection
+        '''
         list_origins = []
         scheme = "https"
 
-        host_name = self.get_config("csr_host_name")
+        with self.db_connection() as cursor:
+            config = self.get_configs("csr_host_name", "dashboard_listen_port", cursor=cursor)
+            cursor.execute("SELECT device_address FROM ethernet_configuration")
+            list_device_addresses = cursor.fetchall()
+            cursor.execute(VRRP_ADDRESSES_QUERY)
+            list_vrrp_addresses = cursor.fetchall()
+
+        host_name = config["csr_host_name"]
 
         if host_name is not None:
             host_name_split = urlsplit(host_name)
@@ -83,9 +146,7 @@ class RKApplicationDatabase(AppDatabase):
 
         # Then, grab all of the ethernet device addresses, because
         # they will be valid as well.
-        list_device_addresses = self.get_device_addresses()
-        list_vrrp_addresses = self.get_vrrp_addresses()
-        listen_port = self.get_web_server_port()
+        listen_port = config["dashboard_listen_port"]
         listen_port = "443" if listen_port is None else listen_port
 
         # TODO: DHCP will leave these addresses as 0.0.0.0 even though
@@ -102,6 +163,9 @@ class RKApplicationDatabase(AppDatabase):
         """Get possible headers used by JWT
         Returns: A list of custom headers
         """
+        return self.cached('jwt_headers', self.load_jwt_headers)[:]
+
+    def load_jwt_headers(self):
         headers = ['Authorization']
         custom = self.get_config('jwt_custom_http_header')
         if custom:
@@ -117,6 +181,9 @@ class RKApplicationDatabase(AppDatabase):
         """Get possible headers used by API Keys
         Returns: A list of custom headers
         """
+        return self.cached('api_key_headers', self.load_api_key_headers)[:]
+
+    def load_api_key_headers(self):
         headers = ['X-API-Key']
         custom = self.get_config('api_key_custom_http_header')
         if custom:
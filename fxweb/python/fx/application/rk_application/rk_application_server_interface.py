@@ -27,6 +27,7 @@ from connection_interface import ConnectionInterface
 from connection_handler import MiddlewareConnectionHandler
 from rk_login_status import DEFAULT_LOGIN_REQUIRED, LoginStatus, LoginDetails, UserRoleLoginDetails
 from server_interface import ServerInterface
+from object_stream import ObjectStream
 from app_matcher import QueryMatcher, DeleteObjectMatcher
 from auth import Credentials, token_authentication, User
 from conn_exceptions import MissingConnectionException, InvalidExcryptMessage, NoSuchExcryptCommand
@@ -101,6 +102,44 @@ class RKApplicationServerInterface(ServerInterface):
             context.update_from_response(response, token)
         return response
 
+    def send_stream(self, msg, matcher=None, context=None):
+        """Send a message and yield its matched responses as they arrive
+        Arguments:
+            msg: The message to send
+            matcher: Message matcher forwarded to the connection handler
+            context: Message context, defaults to the current user's
+        Returns: A generator of responses
+        """
+        jwt = getattr(g, 'jwt', None)
+        if jwt is not None:
+            return self._send_stream_jwt(msg, jwt, matcher)
+        else:
+            return self._send_stream(msg, matcher, context)
+
+    def _send_stream(self, msg, matcher=None, context=None):
+        """ Helper method to stream responses from the connection associated with current context"""
+        conn_context = context if context is not None else current_user.context
+
+        try:
+            responses = self.conn_handler.send_stream(
+                conn_context,
+                msg,
+                ConnectionInterface.DEFAULT_TIMEOUT,
+                matcher
+            )
+        except MissingConnectionException:
+            raise
+
+        return responses
+
+    def _send_stream_jwt(self, msg, token, matcher=None):
+        with self.jwt_pool.acquire(token) as context:
+            msg = context.add_to_request(msg, token)
+            response = None
+            for response in self._send_stream(msg, matcher, context):
+                yield response
+            context.update_from_response(response, token)
+
     def send_dict(self, field_tags, matcher=None, context=None):
         """Helper method for sending messages
         Arguments:
@@ -413,22 +452,9 @@ class RKApplicationServerInterface(ServerInterface):
                                    context.get_resp_synch_tag(),
                                    context.inc_synch_value())
 
-        if not self._all_filter_types_allowed(matcher.get_manager()):
-            raise InvalidMessageException
-
-        message = matcher.init_match_status(["ST", "[AORKY12;]"])
-
-        em_request = ExcryptMessage(message)
-
-        # Always force system objects excluded
-        filter.setFlag(Filter.SYSTEM_EXCLUDE)
-        if sync:
-            filter.setFlag(Filter.PRESERVE_SYNC_RESP)
-        filter.toMessage(em_request)
-
         # Send the filter
         try:
-            responses = self.send(em_request.getText(), matcher)
+            responses = self.send(self._filter_request(filter, matcher, sync), matcher)
         except MissingConnectionException:
             raise
 
@@ -443,6 +469,66 @@ class RKApplicationServerInterface(ServerInterface):
 
         return responses
 
+    def stream_rk_filter(self, filter, context, matcher=None, sync=True):
+        """
+        Query filter to rkserver like query_rk_filter, but hand out the responses as they
+        are received instead of collecting them first
+        :param filter: A Filter object to create the message from
+        :param context: The user context
+        :param matcher: The response matcher
+        :param sync: If true enable the PRESERVE_SYNC_RESP flag
+        :return: A generator of responses
+        """
+        if matcher is None:
+            matcher = QueryMatcher(self._get_filter_manager_list(filter),
+                                   context.get_resp_synch_tag(),
+                                   context.inc_synch_value())
+
+        # Send the filter
+        try:
+            responses = self.send_stream(self._filter_request(filter, matcher, sync), matcher)
+        except MissingConnectionException:
+            raise
+
+        return self._log_stream(filter, responses)
+
+    def _log_stream(self, filter, responses):
+        """
+        Pass streamed filter responses through and log their count once the filter completed
+        """
+        count = 0
+        for response in responses:
+            count += 1
+            yield response
+
+        Log.info('Returning %d objects from a filter for type %s' % (
+            count - 1,  # Number of RKY400's - one required RKY12
+            str(filter.getManager()),
+        ))
+
+    def _filter_request(self, filter, matcher, sync):
+        """
+        Build the RKY12 request for a filter
+        :param filter: A Filter object to create the message from
+        :param matcher: The response matcher
+        :param sync: If true enable the PRESERVE_SYNC_RESP flag
+        :return: The request message text
+        """
+        if not self._all_filter_types_allowed(matcher.get_manager()):
+            raise InvalidMessageException
+
+        message = matcher.init_match_status(["ST", "[AORKY12;]"])
+
+        em_request = ExcryptMessage(message)
+
+        # Always force system objects excluded
+        filter.setFlag(Filter.SYSTEM_EXCLUDE)
+        if sync:
+            filter.setFlag(Filter.PRESERVE_SYNC_RESP)
+        filter.toMessage(em_request)
+
+        return em_request.getText()
+
     def query_rk_associated_objects(self, primary, secondary, object_id, context, match_secondary_manager=True):
         """
         Query filter to rkserver. Will convert a Filter object to an Excrypt message and request the response from the
@@ -559,9 +645,12 @@ class RKApplicationServerInterface(ServerInterface):
 
         return manager_list
 
-    def retrieve(self, server_request):
+    def retrieve(self, server_request, stream=False):
         """
         Retrieve a batch of object(s) via a Filter request
+        :param server_request: The retrieve request
+        :param stream: If true, results are returned as an ObjectStream that serializes
+                       the objects as they are received from the server
         """
         # TODO Support batch objects
         request = server_request.request
@@ -577,12 +666,16 @@ class RKApplicationServerInterface(ServerInterface):
             if error:
                 return dict(result='Failure', message=error)
 
-            # Query server
-            backend_response = self.query_rk_filter(filt, current_user.context)
-
             # Build response
             filterType = filt.getFilterType()
             filterManager = filt.getManager()
+            if stream and filterType == Filter.RESULTS:
+                backend_responses = self.stream_rk_filter(filt, current_user.context)
+                return ObjectStream(filterManager, self._stream_mos(backend_responses))
+
+            # Query server
+            backend_response = self.query_rk_filter(filt, current_user.context)
+
             if filterType == Filter.RESULTS:
                 frontend_response = self._get_mos(filterManager, backend_response)
             elif filterType == Filter.COUNT:
@@ -898,7 +991,17 @@ class RKApplicationServerInterface(ServerInterface):
         if isinstance(backend_response, (str, bytes)):
             backend_response = [backend_response]
 
-        for m in backend_response:
+        for mo_name, mo_json in self._iter_mos(backend_response):
+            frontend_response.setdefault(mo_name, []).append(mo_json)
+
+        return frontend_response
+
+    def _iter_mos(self, backend_responses):
+        """
+        Helper method to convert backend responses to frontend objects one at a time
+        :return: A generator of (manager name, object JSON) pairs
+        """
+        for m in backend_responses:
             em = ExcryptMessage(m)
             mo = ManagedObjectUtils.createObjectFromTypeTake(ManagedObject.TYPE(em.getFieldAsInt("TY")), 0)
             if mo is not None:
@@ -907,10 +1010,19 @@ class RKApplicationServerInterface(ServerInterface):
                 # Update the object for external consumption
                 self._sanitize_object(mo)
 
-                mo_name = ManagedObjectUtils.getManagerName(mo.getType())
-                frontend_response.setdefault(mo_name, []).append(mo.toJSONString())
+                yield ManagedObjectUtils.getManagerName(mo.getType()), mo.toJSONString()
 
-        return frontend_response
+    def _stream_mos(self, backend_responses):
+        """
+        Helper method like _iter_mos for streamed responses, raising parse errors
+        the same way as a retrieve that is not streamed
+        :return: A generator of (manager name, object JSON) pairs
+        """
+        try:
+            yield from self._iter_mos(backend_responses)
+        except (ValueError, IndexError, AttributeError) as e:
+            Log.error('Failed to parse Filter results: ' + str(e))
+            raise InvalidMessageException(None, "Could not parse request/response")
 
     def _get_mo_count(self, manager, backend_response):
         """
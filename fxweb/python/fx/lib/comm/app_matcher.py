@@ -16,7 +16,7 @@ Implements RK application specific matchers for matching sent responses
 """
 from matcher import Matcher, SynchResponseMatcher
 from librk import ManagedObject, ManagedObjectUtils
-from lib.utils.data_structures import ExcryptMessage
+from envelope import parse
 from application_log import ApplicationLogger as Log
 
 class QueryMatcher(SynchResponseMatcher):
@@ -50,7 +50,7 @@ class QueryMatcher(SynchResponseMatcher):
         """
         self.matched = False
 
-        em = ExcryptMessage(data)
+        em = parse(data)
 
         if em.getCommand() == self.command and (em.getField("BB") == "Y" or em.getField("BB") == "N") and em.getField(self.synch_tag) == self.synch_value:
             self.matched = super(QueryMatcher, self).matches(data)
@@ -70,7 +70,7 @@ class QueryMatcher(SynchResponseMatcher):
         has occurred once this occurs
         :param data:  Indvidual message to check completion status
         """
-        em = ExcryptMessage(data)
+        em = parse(data)
         if em.getCommand() == self.command and (em.getField("BB") == "Y" or em.getField("BB") == "N") and em.getField(self.synch_tag) == self.synch_value:
             self.is_complete = super(QueryMatcher, self).matches(data)
 
@@ -93,11 +93,17 @@ class UpdateObjectMatcher(SynchResponseMatcher):
         """
         self.matched = False
 
-        em = ExcryptMessage(data)
+        em = parse(data)
         if em.getCommand() == self.command:
             self.matched = em.getField("MN") in self.manager
         return self.matched
 
+    def key(self):
+        """
+        RKY2 responses carry no synch ID, so they can't be keyed
+        """
+        return None
+
 class DeleteObjectMatcher(SynchResponseMatcher):
     """
     Implements a matcher for the RKY3 delete object response
@@ -119,13 +125,19 @@ class DeleteObjectMatcher(SynchResponseMatcher):
         :return: True if matches, false otherwise
         """
         self.matched = False
-        em = ExcryptMessage(data)
+        em = parse(data)
         self.matched = em.getCommand() == "RKY3" and em.getField("MN") in self.manager
 
         if self.matched and self.dbid and self.dbid != '-1':
             self.matched = em.getField("ID") == self.dbid
         return self.matched
 
+    def key(self):
+        """
+        RKY3 responses carry no synch ID, so they can't be keyed
+        """
+        return None
+
 class NotifyExternalChangeMatcher(SynchResponseMatcher):
     """
     Implements a matcher for the NotifyExternalChange (RKY57) event
@@ -143,7 +155,13 @@ class NotifyExternalChangeMatcher(SynchResponseMatcher):
         """
         self.matched = False
 
-        em = ExcryptMessage(data)
+        em = parse(data)
         self.matched = em.getCommand() == self.command and em.getField("MN") in self.manager
 
         return self.matched
+
+    def key(self):
+        """
+        RKY57 responses carry no synch ID, so they can't be keyed
+        """
+        return None
@@ -15,9 +15,10 @@ Copyright by:  Futurex, LP. 2016
 Interacts with connection objects and tracks open connections
 """
 from abc import ABCMeta, abstractmethod
-import select
+from functools import partial
 import gevent
-from gevent import Greenlet
+from gevent import Greenlet, get_hub
+from gevent.queue import Queue, Empty
 from gevent.lock import BoundedSemaphore
 from gevent.pool import Pool
 
@@ -26,14 +27,16 @@ from base_exceptions import MiddlewareException
 from connection_interface import ConnectionInterface
 from connection_factory import ConnectionFactory
 from matcher import CountResponseMatcher, SynchResponseMatcher
-from handler import RespondHandler
+from handler import RespondHandler, StreamHandler, StreamAborted
+from envelope import Envelope
 from asynccomm import synchronized
 from application_log import ApplicationLogger as Log
 from conn_exceptions import (
     ErrorOnReadException,
     ErrorOnWriteException,
     MissingConnectionException,
-    ServerConnectionTimeout
+    ServerConnectionTimeout,
+    StreamAbortedException
 )
 
 class BaseConnectionHandler(metaclass=ABCMeta):
@@ -77,6 +80,17 @@ class BaseConnectionHandler(metaclass=ABCMeta):
         """
         pass
 
+    @abstractmethod
+    def send_stream(self, context, message, timeout=ConnectionInterface.DEFAULT_TIMEOUT, matcher = None):
+        """
+            Send a message and yield its matched responses as they arrive
+            @param context: Provides any extra information needed for sending the message
+            @param message: The actual message to send
+            @param timeout: Timeout value between two responses to fail on if exceeded
+            @param matcher: Message matcher to use. If None, SynchResponseMatcher is used
+        """
+        pass
+
     @abstractmethod
     def receive(self, context):
         """
@@ -136,7 +150,7 @@ class MiddlewareConnectionHandler(Greenlet):
     # Default Greenlet spawn count
     DEFAULT_GREENLET_COUNT = 100
 
-    # Select timeout
+    # Ready queue wait timeout
     DEFAULT_SELECT_TIMEOUT = 1.0
 
     def __init__(self, config):
@@ -151,8 +165,17 @@ class MiddlewareConnectionHandler(Greenlet):
         # stores currently open connections
         self.__connections = {}
 
-        # A list of SentData objects. This is a cache of pending messages responses, their matchers, and handlers
-        self.__sent_message_data = []
+        # A dict of open connections to their gevent hub read watchers
+        self.__watchers = {}
+
+        # Connections that are ready to be read from, filled by the read watchers
+        self.__ready = Queue()
+
+        # A dict of connections that are not read from to the stream handlers they wait on
+        self.__paused = {}
+
+        # A PendingTable of SentData objects. This is a cache of pending messages responses, their matchers, and handlers
+        self.__sent_message_data = PendingTable()
 
         # List of message listeners to notify for every message
         self.__message_listeners = []
@@ -167,107 +190,191 @@ class MiddlewareConnectionHandler(Greenlet):
     def _run(self):
         """
         A greenlet thread that monitors the currently connected sockets.
-        This method will read the socket data, check if it matches, and spawn a greenlet
-        to handle the reponse.
+        Each open connection has a read watcher registered with the gevent hub, which
+        queues the connection once it is readable. This method will read the socket data,
+        check if it matches, and spawn a greenlet to handle the reponse.
         """
-        fd_to_conn = {}
-        sockets = []
-
         while self.started:
             try:
-                with MiddlewareConnectionHandler.conn_semaphore:
-                    for conn in list(self.__connections.values()):
-                        sockets.append(conn.get_fd())
-                        fd_to_conn.update({ conn.get_fd() : conn })
-            except gevent.timeout.Timeout:
-                Log.warn('Timeout occured in connection handler lock.')
+                ready = [self.__ready.get(timeout=self.DEFAULT_SELECT_TIMEOUT)]
+            except Empty:
                 continue
 
-            try:
-                ready_to_read, ready_to_write, in_error = \
-                    select.select(sockets, [], sockets, self.DEFAULT_SELECT_TIMEOUT)
-            except select.error:
-                raise ErrorOnReadException('Could not select fd to read from.')
-
-            try:
-                self.__process_fds(fd_to_conn, ready_to_read, ready_to_write, in_error)
+            # Handle everything else that became readable in the meantime
+            while not self.__ready.empty():
+                ready.append(self.__ready.get_nowait())
 
-                fd_to_conn = {}
-                sockets = []
-            except:
-                raise
+            self.__process_fds(ready)
 
-    def __process_fds(self, fd_to_conn, ready_to_read, ready_to_write, in_error):
+    def __process_fds(self, ready_to_read):
         """
         Reads in, matches, and handles data that has been received from a remote endpoint.
-        Also closes fds that have been returned in error
-        :param fd_to_conn: The map containing connection objects associated with fd
-        :param ready_to_read: The set of fds that is ready to be read from
-        :param ready_to_write: The set of fds that is ready to be written to(will never be used)
-        :param in_error: The set of fds that is ready to be closed due to fd error
-        """
-        messages = []
-        match_data = {}
-        for read_fd in ready_to_read:
+        Also closes connections that returned an error
+        :param ready_to_read: The connections that are ready to be read from
+        """
+        in_error = []
+        for conn in ready_to_read:
+            messages = []
+            match_data = {}
+            backlogged = set()
             try:
-                messages = fd_to_conn[read_fd].receive()
+                messages = conn.receive()
             except ErrorOnReadException:
-                in_error.append(read_fd)
-                Log.warn("Error while reading from fd({0})".format(read_fd))
-            except IndexError:
-                in_error.append(read_fd)
-                Log.error('Read from unknown fd({})'.format(read_fd))
-            except AttributeError:
-                in_error.append(read_fd)
-                Log.error('Read from unknown fd({})'.format(read_fd))
+                Log.warn("Error while reading from {0}".format(conn.conn_data))
+            except (IndexError, AttributeError):
+                Log.error('Read from unknown connection {}'.format(conn.conn_data))
 
             if len(messages) <= 0:
-                Log.warn("Null data received while reading from fd({0})".format(read_fd))
-                in_error.append(read_fd)
-            else:
-                for m in messages:
-                    # Match messages
-                    matched = self.__match_message(m)
-                    if matched:
-                        match_data.update(matched)
-
-                    # Notify message listeners
-                    with MiddlewareConnectionHandler.message_listeners_semaphore:
-                        for listener in self.__message_listeners:
-                            self.__pool.spawn(listener.handle(m, fd_to_conn[read_fd]))
-
-                for (message, handler) in match_data.items():
-                    self.__pool.spawn(handler.handle(message, fd_to_conn[read_fd]))
-
-        for error_fd in in_error:
-            Log.error("Closing socket due to disconnection from fd({0})".format(error_fd))
+                Log.warn("Null data received while reading from {0}".format(conn.conn_data))
+                in_error.append(conn)
+                continue
+
+            for data in messages:
+                # Parse once, the envelope is shared by matchers, listeners and handlers
+                m = Envelope(data)
+
+                # Match messages
+                matched = self.__match_message(conn, m, backlogged)
+                if matched:
+                    match_data.update(matched)
+
+                # Notify message listeners
+                with MiddlewareConnectionHandler.message_listeners_semaphore:
+                    for listener in self.__message_listeners:
+                        self.__pool.spawn(listener.handle(m, conn))
+
+            for (message, handler) in match_data.items():
+                self.__pool.spawn(handler.handle(message, conn))
+
+            # Wait for the next data on this connection, unless a stream consumer
+            # has fallen behind. Its handler resumes reading once it caught up
+            with MiddlewareConnectionHandler.conn_semaphore:
+                self.__pause(conn, backlogged)
+
+        for conn in in_error:
+            Log.error("Closing socket due to disconnection from {0}".format(conn.conn_data))
             with MiddlewareConnectionHandler.conn_semaphore:
-                for context, conn in list(self.__connections.items()):
-                    if conn.get_fd() == error_fd:
+                for context, open_conn in list(self.__connections.items()):
+                    if open_conn is conn:
+                        self.__unwatch(conn)
                         conn.close()
                         del self.__connections[context]
 
+    def __watch(self, conn):
+        """
+        Register a read watcher for a new connection
+        Note : MUST be locked by the calling method!!!
+        :param conn: The connection to watch
+        """
+        watcher = get_hub().loop.io(conn.get_fd(), 1)
+        self.__watchers[conn] = watcher
+        watcher.start(self.__on_readable, conn)
+
+    def __unwatch(self, conn):
+        """
+        Unregister the read watcher of a connection that is being closed
+        Note : MUST be locked by the calling method!!!
+        :param conn: The watched connection
+        """
+        self.__paused.pop(conn, None)
+        watcher = self.__watchers.pop(conn, None)
+        if watcher:
+            watcher.stop()
+            watcher.close()
+
+    def __rearm(self, conn):
+        """
+        Resume watching a connection once its data has been processed
+        Note : MUST be locked by the calling method!!!
+        :param conn: The watched connection
+        """
+        watcher = self.__watchers.get(conn)
+        if watcher and not watcher.active:
+            watcher.start(self.__on_readable, conn)
+
+    def __pause(self, conn, handlers):
+        """
+        Stop reading from a connection while any of its stream handlers is backlogged,
+        otherwise wait for the next data on it
+        Note : MUST be locked by the calling method!!!
+        :param conn: The processed connection
+        :param handlers: Handlers that were given messages from the connection
+        """
+        waiting = {h for h in handlers if h.pause(partial(self.__resume, conn))}
+        if waiting:
+            self.__paused[conn] = waiting
+        else:
+            self.__rearm(conn)
+
+    def __resume(self, conn, handler):
+        """
+        Called by a stream handler that caught up. Reading from the connection resumes
+        once no handler is waited on anymore
+        :param conn: The paused connection
+        :param handler: The handler that caught up
+        """
+        with MiddlewareConnectionHandler.conn_semaphore:
+            waiting = self.__paused.get(conn)
+            if waiting is not None:
+                waiting.discard(handler)
+                if not waiting:
+                    del self.__paused[conn]
+                    self.__rearm(conn)
+
+    def __on_readable(self, conn):
+        """
+        Hub callback for a readable connection. The watcher stays stopped until
+        the data has been read, so the connection is only queued once.
+        :param conn: The readable connection
+        """
+        watcher = self.__watchers.get(conn)
+        if watcher:
+            watcher.stop()
+        self.__ready.put(conn)
+
     @synchronized(sent_data_semaphore)
-    def __match_message(self, message):
+    def __match_message(self, conn, message, backlogged):
         """
         Helper method that checks if a message matches, checks if a matcher
         is completed, and handles the message if its matcher has completed
 
-        :param message: Message to match against
+        :param conn: Connection the message was received on
+        :param message: Envelope of the message to match against
+        :param backlogged: Set the handlers of incomplete matches are added to
         :return: dict of message to handler for completed matches
         """
         result = {}
-        for sent_data in self.__sent_message_data:
-            if sent_data.matcher and sent_data.matcher.matches(message):
+        for sent_data in self.__sent_message_data.candidates(conn, message.em):
+            if sent_data.matcher.matches(message):
                 sent_data.matcher.update_match_status(message)
                 sent_data.handler.update_responses(message)
 
                 if sent_data.matcher.is_complete:
                     result.update({message:sent_data.handler})
                     self.__sent_message_data.remove(sent_data)
+                    backlogged.discard(sent_data.handler)
+                else:
+                    backlogged.add(sent_data.handler)
 
         return result
 
+    @synchronized(sent_data_semaphore)
+    def __add_sent_data(self, conn, sent_data):
+        """
+        Cache a pending request before it is sent
+        :param conn: Connection the request is sent on
+        :param sent_data: SentData for the request
+        """
+        self.__sent_message_data.add(conn, sent_data)
+
+    @synchronized(sent_data_semaphore)
+    def __remove_sent_data(self, sent_data):
+        """
+        Drop a pending request that will no longer be waited on
+        :param sent_data: SentData for the request
+        """
+        self.__sent_message_data.remove(sent_data)
+
     def send(self, context, message):
         """
         Helper method to get a connection based on context and send a message to it
@@ -298,16 +405,18 @@ class MiddlewareConnectionHandler(Greenlet):
 
             sd = SentData(matcher, RespondHandler(), message)
 
-            # Cache SendData
-            with MiddlewareConnectionHandler.sent_data_semaphore:
-                self.__sent_message_data.append(sd)
-
             # Send the message
             with MiddlewareConnectionHandler.conn_semaphore:
                 Log.debug(f'-> {message}')
                 connection = self.__get_connection(context)
                 if connection:
-                    connection.send(message)
+                    # Cache SendData before the response can arrive
+                    self.__add_sent_data(connection, sd)
+                    try:
+                        connection.send(message)
+                    except:
+                        self.__remove_sent_data(sd)
+                        raise
 
 
             # Wait for the response
@@ -319,6 +428,8 @@ class MiddlewareConnectionHandler(Greenlet):
                     responses = sd.handler.responses[0]
 
             except gevent.timeout.Timeout:
+                # Nobody is waiting on the response anymore
+                self.__remove_sent_data(sd)
                 #TODO Parse and log message w/o sensitive data
                 raise ServerConnectionTimeout('Timeout while sending message')
         else:
@@ -328,6 +439,67 @@ class MiddlewareConnectionHandler(Greenlet):
 
         return responses
 
+    def send_stream(self, context, message, timeout=ConnectionInterface.DEFAULT_TIMEOUT, matcher = None,
+                    max_pending=StreamHandler.DEFAULT_MAX_PENDING, max_pause=StreamHandler.DEFAULT_MAX_PAUSE):
+        """
+            Send a message and return a generator of its matched responses as they arrive.
+            The message is sent right away, reading from the connection pauses while more
+            than max_pending responses are waiting to be consumed, for at most max_pause seconds.
+            :param message_context: Provides any extra information needed for sending the message
+            :param message: The actual message to send
+            :param timeout: Longest time to wait for the next response
+            :param max_pending: Number of unconsumed responses that pauses the connection
+            :param max_pause: Longest time the connection stays paused before the stream is aborted
+            :exception ServerConnectionTimeout: Raised while iterating if no response is received
+                                                from the remote endpoint within the timeout period
+            :exception StreamAbortedException: Raised while iterating if the consumer stayed behind
+                                               for longer than max_pause
+            :exception MissingConnectionException: Raised if trying to send to a connection that doesn't exist
+        """
+        if not self.exists(context):
+            raise MissingConnectionException('Attempted to access unknown connection.')
+
+        if not matcher:
+            matcher = SynchResponseMatcher(context.get_resp_synch_tag(), context.inc_synch_value())
+            message = matcher.init_match_status([context.get_req_synch_tag(), message])
+
+        sd = SentData(matcher, StreamHandler(max_pending, max_pause), message)
+
+        # Send the message
+        with MiddlewareConnectionHandler.conn_semaphore:
+            Log.debug(f'-> {message}')
+            connection = self.__get_connection(context)
+            if connection:
+                # Cache SendData before the response can arrive
+                self.__add_sent_data(connection, sd)
+                try:
+                    connection.send(message)
+                except:
+                    self.__remove_sent_data(sd)
+                    raise
+
+        return self.__stream(sd, timeout)
+
+    def __stream(self, sd, timeout):
+        """
+        Yield the responses of a streamed request and stop waiting on it once
+        the consumer is done, even if it stopped early
+        :param sd: SentData of the streamed request
+        :param timeout: Longest time to wait for the next response
+        """
+        try:
+            for message in sd.handler.messages(timeout):
+                yield message
+        except Empty:
+            #TODO Parse and log message w/o sensitive data
+            raise ServerConnectionTimeout('Timeout while streaming responses')
+        except StreamAborted as e:
+            Log.warn(str(e))
+            raise StreamAbortedException('Streamed responses were dropped')
+        finally:
+            self.__remove_sent_data(sd)
+            sd.handler.close()
+
     def send_asynch(self, context, message, timeout, handler, matcher = None):
         """
             Send a message without blocking
@@ -344,18 +516,17 @@ class MiddlewareConnectionHandler(Greenlet):
             sd = SentData(matcher, handler, message)
             message = sd.matcher.init_match_status(message)
 
-            # Cache SendData
-            with MiddlewareConnectionHandler.sent_data_semaphore:
-                self.__sent_message_data.append(sd)
-
             # Send the message
             with MiddlewareConnectionHandler.conn_semaphore:
                 connection = self.__get_connection(context)
 
                 if connection:
+                    # Cache SendData before the response can arrive
+                    self.__add_sent_data(connection, sd)
                     try:
                         connection.send(message)
                     except:
+                        self.__remove_sent_data(sd)
                         raise ErrorOnWriteException('Could not send message to server.')
         else:
             raise MissingConnectionException()
@@ -382,6 +553,7 @@ class MiddlewareConnectionHandler(Greenlet):
             if connection is not None:
                 if context not in self.__connections:
                     self.__connections[context] = connection
+                    self.__watch(connection)
                     success = True
                 else:
                     connection.close()
@@ -394,12 +566,15 @@ class MiddlewareConnectionHandler(Greenlet):
             @param context: the connection to remove
         """
         if context in self.__connections:
+            self.__unwatch(self.__connections[context])
             self.__connections[context].close()
             del self.__connections[context]
 
     @synchronized(conn_semaphore)
     def reset(self):
         """Clear all connections"""
+        for conn in list(self.__watchers):
+            self.__unwatch(conn)
         self.__connections = {}
 
     @synchronized(conn_semaphore)
@@ -440,4 +615,77 @@ class SentData(object):
         self.matcher = matcher
         self.handler = handler
         self.request = request
+        self.key = None
+
+class PendingTable(object):
+    """
+    Cache of SentData waiting on responses, indexed by (connection, synch tag, synch value)
+    so an inbound message is dispatched with a single lookup instead of running every
+    pending matcher. Matchers that can't be keyed (e.g. DeleteObjectMatcher) are kept in
+    a side list that is checked against every message.
+    Note: MUST be locked by the calling method!!!
+    """
+    def __init__(self):
+        # (connection, synch tag, synch value) to SentData
+        self.keyed = {}
+        # SentData whose matcher has no key
+        self.unkeyed = []
+        # Synch tag to the number of keyed entries using it
+        self.synch_tags = {}
+
+    def __len__(self):
+        return len(self.keyed) + len(self.unkeyed)
+
+    def add(self, conn, sent_data):
+        """
+        Add a pending request
+        :param conn: Connection the request is sent on
+        :param sent_data: SentData for the request
+        """
+        # Nothing can match without a matcher
+        if not sent_data.matcher:
+            return
+
+        key = sent_data.matcher.key()
+        if key is None:
+            self.unkeyed.append(sent_data)
+            return
 
+        tag, value = key
+        sent_data.key = (conn, tag, value)
+        self.keyed[sent_data.key] = sent_data
+        self.synch_tags[tag] = self.synch_tags.get(tag, 0) + 1
+
+    def remove(self, sent_data):
+        """
+        Remove a pending request, does nothing if it was already removed
+        :param sent_data: SentData for the request
+        """
+        if sent_data.key is None:
+            try:
+                self.unkeyed.remove(sent_data)
+            except ValueError:
+                pass
+        elif self.keyed.get(sent_data.key) is sent_data:
+            del self.keyed[sent_data.key]
+            tag = sent_data.key[1]
+            self.synch_tags[tag] -= 1
+            if self.synch_tags[tag] <= 0:
+                del self.synch_tags[tag]
+
+    def candidates(self, conn, em):
+        """
+        Get the pending requests a message could match
+        :param conn: Connection the message was received on
+        :param em: The parsed message
+        :return: List of SentData
+        """
+        result = []
+        for tag in self.synch_tags:
+            value = em.get(tag)
+            if value is not None:
+                sent_data = self.keyed.get((conn, tag, value))
+                if sent_data:
+                    result.append(sent_data)
+        result.extend(self.unkeyed)
+        return result
@@ -0,0 +1,49 @@
+"""
+@file      envelope.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Received messages that are parsed once and shared by matchers, listeners and handlers
+"""
+from lib.utils.data_structures import ExcryptMessage, FrozenExcryptMessage
+
+
+class Envelope(bytes):
+    """
+    A message received from a connection. It is still the raw message, so it can be
+    used anywhere the bytes were used before, but it also carries the parsed fields.
+    The connection handler builds one per message and hands the same envelope to every
+    matcher, listener and handler, which read the fields instead of parsing again.
+    :param data: The raw message
+    """
+    def __new__(cls, data):
+        envelope = super(Envelope, cls).__new__(cls, data)
+        envelope.em = FrozenExcryptMessage(data)
+        return envelope
+
+    def message(self):
+        """
+        Get a modifiable ExcryptMessage of the fields, for callers that change the response
+        :return: ExcryptMessage copy of the fields
+        """
+        return self.em.copy()
+
+
+def parse(message):
+    """
+    Get the fields of a message without parsing it again if it is an Envelope
+    Note: The result is shared and must not be modified
+    :param message: An Envelope, or a raw message
+    :return: ExcryptMessage of the message fields
+    """
+    if isinstance(message, Envelope):
+        return message.em
+    return ExcryptMessage(message)
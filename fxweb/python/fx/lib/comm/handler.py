@@ -15,7 +15,14 @@ Copyright by:  Futurex, LP. 2016
 Implements generic handler for matched response messages
 """
 from abc import ABCMeta, abstractmethod
+import gevent
 from gevent.event import AsyncResult
+from gevent.queue import Queue
+
+class StreamAborted(Exception):
+    """
+    Raised to the consumer of a stream that stayed behind for too long
+    """
 
 class Handler(metaclass=ABCMeta):
     """
@@ -41,6 +48,15 @@ class Handler(metaclass=ABCMeta):
         """
         self.responses.append(message)
 
+    def pause(self, resume):
+        """
+        Ask the handler whether reading from its connection should pause until
+        it has caught up. Handlers never pause by default
+        :param resume: Callback taking the handler, called once reading may resume
+        :return: True if the connection should stop being read from
+        """
+        return False
+
 class RespondHandler(Handler):
     """
     Handler that sends an event to a waiting Greenlet to notify of
@@ -79,4 +95,109 @@ class ForwardHandler(Handler):
         """
         self.send(message, self.context)
 
+class StreamHandler(Handler):
+    """
+    Handler that queues matched responses for a consuming Greenlet as they
+    arrive instead of collecting them all in memory. Once more than max_pending
+    responses are waiting, the connection stops being read from until the
+    consumer has worked through half of them. A consumer that does not catch up
+    within max_pause seconds has its stream aborted, so other requests on the
+    connection are not held up by it.
+    :param max_pending: Number of unconsumed responses that pauses the connection
+    :param max_pause: Longest time in seconds the connection stays paused
+    """
+    # Default number of unconsumed responses before the connection is paused
+    DEFAULT_MAX_PENDING = 256
+
+    # Default longest pause before the stream is aborted
+    DEFAULT_MAX_PAUSE = 10.0
+
+    # Marks the end of the response stream
+    END = object()
+
+    # Marks a stream aborted while the connection was paused
+    ABORTED = object()
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING, max_pause=DEFAULT_MAX_PAUSE):
+        super(StreamHandler, self).__init__()
+        self.queue = Queue()
+        self.max_pending = max_pending
+        self.max_pause = max_pause
+        self.resume = None
+        self.abort_timer = None
+        self.aborted = False
+
+    def handle(self, message, conn):
+        """
+        Ends the stream once the matcher has completed
+        :param message: Message that completed the request
+        :param conn: Connection that response was received on
+        """
+        if not self.aborted:
+            self.queue.put(self.END)
+
+    def update_responses(self, message):
+        """
+        Queue a matched message for the consumer. Responses to an aborted stream are dropped
+        :param message: Matched message
+        """
+        if not self.aborted:
+            self.queue.put(message)
+
+    def pause(self, resume):
+        """
+        Pause the connection while the consumer is behind
+        :param resume: Callback taking the handler, called once reading may resume
+        :return: True if the connection should stop being read from
+        """
+        if self.aborted or self.queue.qsize() < self.max_pending:
+            return False
+        self.resume = resume
+        if self.abort_timer is None:
+            self.abort_timer = gevent.spawn_later(self.max_pause, self.__abort)
+        return True
+
+    def messages(self, timeout):
+        """
+        Yield the matched responses as they arrive
+        :param timeout: Longest time to wait for the next response
+        :exception gevent.queue.Empty: Raised if no response arrives within the timeout
+        :exception StreamAborted: Raised if the consumer stayed behind for longer than max_pause
+        """
+        while True:
+            message = self.queue.get(timeout=timeout)
+            if message is self.END:
+                break
+            if message is self.ABORTED:
+                raise StreamAborted('Stream consumer did not catch up within {}s'.format(self.max_pause))
+
+            if self.resume is not None and self.queue.qsize() <= self.max_pending // 2:
+                self.__resume()
+
+            yield message
+
+    def close(self):
+        """
+        Resume a paused connection once nobody consumes the stream anymore
+        """
+        if self.resume is not None:
+            self.__resume()
+
+    def __abort(self):
+        """
+        Drop the queued responses and resume the connection, the consumer fell behind for too long
+        """
+        self.abort_timer = None
+        self.aborted = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put(self.ABORTED)
+        if self.resume is not None:
+            self.__resume()
 
+    def __resume(self):
+        if self.abort_timer is not None:
+            self.abort_timer.kill(block=False)
+            self.abort_timer = None
+        resume, self.resume = self.resume, None
+        resume(self)
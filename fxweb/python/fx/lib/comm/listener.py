@@ -1,6 +1,7 @@
 from application_log import ApplicationLogger
 from librk import ManagedObjectUtils, ManagedObject, ExcryptMessage
 from asynccomm import run_async_interval, synchronized
+from envelope import parse
 from collections import deque
 import threading
 import json
@@ -46,7 +47,7 @@ class SocketIOListener(Listener):
         # Handle the message if the matcher test passes or there is no matcher
         if (self.matcher and self.matcher.matches(message)) or not self.matcher:
             # Generate the response
-            response_data = self.gen_response(ExcryptMessage(message))
+            response_data = self.gen_response(self.parse_message(message))
 
             # Determine what to do with the new response
             if response_data is not None:
@@ -63,6 +64,11 @@ class SocketIOListener(Listener):
         # Nothing is removed by default
         return False
 
+    # Get the message fields passed to gen_response
+    def parse_message(self, message):
+        # The fields shared with the matchers are enough by default
+        return parse(message)
+
     # Generate a response based on the current message being handled
     def gen_response(self, em):
         # No response by default
@@ -86,6 +92,10 @@ class SocketIOObjectUpdateListener(SocketIOListener):
         """
         super(SocketIOObjectUpdateListener, self).__init__(matcher, socketio, 'update_object', '/object')
 
+    def parse_message(self, message):
+        # Managed objects are built from a librk message
+        return ExcryptMessage(message)
+
     def gen_response(self, em):
         response_data = None
         motype = ManagedObject.TYPE(em.getFieldAsInt("TY"))
@@ -17,6 +17,7 @@ Implements generic matchers for matching sent responses
 from abc import ABCMeta, abstractmethod
 
 from lib.utils.data_structures import ExcryptMessage
+from envelope import parse
 
 class Matcher(metaclass=ABCMeta):
     """
@@ -43,6 +44,14 @@ class Matcher(metaclass=ABCMeta):
         """
         return self.matched
 
+    def key(self):
+        """
+        The (synch tag, synch value) pair every matching response carries, used by the
+        connection handler to look up pending requests without running every matcher
+        :return: Tuple of tag and value, or None if responses can't be keyed
+        """
+        return None
+
     @abstractmethod
     def update_match_status(self, data):
         """
@@ -84,10 +93,19 @@ class SynchResponseMatcher(Matcher):
         response synch tag value with the stored synch tag value
         :param data: The data match against
         """
-        em = ExcryptMessage(data)
+        em = parse(data)
         self.matched = em.hasContext(self.synch_tag) and em.getContext(self.synch_tag) == self.synch_value
         return self.matched
 
+    def key(self):
+        """
+        Responses are keyed by the synch tag value when one was assigned
+        :return: Tuple of tag and value, or None if there is no synch value
+        """
+        if self.synch_tag and self.synch_value:
+            return (self.synch_tag, self.synch_value)
+        return None
+
     def update_match_status(self, data):
         """
         Updates the completion status object state
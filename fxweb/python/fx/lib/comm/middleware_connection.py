@@ -56,29 +56,11 @@ class MiddlewareConnection(ConnectionInterface):
         except socket.error:
             raise ErrorOnReadException('Could not read message from {}'.format(self.conn_data))
 
-        messages = []
-        work = self.conn_data.dangling + buff
-
-        # TODO rewrite to allow for standard messages
-        while b']' in work and b'[' in work:
-            start = work.find(b'[')
-            end = work.find(b']')
-            next_message = work[start:end+1]
-            # Bad buffer, extra [
-            if b'[' in next_message[1:]:
-                bad_index = next_message.find(b'[')
-                work = work[bad_index+1:]
-            else:
-                work = work[end+1:]
-                # Bad buffer, extra ]
-                if end < start:
-                    pass
-                else:
-                    messages.append(next_message)
-
-        self.conn_data.dangling = work
+        # Peer closed the connection
+        if not buff:
+            return []
 
-        return messages
+        return self.conn_data.framer.feed(buff)
 
     def send(self, message):
         """
@@ -143,7 +125,7 @@ class ConnectionData:
             conn: connection object for this context
         """
         self.conn = conn
-        self.dangling = b''
+        self.framer = ExcryptFramer()
         self.mutex = Lock()
         self.timeout = timeout
 
@@ -157,7 +139,7 @@ class ConnectionData:
         """
         Clears any buffers when we send a new command
         """
-        self.dangling = b''
+        self.framer.clear()
 
     def send(self, message, timeout=None):
         """
@@ -180,3 +162,63 @@ class ConnectionData:
             data = self.conn.recv(self.MAX_RECV)
 
         return data
+
+
+class ExcryptFramer:
+    """
+    Incremental parser that splits a received byte stream into Excrypt messages
+
+    Received data is appended to a single buffer that is scanned once. Complete
+    messages are copied out exactly once and the consumed prefix is dropped once
+    per feed, so a large receive holding thousands of messages stays linear.
+
+    Malformed input is handled like before:
+        - A message runs from the last '[' before a ']' to that ']'
+        - Data before that '[' is dropped
+        - A ']' without a '[' before it is dropped
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def clear(self):
+        """
+        Drops any partial message
+        """
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Adds received data and returns every message it completes
+        Args:
+            data: Received bytes
+        Returns:
+            List of complete messages as bytes
+        """
+        buf = self.buffer
+        # Data kept from the last feed has no ']', only scan the new data for one
+        scan = len(buf)
+        buf += data
+
+        messages = []
+        pos = 0
+        view = memoryview(buf)
+        try:
+            while True:
+                end = buf.find(b']', max(pos, scan))
+                if end < 0:
+                    break
+                start = buf.rfind(b'[', pos, end)
+                if start >= 0:
+                    messages.append(bytes(view[start:end + 1]))
+                pos = end + 1
+        finally:
+            view.release()
+
+        # Keep the partial message for the next feed
+        if pos:
+            del buf[:pos]
+
+        return messages
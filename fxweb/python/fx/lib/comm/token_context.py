@@ -21,6 +21,7 @@ from gevent.lock import BoundedSemaphore
 from werkzeug.exceptions import Unauthorized
 
 from lib.utils.data_structures import ExcryptMessage
+from envelope import parse
 from middleware_context import MiddlewareContext
 
 
@@ -57,7 +58,7 @@ class TokenContext(MiddlewareContext):
         """
         Update internal metadata with an Excrypt response
         """
-        msg = ExcryptMessage(response)
+        msg = parse(response)
         # if we failed to authenticate, continue sending the token:
         if msg.getField('JW') == 'N':
             self.token = None
@@ -16,45 +16,60 @@ Defines classes for data structures.
 """
 
 import enum
+import re
 from types import DynamicClassAttribute
 from typing import Callable, Dict, Union
 
+_INVALID_CHARS = re.compile(r'[;\[\]<>]')
+
 
 class ExcryptMessage(dict):
     """
     Dict-like implementation of an Excrypt message
+
+    Parsed fields are stored without going through __setitem__, since they are always
+    strings. The text of the message is cached until the message is modified.
     """
+    # Cached getText() result, reset by every modification
+    _text = None
+
     def __init__(self, message: Union[str, bytes, Dict[str, Union[str, bytes, int, None]]] = None, sanitize = True):
         self.sanitize = sanitize
         if message:
             if isinstance(message, str):
-                self.update({field[:2]: field[2:] for field in message[1:-1].split(';') if field})
+                dict.update(self, {field[:2]: field[2:] for field in message[1:-1].split(';') if field})
             elif isinstance(message, dict):
                 self.update(message)
             elif isinstance(message, bytes):
-                self.update(self.parse_bytes(message))
+                dict.update(self, self.parse_bytes(message))
 
-    def parse_bytes(self, msg):
+    @staticmethod
+    def parse_bytes(msg):
+        if msg.isascii():
+            # Almost every message is plain ASCII, decode it at once
+            return {field[:2]: field[2:] for field in msg[1:-1].decode('ascii').split(';') if field}
+
+        # Fields that aren't valid UTF-8 are decoded as latin
         tmp = {}
         for field in msg[1:-1].split(b';'):
             if field:
                 try:
-                    key = field[:2].decode()
-                    val = field[2:].decode()
-                    tmp[key] = val
+                    tmp[field[:2].decode()] = field[2:].decode()
                 except UnicodeDecodeError:
-                    key = field[:2].decode('latin')
-                    val = field[2:].decode('latin')
-                    tmp[key] = val
-                except Exception as e:
-                    raise e
+                    tmp[field[:2].decode('latin')] = field[2:].decode('latin')
         return tmp
 
     def getText(self, sanitized=False) -> str:
         if sanitized:
-            return '[' + ''.join(f'{self.sanitized(tag)}{self.sanitized(value)};'
-                                 for tag, value in self.items() if value is not None) + ']'
-        return '[' + ''.join(f'{tag}{value};' for tag, value in self.items() if value is not None) + ']'
+            return '[' + ''.join([f'{self.sanitized(tag)}{self.sanitized(value)};'
+                                  for tag, value in self.items() if value is not None]) + ']'
+        text = self._text
+        if text is None:
+            text = '[' + ''.join([f'{tag}{value};' for tag, value in self.items() if value is not None]) + ']'
+            if self.sanitize:
+                # Unsanitized messages may hold mutable values, those aren't cached
+                self._text = text
+        return text
 
     def getField(self, tag: str, default: str = '') -> str:
         return self.get(tag, default)
@@ -86,10 +101,8 @@ class ExcryptMessage(dict):
         """
         Find the first invalid Excrypt character, or None if the value is safe to encode
         """
-        for char in str(value):
-            if char in ";[]<>":
-                return char
-        return None
+        invalid = _INVALID_CHARS.search(str(value))
+        return invalid.group() if invalid else None
 
 
     @staticmethod
@@ -114,28 +127,53 @@ class ExcryptMessage(dict):
         return self.status in ('Y', None) and not self.message and self.getCommand() != 'ERRO'
 
     def __setitem__(self, tag: str, value: Union[str, bytes, int, None]) -> None:
-        if value in (None, ...):
+        if value is None or value is ...:
             return
         if self.sanitize and isinstance(value, int):
             # also True/False to 1/0
             value = int.__str__(value)
+        self._text = None
         return super().__setitem__(tag, value)
 
     __getitem__: Callable[[str], str]
 
+    def __delitem__(self, tag: str) -> None:
+        self._text = None
+        super().__delitem__(tag)
+
+    def pop(self, *args):
+        self._text = None
+        return super().pop(*args)
+
+    def popitem(self):
+        self._text = None
+        return super().popitem()
+
+    def setdefault(self, tag: str, default=None):
+        self._text = None
+        return super().setdefault(tag, default)
+
+    def clear(self) -> None:
+        self._text = None
+        super().clear()
+
     def copy(self) -> 'ExcryptMessage':
         return type(self)(super().copy())
 
-    def update(self, other, **kwargs) -> None:
-        # do what the builtin dict.update does but overridden so we actually call our __setitem__
-        # since CPython doesn't as an optimization
+    def update(self, other=(), **kwargs) -> None:
+        # do what the builtin dict.update does but overridden so values are handled like in our
+        # __setitem__ since CPython doesn't call it as an optimization
         other_items = getattr(other, 'items', None)
         if not other:
             pass
         elif other_items:
-            # dict-like interface
-            for key, value in other_items():
-                self[key] = value
+            # dict-like interface, the same filtering as __setitem__ in one pass
+            self._text = None
+            sanitize = self.sanitize
+            dict.update(self, {
+                key: int.__str__(value) if sanitize and isinstance(value, int) else value
+                for key, value in other_items() if value is not None and value is not ...
+            })
         else:
             # iterable of key-value tuples interface
             for key, value in other:
@@ -151,6 +189,38 @@ class ExcryptMessageResponse(ExcryptMessage):
     def __init__(self, message: Union[str, bytes, Dict[str, Union[str, bytes, int, None]]] = None):
         super().__init__(message, False)
 
+class FrozenExcryptMessage(ExcryptMessage):
+    """
+    Read-only ExcryptMessage, for parsed messages that are shared between several readers
+    """
+    def __init__(self, message: Union[str, bytes, Dict[str, Union[str, bytes, int, None]]] = None, sanitize = True):
+        if isinstance(message, dict):
+            # Filtered like any ExcryptMessage, without the update() that is blocked here
+            super().__init__(None, sanitize)
+            ExcryptMessage.update(self, message)
+        else:
+            super().__init__(message, sanitize)
+
+    def __reduce__(self):
+        # Copied, deep copied and unpickled messages are modifiable ExcryptMessages, like copy()
+        return ExcryptMessage, (dict(self), self.sanitize)
+
+    def __setitem__(self, tag, value):
+        raise TypeError('FrozenExcryptMessage cannot be modified')
+
+    def _modify(self, *args, **kwargs):
+        raise TypeError('FrozenExcryptMessage cannot be modified')
+
+    __delitem__ = pop = popitem = setdefault = clear = update = _modify
+
+    def copy(self) -> ExcryptMessage:
+        """
+        Get a modifiable copy of the message
+        """
+        em = ExcryptMessage(sanitize=self.sanitize)
+        dict.update(em, self)
+        return em
+
 class ImmutableBidict(dict):
     """
     Bijective mapping that acts like a dict but also supports reverse lookups.
@@ -16,6 +16,7 @@ Classes for routing to different views based on matching patterns in the request
 
 from itertools import zip_longest
 from functools import partialmethod
+from operator import attrgetter
 
 from flask import request
 from flask.views import MethodViewType
@@ -48,6 +49,9 @@ class Route:
         # For each HTTP verb named in the _routes, create a new view function to do the lookups:
         for verb, table in handlers.items():
             lookup_view = LookupView(verb, table)
+            duplicates = lookup_view.duplicate_views()
+            if duplicates:
+                raise DuplicateRoutesError(cls, verb, duplicates)
             curried_view = partialmethod(LookupView.view, lookup_view)
             setattr(cls, verb, curried_view)  # new view becomes ex: cls.post
         return cls
@@ -90,11 +94,18 @@ class LookupView:
     Class for a Flask view which checks the lookup tables to find a handling view
 
     Takes a table in the form of [{(view1, 'path.to.discriminator', )}]
+
+    The tables are compiled once when the class is decorated. Every view is a bit in an int, and
+    each table maps the values of each of its paths to the views they select, so a lookup reads
+    each path of the request once and narrows the matches with a few bitwise operations.
     """
     def __init__(self, verb, tables):
         self.verb = verb
         self.tables = tables
-        self.all_views = {pattern[0]:True for table in tables for pattern in table}
+        self.views = sorted({pattern[0] for table in tables for pattern in table}, key=attrgetter('__qualname__'))
+        self.all_views = (1 << len(self.views)) - 1
+        bits = {view: 1 << position for position, view in enumerate(self.views)}
+        self.compiled_tables = [CompiledTable(table, bits) for table in tables]
 
     def view(instance, self, *args, **kwargs):
         """
@@ -110,55 +121,96 @@ class LookupView:
         """
         Does the lookup to find a view whose patterns match the fields of the request
         """
-        matches = self.all_views
+        matches = specific = self.all_views
 
-        for table in self.tables:  # iteratively eliminate non-matching views:
-            new_matches = self.filter_with_table(matches, table, request_data)
+        for table in self.compiled_tables:  # iteratively eliminate non-matching views:
+            selected = table.select(request_data)
+            unlisted = matches & ~table.listed  # views which didn't have any patterns (they gave fewer args)
+            new_matches = matches & (selected | table.fallback) | unlisted
             if not new_matches:
-                raise MissingOptionsError(matches, table)
+                raise MissingOptionsError(self.views_in(matches), table.table)
+            # views only matched by a '*' path are the default, not a specific match
+            specific &= selected | unlisted
             matches = new_matches
 
-        if len(matches) == 1:  # success if 1 matching view
-            return matches.popitem()[0]
-        specific_matches = [view for view, specific in matches.items() if specific]
-        if len(specific_matches) == 1:  # success if 1 matching view when ignoring default
-            return specific_matches[0]
+        if not matches & (matches - 1):  # success if 1 matching view
+            return self.views[matches.bit_length() - 1]
+        specific &= matches
+        if specific and not specific & (specific - 1):  # success if 1 matching view when ignoring default
+            return self.views[specific.bit_length() - 1]
         # else: there must be more than one specific match
-        raise AmbiguousRequestError(specific_matches, self.tables, request_data)
+        raise AmbiguousRequestError(self.views_in(specific), self.tables, request_data)
+
+    def views_in(self, mask):
+        """
+        The views whose bits are set in mask
+        """
+        return [view for position, view in enumerate(self.views) if mask >> position & 1]
+
+    def duplicate_views(self):
+        """
+        Views with exactly the same patterns as another one, no request could ever tell them apart
+        """
+        signatures = {}
+        for view in self.views:
+            signature = tuple(frozenset((path, value) for handler, path, value in table if handler is view)
+                              for table in self.tables)
+            signatures.setdefault(signature, []).append(view)
+        return [view for views in signatures.values() if len(views) > 1 for view in views]
 
     def get_data_from_request(self):
         """
         Get the request query params for GET/DELETE, or JSON in request body for PUT/POST
         """
         if self.verb in {'put', 'post'}:
+            # returns the body the request decorators already parsed and sanitized, if they did
             return request.get_json(force=True)
         if isinstance(request.args, MultiDict):  # sanitizer may have changed type to dict
             return request.args.to_dict(flat=True)
         return request.args
 
-    @staticmethod
-    def filter_with_table(views, table, request_data):
-        """
-        Return the subset of the views which match request_data using the table
-        """
-        matches = {}
-        views_in_table = set()
+
+class CompiledTable:
+    """
+    A lookup table as bitmasks of the views it selects for each value of each path
+    """
+    def __init__(self, table, bits):
+        self.table = table
+        self.listed = 0  # views with patterns in this table
+        self.fallback = 0  # views with a '*' path, which match any request
+        paths = {}
         for view, path, value in table:
-            if view not in views:
-                continue
-            views_in_table.add(view)
+            bit = bits[view]
+            self.listed |= bit
             if path == '*':
-                matches.setdefault(view, False)
+                self.fallback |= bit
                 continue
-            request_value = dot_notation_get(request_data, path, default=Ellipsis)
-            if request_value is Ellipsis:  # data could actually be None/null, use sentinel
-                continue
-            if request_value == value or value == '*':
-                matches[view] = views[view]
+            any_value, by_value = paths.setdefault(path, [0, {}])
+            if value == '*':
+                paths[path][0] = any_value | bit
+            else:
+                by_value[value] = by_value.get(value, 0) | bit
+        # (keys of the path, views matching any value, {value: views matching it})
+        self.paths = [(tuple(path.split('.')), any_value, by_value) for path, (any_value, by_value) in paths.items()]
+
+    def select(self, request_data):
+        """
+        Bitmask of the views whose patterns match the fields of request_data
+        """
+        selected = 0
+        for keys, any_value, by_value in self.paths:
+            value = request_data
+            try:
+                for key in keys:
+                    value = value[key]
+            except (TypeError, LookupError):
                 continue
-        # add back any views which didn't have any patterns at all (they gave fewer args):
-        matches.update({view:views[view] for view in views.keys() - views_in_table})
-        return matches
+            selected |= any_value
+            try:
+                selected |= by_value.get(value, 0)
+            except TypeError:  # unhashable lists and objects never equal a pattern's value
+                pass
+        return selected
 
 
 class ViewDecorator:
@@ -206,6 +258,12 @@ class MissingOptionsError(UnroutableRequest):
         super().__init__(err)
 
 
+class DuplicateRoutesError(Exception):
+    def __init__(self, cls, verb, views):
+        names = ', '.join(view.__name__ for view in views)
+        super().__init__(f'{cls.__name__}.{verb}: {names} are routed by the same patterns')
+
+
 class AmbiguousRequestError(UnroutableRequest):
     def __init__(self, matches, tables, request_data):
         for table in reversed(tables):
@@ -0,0 +1,209 @@
+"""
+@file      test_app_database.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests the pooled database connections and cached configuration queries against a fake driver
+"""
+import socket
+import unittest
+from unittest import mock
+from nose.tools import *
+
+import gevent
+import psycopg2
+from psycopg2 import extensions
+
+import fx
+import app_database
+from rk_application_database import RKApplicationDatabase, VRRP_ADDRESSES_QUERY
+
+
+class FakeDriver:
+    """Stands in for psycopg2.connect, answering the RK configuration queries"""
+
+    def __init__(self):
+        self.configuration = {'csr_host_name': 'https://rk.example.com', 'dashboard_listen_port': '443'}
+        self.device_addresses = [('10.0.0.5',), ('0.0.0.0',)]
+        self.vrrp_addresses = [('10.0.0.9',)]
+        self.connections = []
+        self.queries = []
+        self.down = False
+
+    def __call__(self, dbname, user):
+        if self.down:
+            raise psycopg2.OperationalError('could not connect to server')
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def execute(self, query, params):
+        if self.down:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        self.queries.append(query)
+        if query == 'SELECT 1':
+            return [(1,)]
+        if query.startswith('SELECT item, value FROM configuration'):
+            return [(item, self.configuration[item]) for item in params[0] if item in self.configuration]
+        if query.startswith('SELECT value FROM configuration'):
+            item = params[0] if params else query.split("'")[1]
+            return [(self.configuration[item],)] if item in self.configuration else []
+        if query.startswith('SELECT device_address'):
+            return self.device_addresses
+        if query == VRRP_ADDRESSES_QUERY:
+            return self.vrrp_addresses
+        raise AssertionError(query)
+
+
+class FakeConnection:
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self.driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.rows = self.driver.execute(query, params)
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class TestAppDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = FakeDriver()
+        self.database = RKApplicationDatabase('remotekey', 'kmes', connect=self.driver)
+        self.addCleanup(app_database._pools.clear)
+        self.addCleanup(RKApplicationDatabase.clear_cache)
+
+    def test_connections_reused(self):
+        for _ in range(5):
+            assert_equals(self.database.get_config('dashboard_listen_port'), '443')
+        assert_equals(len(self.driver.connections), 1)
+        # other instances for the same database share the pool
+        RKApplicationDatabase('remotekey', 'kmes', connect=self.driver).get_web_server_port()
+        assert_equals(len(self.driver.connections), 1)
+
+    def test_broken_connection_replaced(self):
+        self.database.get_config('csr_host_name')
+        self.driver.down = True
+        assert_raises(psycopg2.OperationalError, self.database.get_config, 'csr_host_name')
+        assert_true(self.driver.connections[0].closed)
+        self.driver.down = False
+        assert_equals(self.database.get_config('csr_host_name'), 'https://rk.example.com')
+        assert_equals(len(self.driver.connections), 2)
+
+    def test_idle_connection_health_checked(self):
+        self.database.get_config('csr_host_name')
+        with mock.patch.object(app_database.time, 'monotonic', return_value=10 ** 9):
+            self.database.get_config('csr_host_name')
+        assert_in('SELECT 1', self.driver.queries)
+
+    def test_get_configs(self):
+        assert_equals(self.database.get_configs('csr_host_name', 'missing'),
+                      {'csr_host_name': 'https://rk.example.com', 'missing': None})
+        assert_equals(len(self.driver.queries), 1)
+
+    def test_expected_origins(self):
+        expected = ['https://rk.example.com', 'https://10.0.0.5:443', 'https://10.0.0.5',
+                    'https://10.0.0.9:443', 'https://10.0.0.9']
+        assert_equals(self.database.get_expected_origins(), expected)
+        assert_equals(len(self.driver.queries), 3)
+        assert_equals(len(self.driver.connections), 1)
+
+        # cached until the TTL passes
+        assert_equals(self.database.get_expected_origins(), expected)
+        assert_equals(len(self.driver.queries), 3)
+
+    def test_cache_ttl_and_stale_on_error(self):
+        assert_equals(self.database.get_jwt_headers(), ['Authorization'])
+        self.driver.configuration['jwt_custom_http_header'] = 'X_Custom_Token'
+        assert_equals(self.database.get_jwt_headers(), ['Authorization'])
+
+        later = app_database.time.monotonic() + 3600
+        with mock.patch('rk_application_database.time.monotonic', return_value=later):
+            assert_equals(self.database.get_jwt_headers(), ['X-Custom-Token', 'Authorization'])
+
+        self.driver.down = True
+        with mock.patch('rk_application_database.time.monotonic', return_value=later * 2):
+            assert_equals(self.database.get_jwt_headers(), ['X-Custom-Token', 'Authorization'])
+
+
+class PollingConnection:
+    """A connection in psycopg2's asynchronous protocol, waiting on a socket for its answer"""
+
+    def __init__(self):
+        self.sock, self.server = socket.socketpair()
+        self.states = [extensions.POLL_WRITE, extensions.POLL_READ]
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def poll(self):
+        if self.states:
+            return self.states.pop(0)
+        return extensions.POLL_OK
+
+
+class TestWaitCallback(unittest.TestCase):
+
+    def test_installed(self):
+        assert_is(extensions.get_wait_callback(), app_database.gevent_wait_callback)
+
+    def test_other_greenlets_run_while_waiting(self):
+        connection = PollingConnection()
+        self.addCleanup(connection.sock.close)
+        self.addCleanup(connection.server.close)
+        ran = []
+
+        def answer():
+            ran.append('other greenlet')
+            connection.server.sendall(b'answer')
+
+        gevent.spawn_later(0.01, answer)
+        app_database.gevent_wait_callback(connection)
+        assert_equals(ran, ['other greenlet'])
+        assert_equals(connection.states, [])
+
+    def test_bad_poll_state(self):
+        connection = PollingConnection()
+        self.addCleanup(connection.sock.close)
+        self.addCleanup(connection.server.close)
+        connection.states = [99]
+        assert_raises(psycopg2.OperationalError, app_database.gevent_wait_callback, connection)
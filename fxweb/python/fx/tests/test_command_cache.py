@@ -0,0 +1,106 @@
+"""
+@file      test_command_cache.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests caching command results
+"""
+import unittest
+from unittest import mock
+from nose.tools import *
+
+from flask import Flask, g
+
+import fx
+import base_command
+from base_command import BaseCommand, CachedCommandMixin, CommandCache
+
+
+class FakeServerInterface:
+    """Answers every command with a new response, counting them"""
+
+    def __init__(self, answer='Y'):
+        self.answer = answer
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+        return f'[AOTEST;AN{self.answer};CT{len(self.sent)};]'
+
+
+class CachedTest(CachedCommandMixin, BaseCommand):
+    name = 'internal_cached_test'
+
+
+class TestCommandCache(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(base_command, 'command_cache', CommandCache(max_size=4))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = FakeServerInterface()
+
+    def send(self, data=None, server=None):
+        return CachedTest(server or self.server).send(data or {'FN': 'types'})
+
+    def test_hit_and_miss(self):
+        assert_equals(self.send()['CT'], '1')
+        assert_equals(self.send()['CT'], '1')
+        assert_equals(self.send({'FN': 'flags'})['CT'], '2')
+        assert_equals(len(self.server.sent), 2)
+        assert_equals((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_ttl(self):
+        with mock.patch.object(base_command.time, 'monotonic', return_value=1000):
+            self.send()
+        with mock.patch.object(base_command.time, 'monotonic', return_value=1000 + CachedTest.cache_ttl):
+            assert_equals(self.send()['CT'], '2')
+        assert_equals(self.cache.stats()['expirations'], 1)
+
+    def test_lru_eviction(self):
+        for n in range(5):
+            self.send({'ID': n})
+        self.send({'ID': 1})  # still cached
+        assert_equals(len(self.server.sent), 5)
+        self.send({'ID': 0})  # least recently used was evicted
+        assert_equals(len(self.server.sent), 6)
+        assert_equals(self.cache.stats()['evictions'], 2)
+
+    def test_failures_not_cached(self):
+        self.server.answer = 'N'
+        self.send()
+        self.send()
+        assert_equals(len(self.server.sent), 2)
+
+    def test_scoped_by_interface_and_user(self):
+        other = FakeServerInterface()
+        self.send()
+        self.send(server=other)
+        assert_equals((len(self.server.sent), len(other.sent)), (1, 1))
+
+        app = Flask(__name__)
+        for jwt in ('alice', 'bob', 'alice'):
+            with app.test_request_context():
+                g.jwt = jwt
+                self.send()
+        assert_equals(len(self.server.sent), 3)
+
+    def test_invalidate(self):
+        other = FakeServerInterface()
+        self.send()
+        self.send(server=other)
+        assert_equals(CachedCommandMixin.invalidate_cached('internal_cached_test', self.server), 1)
+        self.send()
+        self.send(server=other)
+        assert_equals((len(self.server.sent), len(other.sent)), (2, 1))
+
+        assert_equals(CachedCommandMixin.invalidate_cached('internal_cached_test'), 2)
+        assert_equals(self.cache.stats()['size'], 0)
@@ -0,0 +1,142 @@
+"""
+@file      test_command_pipeline.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests sending the commands of multi command translators through the command pipeline,
+shared/bench/command_pipeline_bench.py times them
+"""
+import time
+import unittest
+from unittest import mock
+from nose.tools import *
+
+import gevent
+
+import fx
+from base.base_translator import CommandPipeline
+from kmes.translators.key_groups import CreateKeyFolder, RetrieveKeyGroup
+from kmes.translators.user_groups import RetrieveUserGroup
+from lib.utils.data_structures import ExcryptMessage
+
+LATENCY = 0.02
+
+RESPONSES = {
+    'RKVS': '[AORKVS;ANY;NAPayments;PAroot;OWadmin;RM0;]',
+    'RKPD': '[AORKPD;ANY;PL;]',
+    'RKPS': '[AORKPS;ANY;TYUser,Key;DSUsers,Keys;]',
+    'RKRP': '[AORKRP;ANY;NU1;SLlocal;]',
+    'RKCS': '[AORKCS;ANY;ID1234;]',
+    'RKPM': '[AORKPM;ANY;]',
+}
+
+
+class FakeServerInterface:
+    """Answers commands from canned responses after a round trip of latency seconds"""
+
+    def __init__(self, latency=LATENCY, responses=RESPONSES):
+        self.latency = latency
+        self.responses = dict(responses)
+        self.sent = []  # (command, sent at, answered at)
+
+    def send_command(self, category, name, request_data):
+        sent = time.monotonic()
+        gevent.sleep(self.latency)
+        self.sent.append((name, sent, time.monotonic()))
+        return ExcryptMessage(self.responses[name])
+
+
+def one_at_a_time(cls):
+    """Send the commands one after the other, as before they were pipelined"""
+    return mock.patch.object(cls, 'command_dependencies', None)
+
+
+class TestCommandPipeline(unittest.TestCase):
+
+    def test_dependencies_checked(self):
+        assert_raises(ValueError, CommandPipeline, ['A', 'B'], [(), (1,)])
+        assert_raises(ValueError, CommandPipeline, ['A', 'B'], [()])
+
+    def test_dependents_wait_for_inputs(self):
+        events = []
+
+        def send(i):
+            events.append(('sent', i))
+            gevent.sleep(LATENCY * (2 if i == 0 else 1))
+            return i
+
+        pipeline = CommandPipeline(['A', 'B', 'C'], [(), (0,), ()])
+        assert_true(pipeline.run(send, lambda i, response: events.append(('received', i))))
+        # A and C are sent together, B once A is received
+        assert_equals(events[:2], [('sent', 0), ('sent', 2)])
+        assert_less(events.index(('received', 0)), events.index(('sent', 1)))
+        assert_equals([timing.command for timing in pipeline.timings], ['A', 'B', 'C'])
+        assert_greater(pipeline.timings[1].started, pipeline.timings[0].seconds)
+
+    def test_stop_skips_dependents(self):
+        sent = []
+
+        def send(i):
+            sent.append(i)
+            return i
+
+        pipeline = CommandPipeline(['A', 'B', 'C'])
+        assert_false(pipeline.run(send, lambda i, response: i != 0))
+        assert_equals(sent, [0])
+        assert_equals(pipeline.timings[1:], [None, None])
+
+    def test_first_error_raised(self):
+        def send(i):
+            gevent.sleep(LATENCY if i == 0 else 0)
+            raise KeyError(i)
+
+        with assert_raises(KeyError) as raised:
+            CommandPipeline(['A', 'B'], [(), ()]).run(send, lambda i, response: None)
+        assert_equals(raised.exception.args, (0,))
+
+
+class TestPipelinedTranslators(unittest.TestCase):
+
+    def translate(self, cls, request, pipelined=True):
+        server = FakeServerInterface()
+        if pipelined:
+            return cls(server).translate(request), server
+        with one_at_a_time(cls):
+            return cls(server).translate(request), server
+
+    def test_same_as_one_at_a_time(self):
+        for cls, request in ((RetrieveKeyGroup, {'id': 'Payments'}), (RetrieveUserGroup, {'group': 'Admins'})):
+            response, server = self.translate(cls, request)
+            expected, _ = self.translate(cls, request, pipelined=False)
+            assert_equals(response, expected)
+            # Both commands were in flight together
+            (_, first_sent, first_answered), (_, second_sent, _) = sorted(server.sent, key=lambda sent: sent[1])
+            assert_less(second_sent, first_answered)
+
+    def test_failure_reported_in_order(self):
+        server = FakeServerInterface(responses={**RESPONSES, 'RKVS': '[AORKVS;ANN;BBNo such key group;]'})
+        response = RetrieveKeyGroup(server).translate({'id': 'Missing'})
+        assert_equals(response['message'], 'No such key group')
+        assert_not_in('permissions', response)
+
+    def test_writes_stay_sequential(self):
+        server = FakeServerInterface(responses={**RESPONSES, 'RKCS': '[AORKCS;ANN;BBDuplicate name;]'})
+        response = CreateKeyFolder(server).translate({'name': 'Payments', 'permissions': {}})
+        assert_equals(response['message'], 'Duplicate name')
+        assert_equals([name for name, _, _ in server.sent], ['RKCS'])
+
+    def test_step_timings(self):
+        server = FakeServerInterface()
+        translator = RetrieveUserGroup(server)
+        translator.translate({'group': 'Admins'})
+        assert_equals([timing.command for timing in translator.step_timings], ['RKPS', 'RKRP'])
+        for timing in translator.step_timings:
+            assert_greater_equal(timing.seconds, LATENCY)
@@ -0,0 +1,91 @@
+"""
+@file      test_connection_wakeup.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests the connection handler wakes up for readable connections, shared/bench/connection_wakeup_bench.py
+measures how long that takes
+"""
+import socket
+import time
+import unittest
+from unittest import mock
+from nose.tools import *
+
+from gevent.event import Event
+
+import fx
+import connection_handler
+from connection_handler import MiddlewareConnectionHandler
+from middleware_connection import MiddlewareConnection, ConnectionData
+
+MESSAGE = b'[AOECHO;]'
+
+
+def socketpair_connection():
+    """A connection to a local peer socket, without the TLS setup of a real one"""
+    conn, peer = socket.socketpair()
+    connection = MiddlewareConnection.__new__(MiddlewareConnection)
+    connection.conn_data = ConnectionData(conn=conn)
+    return connection, peer
+
+
+class WakeupListener:
+    """Message listener recording when the handler dispatched the last message"""
+
+    def __init__(self):
+        self.received = Event()
+        self.at = None
+
+    def handle(self, message, conn):
+        self.at = time.perf_counter()
+        self.received.set()
+        return lambda: None
+
+
+class TestWakeupLatency(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = MiddlewareConnectionHandler(None)
+        self.listener = WakeupListener()
+        self.handler.add_message_listener(self.listener)
+        self.connections = []
+        self.addCleanup(self.close)
+
+    def close(self):
+        self.handler.reset()
+        self.handler.kill()
+        for conn, peer in self.connections:
+            conn.close()
+            peer.close()
+
+    def register(self, conn):
+        with mock.patch.object(connection_handler.ConnectionFactory, 'create_connection', return_value=conn):
+            assert_true(self.handler.connect(object()))
+
+    def open(self, count):
+        """Grow the handler's open connections to count"""
+        while len(self.connections) < count:
+            conn, peer = socketpair_connection()
+            self.register(conn)
+            self.connections.append((conn, peer))
+
+    def wakeup(self, peer):
+        self.listener.received.clear()
+        start = time.perf_counter()
+        peer.sendall(MESSAGE)
+        assert_true(self.listener.received.wait(1.0))
+        return self.listener.at - start
+
+    def test_wakes_for_each_message(self):
+        self.open(3)
+        for _, peer in self.connections * 2:
+            self.wakeup(peer)
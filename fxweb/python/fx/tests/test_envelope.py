@@ -0,0 +1,81 @@
+"""
+@file      test_envelope.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests the parsed message envelope shared by matchers, listeners and handlers
+"""
+import copy
+import pickle
+import unittest
+from unittest import mock
+from nose.tools import *
+
+import fx
+import envelope
+from envelope import Envelope, parse
+from matcher import SynchResponseMatcher
+from lib.utils.data_structures import ExcryptMessage, FrozenExcryptMessage
+
+RESPONSE = b'[AOECHO;AG12;BB;]'
+
+
+class TestEnvelope(unittest.TestCase):
+
+    def test_behaves_like_bytes(self):
+        message = Envelope(RESPONSE)
+        assert_equals(message, RESPONSE)
+        assert_equals(b''.join([message, message]), RESPONSE * 2)
+        assert_equals(message.decode('latin'), RESPONSE.decode())
+
+    def test_parsed_once(self):
+        message = Envelope(RESPONSE)
+        assert_true(parse(message) is message.em)
+        assert_equals(message.em.getField('AG'), '12')
+
+    def test_fields_are_read_only(self):
+        message = Envelope(RESPONSE)
+        with assert_raises(TypeError):
+            message.em['AG'] = '13'
+        with assert_raises(TypeError):
+            message.em.update({'AG': '13'})
+        with assert_raises(TypeError):
+            del message.em['AG']
+
+    def test_message_is_modifiable_copy(self):
+        message = Envelope(RESPONSE)
+        em = message.message()
+        em['AG'] = '13'
+        assert_equals(em.getText(), '[AOECHO;AG13;BB;]')
+        assert_equals(message.em.getField('AG'), '12')
+
+    def test_fields_copy_and_pickle(self):
+        em = Envelope(RESPONSE).em
+        for other in (copy.copy(em), copy.deepcopy(em), pickle.loads(pickle.dumps(em))):
+            assert_equals(other, em)
+            assert_equals(other.getText(), em.getText())
+            other['AG'] = '13'
+        assert_equals(em.getField('AG'), '12')
+
+        frozen = FrozenExcryptMessage({'AO': 'ECHO', 'FS': 2, 'NA': None})
+        assert_equals(dict(frozen), {'AO': 'ECHO', 'FS': '2'})
+
+    def test_matcher_does_not_parse_envelope(self):
+        message = Envelope(RESPONSE)
+        matcher = SynchResponseMatcher('AG', '12')
+        with mock.patch.object(envelope, 'ExcryptMessage', side_effect=AssertionError):
+            assert_true(matcher.matches(message))
+            matcher.update_match_status(message)
+        assert_true(matcher.is_complete)
+
+    def test_raw_messages_still_parsed(self):
+        assert_equals(parse(RESPONSE), ExcryptMessage(RESPONSE))
+        assert_true(SynchResponseMatcher('AG', '12').matches(RESPONSE))
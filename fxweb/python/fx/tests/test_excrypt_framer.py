@@ -0,0 +1,122 @@
+"""
+@file      test_excrypt_framer.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Fuzz and throughput tests for the incremental Excrypt message framer
+"""
+import random
+import time
+import unittest
+from nose.tools import *
+
+import fx
+from middleware_connection import ExcryptFramer
+
+FUZZ_ROUNDS = 2000
+
+
+def reference_parse(chunks):
+    """
+    The original MiddlewareConnection.receive parser, fed chunk by chunk
+    """
+    messages = []
+    dangling = b''
+    for buff in chunks:
+        work = dangling + buff
+        while b']' in work and b'[' in work:
+            start = work.find(b'[')
+            end = work.find(b']')
+            next_message = work[start:end+1]
+            if b'[' in next_message[1:]:
+                bad_index = next_message.find(b'[')
+                work = work[bad_index+1:]
+            else:
+                work = work[end+1:]
+                if end >= start:
+                    messages.append(next_message)
+        dangling = work
+    return messages
+
+
+def split_randomly(rand, data):
+    chunks = []
+    while data:
+        size = rand.randint(1, 16)
+        chunks.append(data[:size])
+        data = data[size:]
+    return chunks
+
+
+def rky400(index):
+    return '[AORKY400;AG17;MNKEY;TY3;ID{0};NAKey {0};BB;]'.format(index).encode()
+
+
+class TestExcryptFramer(unittest.TestCase):
+
+    def test_single_message(self):
+        framer = ExcryptFramer()
+        assert_equals(framer.feed(b'[AOECHO;AG1;]'), [b'[AOECHO;AG1;]'])
+        assert_equals(len(framer), 0)
+
+    def test_split_message(self):
+        framer = ExcryptFramer()
+        assert_equals(framer.feed(b'[AOEC'), [])
+        assert_equals(framer.feed(b'HO;AG1;][AO'), [b'[AOECHO;AG1;]'])
+        assert_equals(framer.feed(b'ECHO;]'), [b'[AOECHO;]'])
+
+    def test_extra_open_bracket(self):
+        framer = ExcryptFramer()
+        assert_equals(framer.feed(b'[AOBAD[AOECHO;]'), [b'[AOECHO;]'])
+
+    def test_extra_close_bracket(self):
+        framer = ExcryptFramer()
+        assert_equals(framer.feed(b'junk];][AOECHO;]'), [b'[AOECHO;]'])
+
+    def test_clear(self):
+        framer = ExcryptFramer()
+        framer.feed(b'[AOECHO;')
+        framer.clear()
+        assert_equals(framer.feed(b'AG1;]'), [])
+
+    def test_fuzz_against_reference(self):
+        rand = random.Random(1234)
+        alphabet = b'[];AOG1x'
+        for _ in range(FUZZ_ROUNDS):
+            data = bytes(rand.choice(alphabet) for _ in range(rand.randint(0, 64)))
+            chunks = split_randomly(rand, data)
+
+            framer = ExcryptFramer()
+            messages = []
+            for chunk in chunks:
+                messages.extend(framer.feed(chunk))
+
+            assert_equals(messages, reference_parse(chunks), data)
+
+    def test_rky400_burst_throughput(self):
+        # A 1 MiB receive holding thousands of filter responses
+        parts = []
+        size = 0
+        while size < 1024 * 1024:
+            parts.append(rky400(len(parts)))
+            size += len(parts[-1])
+        burst = b''.join(parts)
+        count = len(parts)
+
+        framer = ExcryptFramer()
+        start = time.time()
+        messages = framer.feed(burst)
+        elapsed = time.time() - start
+
+        assert_equals(len(messages), count)
+        assert_equals(messages[-1], rky400(count - 1))
+        # The old slicing parser is over 10x slower on this burst
+        assert_less(elapsed, 0.5)
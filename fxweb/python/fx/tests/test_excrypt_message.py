@@ -0,0 +1,121 @@
+"""
+@file      test_excrypt_message.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Compatibility tests for the ExcryptMessage codec, shared/bench/excrypt_message_bench.py times it
+"""
+import random
+import unittest
+from nose.tools import *
+
+import fx
+from lib.utils.data_structures import ExcryptMessage, ExcryptMessageResponse
+
+FUZZ_ROUNDS = 5000
+
+GDKM = b'[AOGDKM;OPread-cskl-session;SI0f1e2d3c4b5a69788796a5b4c3d2e1f0;IDVMK;ANY;FU1;KC9A1B;ST1;]'
+
+
+class ReferenceExcryptMessage(dict):
+    """
+    The original ExcryptMessage parsing and serialization
+    """
+    def __init__(self, message=None, sanitize=True):
+        self.sanitize = sanitize
+        if message:
+            if isinstance(message, str):
+                self.update({field[:2]: field[2:] for field in message[1:-1].split(';') if field})
+            elif isinstance(message, dict):
+                self.update(message)
+            elif isinstance(message, bytes):
+                self.update(self.parse_bytes(message))
+
+    def parse_bytes(self, msg):
+        tmp = {}
+        for field in msg[1:-1].split(b';'):
+            if field:
+                try:
+                    tmp[field[:2].decode()] = field[2:].decode()
+                except UnicodeDecodeError:
+                    tmp[field[:2].decode('latin')] = field[2:].decode('latin')
+        return tmp
+
+    def getText(self):
+        return '[' + ''.join(f'{tag}{value};' for tag, value in self.items() if value is not None) + ']'
+
+    def __setitem__(self, tag, value):
+        if value in (None, ...):
+            return
+        if self.sanitize and isinstance(value, int):
+            value = int.__str__(value)
+        return super().__setitem__(tag, value)
+
+    def update(self, other, **kwargs):
+        for key, value in other.items():
+            self[key] = value
+
+
+class TestExcryptMessage(unittest.TestCase):
+
+    def test_parse(self):
+        em = ExcryptMessage(GDKM)
+        assert_equals(em.getCommand(), 'GDKM')
+        assert_equals(em.getField('ID'), 'VMK')
+        assert_equals(em.getFieldAsInt('FU'), 1)
+        assert_equals(ExcryptMessage(GDKM.decode()), em)
+
+    def test_non_utf8_field(self):
+        em = ExcryptMessage(b'[AOECHO;NA\xe9t\xe9;CM\xc3\xa9;]')
+        assert_equals(em['NA'], '\xe9t\xe9')
+        assert_equals(em['CM'], '\xe9')
+
+    def test_fuzz_against_reference(self):
+        rand = random.Random(1234)
+        alphabet = b'[];AOBB1x\xc3\xa9\xff'
+        for _ in range(FUZZ_ROUNDS):
+            data = bytes(rand.choice(alphabet) for _ in range(rand.randint(0, 40)))
+            em = ExcryptMessage(data)
+            expected = ReferenceExcryptMessage(data)
+            assert_equals(dict(em), dict(expected), data)
+            assert_equals(em.getText(), expected.getText(), data)
+
+    def test_from_dict(self):
+        fields = {'AO': 'ECHO', 'FS': 2, 'NA': None, 'XX': ...}
+        assert_equals(dict(ExcryptMessage(fields)), {'AO': 'ECHO', 'FS': '2'})
+        assert_equals(dict(ExcryptMessage(fields)), dict(ReferenceExcryptMessage(fields)))
+        assert_equals(dict(ExcryptMessageResponse({'FS': 2})), {'FS': 2})
+
+    def test_text_follows_modifications(self):
+        em = ExcryptMessage(GDKM)
+        text = em.getText()
+        assert_equals(text, GDKM.decode())
+
+        em['ZZ'] = 1
+        assert_equals(em.getText(), text[:-1] + 'ZZ1;]')
+        del em['ZZ']
+        assert_equals(em.getText(), text)
+        em.update({'FU': '0'})
+        assert_true('FU0;' in em.getText())
+        em.pop('FU')
+        assert_false('FU' in em.getText())
+        em.setdefault('FU', '2')
+        assert_true('FU2;' in em.getText())
+        em.clear()
+        assert_equals(em.getText(), '[]')
+
+    def test_copy(self):
+        em = ExcryptMessage(GDKM)
+        em.getText()
+        other = em.copy()
+        other['ID'] = 'FTK'
+        assert_true('IDVMK;' in em.getText())
+        assert_true('IDFTK;' in other.getText())
@@ -0,0 +1,270 @@
+"""
+@file      test_key_table.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests searching the byok key table index, shared/bench/key_table_bench.py times it
+"""
+import json
+import random
+import time
+import unittest
+from operator import attrgetter
+from unittest import mock
+from nose.tools import *
+
+import fx
+from byok.models.keys import KeySlotSummary
+from byok.utils import key_table
+from byok.utils.key_table import KeyTable, KeyTableIndex, mutated_slots
+from lib.utils.data_structures import ExcryptMessage
+
+TABLE_SIZE = 25450
+KEY_TYPES = ('AES-128', 'AES-256', '3TDES', 'RSA-2048', 'ECC')
+USAGES = ('Encrypt', 'Decrypt', 'Sign', 'Verify', 'Wrap', 'Unwrap', 'MAC')
+
+
+def synthetic_table(size, used_every=1, seed=1234):
+    """A key table like rebuild_table builds, with every used_every-th slot holding a key"""
+    rand = random.Random(seed)
+    table = {}
+    for slot in range(size):
+        if slot % used_every:
+            entry = KeySlotSummary(slot=slot, type='Empty', kcv=None, label=None, modifier=None,
+                                   majorKey=None, usage=None, securityUsage=None)
+        else:
+            entry = KeySlotSummary(
+                slot=slot,
+                type=rand.choice(KEY_TYPES),
+                kcv='{:04X}'.format(rand.getrandbits(16)),
+                label='Key {} {}'.format(rand.choice(('Payments', 'Vault', 'Backup', 'Issuer')), slot),
+                modifier=rand.randint(0, 15),
+                majorKey=rand.choice(('PMK', 'MFK', 'KEK')),
+                usage=tuple(rand.sample(USAGES, 2)),
+                securityUsage=('Private',) if rand.random() < 0.5 else (),
+            )
+        table[KeyTable.merged_search_str(entry)] = entry
+    return table
+
+
+def reference_search(table, substr, order_by, ascending, empty):
+    """The original linear KeyTable.search"""
+    results = [entry for search_str, entry in table.items()
+               if (empty or entry.type != 'Empty') and substr in search_str]
+    return sorted(results, key=attrgetter(order_by), reverse=not ascending)
+
+
+class TestKeyTableIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = synthetic_table(TABLE_SIZE, used_every=3)
+
+    def setUp(self):
+        self.index = KeyTableIndex(self.table)
+
+    def check(self, substr, order_by='slot', ascending=True, empty=False):
+        results = self.index.search(substr, order_by, ascending, empty)
+        expected = reference_search(self.table, substr, order_by, ascending, empty)
+        assert_equals(len(results), len(expected))
+        assert_equals([entry.slot for entry in results[:]], [entry.slot for entry in expected])
+        return results
+
+    def test_no_search(self):
+        for empty in (True, False):
+            for ascending in (True, False):
+                self.check('', 'slot', ascending, empty)
+                self.check('', 'type', ascending, empty)
+
+    def test_substring_lengths(self):
+        for substr in ('a', 'ke', 'key', 'vault', 'key vault 9', 'no such key'):
+            self.check(substr, 'label')
+
+    def test_typing_narrows(self):
+        for end in range(1, len('payments 1')):
+            self.check('payments 1'[:end], 'kcv', False)
+        # And backspacing widens again
+        self.check('pay', 'kcv', False)
+
+    def test_orderings_with_ties(self):
+        for order_by in ('type', 'majorKey', 'modifier'):
+            for ascending in (True, False):
+                self.check('aes', order_by, ascending, True)
+                self.check('1', order_by, ascending, False)
+
+    def test_pagination(self):
+        results = self.check('backup', 'label')
+        assert_equals(results[20:40], list(results)[20:40])
+        assert_equals(results[-1], list(results)[-1])
+
+
+class FakeServerInterface:
+    """Answers GDKM read-keyslot from a dict of slot -> GPKS response"""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.requests = []
+
+    def send_msg(self, msgs, context=None):
+        self.requests.extend(msgs)
+        return [ExcryptMessage(self.slots[int(msg['BD'])]) for msg in msgs]
+
+
+class TestKeyTableRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServerInterface({
+            3: '[AOGDKM;CTC;AEBEEF;LBRotated key;AS2;FS6;CYED;SF3;]',
+            6: '[AOGDKM;CT0;]',
+            7: '[AOGDKM;BBSESSION NOT FOUND;]',
+        })
+        self.table = KeyTable(self.server, 'S1', 1)
+        self.table.table.update(synthetic_table(12, used_every=3))
+        self.table.index = KeyTableIndex(self.table.table)
+        self.table.table_build_time = time.time()
+        patcher = mock.patch.object(key_table, 'current_user')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_slot_patched_in_place(self):
+        self.table.invalidate_slots([3, 6])
+        with mock.patch.object(self.table, 'rebuild_table') as rebuild:
+            results = self.table.search('rotated', 'slot', True, False)
+        assert_false(rebuild.called)
+        assert_equals([msg['BD'] for msg in self.server.requests], ['3', '6'])
+
+        assert_equals(len(results), 1)
+        entry = results[0]
+        assert_equals((entry.slot, entry.type, entry.kcv, entry.modifier, entry.majorKey),
+                      (3, 'AES-256', 'BEEF', 2, 'PMK'))
+        assert_equals(entry.usage, ('Encrypt', 'Decrypt'))
+        assert_equals(entry.securityUsage, ('Private', 'Sensitive'))
+
+        # Slot 6 was erased, and the table is still in slot order
+        assert_equals([entry.slot for entry in self.table.search('', 'slot', True, False)], [0, 3, 9])
+        assert_equals([entry.slot for entry in self.table.table.values()], list(range(12)))
+        assert_equals(self.table.stale_slots, set())
+
+    def test_failed_read_rebuilds(self):
+        self.table.invalidate_slots([7])
+        with mock.patch.object(self.table, 'rebuild_table') as rebuild:
+            self.table.search('', 'slot', True, False)
+        assert_true(rebuild.called)
+
+    def test_failed_send_expires_table(self):
+        self.table.invalidate_slots([3])
+        with mock.patch.object(self.server, 'send_msg', side_effect=TimeoutError()):
+            with assert_raises(TimeoutError):
+                self.table.search('', 'slot', True, False)
+        assert_equals(self.table.stale_slots, {3})
+        assert_true(self.table.is_expired)
+
+    def test_rebuild_metrics(self):
+        rebuilds = key_table.metrics.rebuilds
+        with mock.patch.object(self.table, '_query_key_attrs'):
+            self.table.rebuild_table()
+        assert_equals(self.table.rebuild_count, 1)
+        assert_equals(key_table.metrics.rebuilds, rebuilds + 1)
+        assert_equals(key_table.metrics.to_dict()['last_rebuild_seconds'], key_table.metrics.last_rebuild_seconds)
+
+    def test_mutated_slots(self):
+        response = mock.Mock(response=[json.dumps({'slot': 4, 'tpkSlot': 5, 'result': 'Success'}).encode()])
+        assert_equals(mutated_slots(response, None), {4, 5})
+        assert_equals(mutated_slots(mock.Mock(response=[b'{"result": "Success"}']), 9), {9})
+        assert_equals(mutated_slots(mock.Mock(response=[b'{"result": "Success"}']), None), set())
+
+
+class TestSharedKeyTables(unittest.TestCase):
+    """Key tables are shared by every connection with the same roles and permissions on the cluster session"""
+
+    def setUp(self):
+        from byok import byok_interface
+        with mock.patch.object(byok_interface.rkasi.RKHostApplicationServerInterface, '__init__', return_value=None):
+            self.server = byok_interface.ByokServerInterface(None)
+        # connection token -> its roles and permissions on S1, None if it can't read them
+        self.roles = {'alice': ('Admin', 'Keys:All Slots'), 'bob': ('Admin', 'Keys:All Slots'),
+                      'carol': ('Operator', 'Keys:1'), 'mallory': None}
+        self.sent = []
+        self.token = 'alice'
+        patchers = [
+            mock.patch.object(byok_interface.ByokServerInterface, '_context_token',
+                              new_callable=mock.PropertyMock, side_effect=lambda: self.token),
+            mock.patch.object(self.server, 'send_msg', side_effect=self.send_msg, create=True),
+            mock.patch.object(KeyTable, 'rebuild_table', autospec=True, side_effect=self.rebuild_table),
+            mock.patch.object(key_table, 'current_user'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.rebuilt_by = []
+
+    def send_msg(self, msg, context=None):
+        self.sent.append((self.token, msg['AO'], msg['OP']))
+        roles = self.roles[self.token]
+        if roles is None:
+            return ExcryptMessage('[AOGDGD;BBSESSION NOT FOUND;]')
+        return ExcryptMessage('[AOGDGD;CNY;LCY;RO{};PR{};]'.format(*roles))
+
+    def rebuild_table(self, table):
+        self.rebuilt_by.append(self.token)
+        table.table.update(synthetic_table(12))
+        table.index = KeyTableIndex(table.table)
+        table.table_build_time = time.time()
+
+    def query(self, token):
+        self.token = token
+        return self.server.query_keyslots('S1', 1, '', 'slot', True, False)
+
+    def test_built_once_per_cluster_session(self):
+        assert_equals(len(self.query('alice')), 12)
+        assert_equals(len(self.query('bob')), 12)
+        assert_equals(self.rebuilt_by, ['alice'])
+
+    def test_other_permissions_get_other_table(self):
+        self.query('alice')
+        self.query('carol')
+        self.query('bob')
+        assert_equals(self.rebuilt_by, ['alice', 'carol'])
+
+    def test_unknown_permissions_get_own_table(self):
+        self.query('alice')
+        self.query('mallory')
+        assert_equals(self.rebuilt_by, ['alice', 'mallory'])
+        assert_equals(self.server._context_locals['alice'].keyslot_cache, {})
+        assert_in(('S1', 1), self.server._context_locals['mallory'].keyslot_cache)
+
+    def test_permissions_read_once_per_connection(self):
+        for _ in range(3):
+            self.query('alice')
+            self.query('bob')
+        assert_equals(self.sent, [('alice', 'GDGD', 'login-status'), ('bob', 'GDGD', 'login-status')])
+
+    def test_changed_permissions_read_again(self):
+        self.query('bob')
+        self.roles['bob'] = ('Operator', 'Keys:1')
+        from byok import byok_interface
+        with mock.patch.object(byok_interface, 'KEYSLOT_VISIBILITY_MAX_AGE', -1):
+            self.query('bob')
+        assert_equals(self.rebuilt_by, ['bob', 'bob'])
+
+    def test_login_reads_permissions_again(self):
+        self.query('mallory')
+        self.roles['mallory'] = self.roles['alice']
+        self.server.forget_session_visibility('S1')
+        self.query('mallory')
+        self.query('alice')
+        assert_equals(self.rebuilt_by, ['mallory', 'mallory'])
+
+    def test_invalidate_shared_table(self):
+        self.query('alice')
+        self.server.invalidate_keyslot_cache('S1', 1)
+        self.query('bob')
+        assert_equals(self.rebuilt_by, ['alice', 'bob'])
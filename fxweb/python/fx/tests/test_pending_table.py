@@ -0,0 +1,78 @@
+"""
+@file      test_pending_table.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests the connection handler pending response table
+"""
+import time
+import unittest
+from nose.tools import *
+
+import fx
+from connection_handler import PendingTable, SentData
+from matcher import SynchResponseMatcher
+from app_matcher import DeleteObjectMatcher
+from handler import RespondHandler
+from lib.utils.data_structures import ExcryptMessage
+
+OUTSTANDING = 1000
+
+
+class TestPendingTable(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = object()
+        self.table = PendingTable()
+        self.pending = []
+        for i in range(OUTSTANDING):
+            sd = SentData(SynchResponseMatcher('AG', str(i)), RespondHandler(), '[AOECHO;AG{};]'.format(i))
+            self.table.add(self.conn, sd)
+            self.pending.append(sd)
+
+    def test_keyed_lookup(self):
+        em = ExcryptMessage('[AOECHO;AG500;]')
+        assert_equals(self.table.candidates(self.conn, em), [self.pending[500]])
+
+    def test_other_connection_does_not_match(self):
+        em = ExcryptMessage('[AOECHO;AG500;]')
+        assert_equals(self.table.candidates(object(), em), [])
+
+    def test_unkeyed_always_candidate(self):
+        sd = SentData(DeleteObjectMatcher(['KEY'], 7), RespondHandler(), '[AORKY3;MNKEY;ID7;]')
+        self.table.add(self.conn, sd)
+        em = ExcryptMessage('[AORKY3;MNKEY;ID7;]')
+        assert_equals(self.table.candidates(self.conn, em), [sd])
+        self.table.remove(sd)
+        assert_equals(len(self.table), OUTSTANDING)
+
+    def test_remove(self):
+        for sd in self.pending:
+            self.table.remove(sd)
+            # Removing twice is harmless
+            self.table.remove(sd)
+        assert_equals(len(self.table), 0)
+        assert_equals(self.table.synch_tags, {})
+
+    def test_load_1k_outstanding(self):
+        # Answer every outstanding request in reverse order
+        messages = [ExcryptMessage('[AOECHO;AG{};]'.format(i)) for i in reversed(range(OUTSTANDING))]
+
+        start = time.time()
+        for em in messages:
+            candidates = self.table.candidates(self.conn, em)
+            assert_equals(len(candidates), 1)
+            self.table.remove(candidates[0])
+        elapsed = time.time() - start
+
+        assert_equals(len(self.table), 0)
+        # A linear scan per message takes orders of magnitude longer than this
+        assert_less(elapsed, 1.0)
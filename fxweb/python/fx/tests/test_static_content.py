@@ -0,0 +1,160 @@
+"""
+@file      test_static_content.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests finding protected static files with the static asset index, shared/bench/static_content_bench.py
+times it
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from nose.tools import *
+
+from flask import Flask
+
+import fx
+import static_content_view
+from static_content_view import StaticIndex
+
+# About the size of the regauth and fxweb web roots as shipped
+SECTIONS = ('components', 'directives', 'idioms', 'sections', 'landing', 'static', 'images')
+FILES_PER_DIRECTORY = 12
+
+
+def synthetic_web_root(top, apps=('regauth', 'fxweb'), seed=1234):
+    """Web roots of nested section directories, some file names appearing in several of them"""
+    rand = random.Random(seed)
+    names = ['{}{}.{}'.format(stem, i, ext) for i in range(60)
+             for stem, ext in (('view', 'html'), ('controller', 'js'), ('style', 'css'))]
+    for app in apps:
+        for section in SECTIONS:
+            for sub in range(8):
+                directory = os.path.join(top, app, 'js', section, 'part{}'.format(sub))
+                os.makedirs(directory)
+                for name in rand.sample(names, FILES_PER_DIRECTORY):
+                    with open(os.path.join(directory, name), 'w') as f:
+                        f.write(name * rand.randint(1, 20))
+    return [os.path.join(top, app) for app in apps], names
+
+
+def reference_find(roots, base_uri, filename):
+    """The original find_file, walking the web roots"""
+    trunc_base_uri = base_uri[:-1] if base_uri.endswith('/') else base_uri
+    for topdir in roots:
+        for curdir, subdirs, files in os.walk(topdir):
+            if not filename in files:
+                continue
+            if curdir.find(trunc_base_uri) == -1:
+                continue
+            return os.path.join(curdir, filename)
+    return None
+
+
+class TestStaticIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top)
+        self.roots, self.names = synthetic_web_root(self.top)
+        self.index = StaticIndex(self.roots, check_interval=0)
+
+    def find(self, base_uri, filename):
+        static_file = self.index.find(base_uri, filename)
+        return static_file.path if static_file else None
+
+    def test_same_as_walking(self):
+        for base_uri in ('', 'components/', 'sections/part3/', 'static', 'landing/part7/', 'missing/'):
+            for filename in self.names + ['missing.js', 'part1']:
+                assert_equals(self.find(base_uri, filename), reference_find(self.roots, base_uri, filename),
+                              f'{base_uri} {filename}')
+
+    def test_precomputed_headers(self):
+        filename = next(name for name in self.names if name.endswith('.css') and self.find('', name))
+        static_file = self.index.find('', filename)
+        stat = os.stat(static_file.path)
+        assert_equals(static_file.etag, '{:x}-{:x}'.format(int(stat.st_mtime), stat.st_size))
+        assert_equals(static_file.mimetype, 'text/css')
+        assert_equals(static_file.redirect, static_file.path.replace('/var/www/', '/protected/'))
+
+    def test_refreshed_when_files_change(self):
+        directory = os.path.join(self.roots[0], 'js', 'components', 'part0')
+        path = os.path.join(directory, 'added.js')
+        assert_is_none(self.index.find('components/', 'added.js'))
+
+        with open(path, 'w') as f:
+            f.write('added')
+        assert_equals(self.find('components/', 'added.js'), path)
+
+        # Replaced by renaming over it, as deployments and editors do
+        replacement = os.path.join(self.top, 'replacement.js')
+        with open(replacement, 'w') as f:
+            f.write('replaced, and longer')
+        etag = self.index.find('components/', 'added.js').etag
+        time.sleep(0.01)
+        os.rename(replacement, path)
+        assert_not_equals(self.index.find('components/', 'added.js').etag, etag)
+
+        os.remove(path)
+        assert_is_none(self.index.find('components/', 'added.js'))
+
+    def test_refreshed_when_overwritten_in_place(self):
+        static_file = self.index.find('components/', 'view0.html') or self.index.find('', 'view0.html')
+        directory_mtime = os.stat(os.path.dirname(static_file.path)).st_mtime_ns
+        time.sleep(0.01)
+        with open(static_file.path, 'a') as f:
+            f.write('changed')
+        assert_equals(os.stat(os.path.dirname(static_file.path)).st_mtime_ns, directory_mtime)
+
+        refreshed = self.index.find('components/', 'view0.html') or self.index.find('', 'view0.html')
+        assert_equals(refreshed.path, static_file.path)
+        assert_not_equals(refreshed.etag, static_file.etag)
+        assert_equals(self.index.scans, 1)
+
+    def test_checked_at_most_every_interval(self):
+        self.index.check_interval = 3600
+        self.index.find('', 'view0.html')
+        with mock.patch.object(static_content_view.os, 'stat') as stat, \
+                mock.patch.object(static_content_view.os, 'walk') as walk:
+            for filename in self.names:
+                self.index.find('', filename)
+        assert_false(stat.called)
+        assert_false(walk.called)
+        assert_equals(self.index.scans, 1)
+
+    def test_conditional_get(self):
+        app = Flask(__name__)
+        static_file = self.index.find('components/', 'view0.html') or self.index.find('', 'view0.html')
+        with mock.patch.object(static_content_view, 'static_index', return_value=self.index):
+            with app.test_request_context(headers={'If-None-Match': '"{}"'.format(static_file.etag)}):
+                response = static_content_view.create_static_response('', 'view0.html')
+                assert_equals(response.status_code, 304)
+                assert_not_in('X-Accel-Redirect', response.headers)
+                assert_equals(response.headers['ETag'], '"{}"'.format(static_file.etag))
+
+            with app.test_request_context(headers={'If-Modified-Since': static_file.last_modified}):
+                assert_equals(static_content_view.create_static_response('', 'view0.html').status_code, 304)
+
+            with app.test_request_context(headers={'If-None-Match': '"stale"'}):
+                response = static_content_view.create_static_response('', 'view0.html')
+                assert_equals(response.status_code, 200)
+                assert_equals(response.headers['X-Accel-Redirect'], static_file.redirect)
+                assert_equals(response.headers['Content-Type'], 'text/html')
+
+            # Error pages are always sent
+            with app.test_request_context(headers={'If-None-Match': '"{}"'.format(static_file.etag)}):
+                self.index.files['unauthorized.html'] = [(self.roots[0], static_file)]
+                assert_equals(static_content_view.create_static_response('', 'unauthorized.html', 401).status_code,
+                              401)
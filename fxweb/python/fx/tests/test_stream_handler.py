@@ -0,0 +1,131 @@
+"""
+@file      test_stream_handler.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests streaming of matched responses and their serialization to the client
+"""
+import json
+import unittest
+from nose.tools import *
+import gevent
+from gevent.queue import Empty
+
+import fx
+from handler import StreamHandler, StreamAborted
+from object_stream import ObjectStream
+
+
+class TestStreamHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = StreamHandler(max_pending=4)
+        self.resumed = []
+
+    def test_messages_in_order(self):
+        for i in range(3):
+            self.handler.update_responses(i)
+        self.handler.handle(2, None)
+        assert_equals(list(self.handler.messages(1)), [0, 1, 2])
+
+    def test_timeout(self):
+        with assert_raises(Empty):
+            next(self.handler.messages(0.01))
+
+    def test_no_pause_below_max_pending(self):
+        for i in range(3):
+            self.handler.update_responses(i)
+        assert_false(self.handler.pause(self.resumed.append))
+
+    def test_resume_once_half_consumed(self):
+        for i in range(8):
+            self.handler.update_responses(i)
+        assert_true(self.handler.pause(self.resumed.append))
+
+        messages = self.handler.messages(1)
+        for _ in range(5):
+            next(messages)
+        assert_equals(self.resumed, [])
+        next(messages)
+        assert_equals(self.resumed, [self.handler])
+
+    def test_aborted_after_max_pause(self):
+        handler = StreamHandler(max_pending=4, max_pause=0.01)
+        for i in range(8):
+            handler.update_responses(i)
+        assert_true(handler.pause(self.resumed.append))
+        gevent.sleep(0.05)
+        assert_equals(self.resumed, [handler])
+
+        # Later responses are dropped and the connection is not paused again
+        handler.update_responses(8)
+        assert_false(handler.pause(self.resumed.append))
+        with assert_raises(StreamAborted):
+            next(handler.messages(1))
+
+    def test_catching_up_cancels_abort(self):
+        handler = StreamHandler(max_pending=4, max_pause=0.01)
+        for i in range(8):
+            handler.update_responses(i)
+        handler.pause(self.resumed.append)
+        messages = handler.messages(1)
+        for _ in range(6):
+            next(messages)
+        gevent.sleep(0.05)
+        assert_false(handler.aborted)
+        handler.handle(None, None)
+        assert_equals(list(messages), [6, 7])
+
+    def test_close_resumes(self):
+        for i in range(8):
+            self.handler.update_responses(i)
+        self.handler.pause(self.resumed.append)
+        self.handler.close()
+        assert_equals(self.resumed, [self.handler])
+        # Resuming happens only once
+        self.handler.close()
+        assert_equals(self.resumed, [self.handler])
+
+
+class TestObjectStream(unittest.TestCase):
+
+    def test_empty(self):
+        data = json.loads(''.join(ObjectStream('KEY', [])))
+        assert_equals(data, {'result': 'Success', 'objectData': {'KEY': []}})
+
+    def test_matches_buffered_response(self):
+        objects = [('KEY', '{"ID": 1}'), ('CERT', '{"ID": 2}'), ('KEY', '{"ID": 3}')]
+        data = json.loads(''.join(ObjectStream('KEY', objects)))
+        assert_equals(data, {
+            'result': 'Success',
+            'objectData': {'KEY': ['{"ID": 1}', '{"ID": 3}'], 'CERT': ['{"ID": 2}']}
+        })
+
+    def test_error_after_output_ends_document(self):
+        def failing():
+            yield 'KEY', '{"ID": 1}'
+            yield 'CERT', '{"ID": 2}'
+            raise ValueError()
+
+        data = json.loads(''.join(ObjectStream('KEY', failing())))
+        assert_equals(data, {
+            'result': 'Failure',
+            'message': ObjectStream.FAILURE_MESSAGE,
+            'objectData': {'KEY': ['{"ID": 1}'], 'CERT': ['{"ID": 2}']}
+        })
+
+    def test_first_object_read_before_output(self):
+        def failing():
+            raise ValueError()
+            yield
+
+        with assert_raises(ValueError):
+            next(iter(ObjectStream('KEY', failing())))
@@ -0,0 +1,112 @@
+"""
+@file      test_translator_factory.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests the lazy translator registry and the reuse of translator instances,
+shared/bench/translator_factory_bench.py times them
+"""
+import contextlib
+import sys
+import unittest
+from nose.tools import *
+
+import fx
+from base.base_translator import BaseTranslator
+from base.translator_factory import TranslatorFactory, TranslatorPool, TranslatorRegistry, Translators
+
+
+@contextlib.contextmanager
+def cold_kmes_translators():
+    """Import the KMES translator modules again, as a new worker would"""
+    names = [name for name in sys.modules if name == 'kmes.kmes_translators' or name.startswith('kmes.translators')]
+    saved = {name: sys.modules.pop(name) for name in names}
+    try:
+        yield
+    finally:
+        sys.modules.update(saved)
+        for name, module in saved.items():
+            parent, _, child = name.rpartition('.')
+            setattr(sys.modules[parent], child, module)
+
+
+class TestTranslatorRegistry(unittest.TestCase):
+
+    def test_lookup_imports_only_its_module(self):
+        with cold_kmes_translators():
+            registry = TranslatorRegistry('kmes.kmes_translators')
+            translator = registry.get_translator('Users', 'Retrieve')
+            assert_equals(translator.__name__, 'RetrieveUser')
+            assert_in('kmes.translators.users', sys.modules)
+            assert_not_in('kmes.translators.keys', sys.modules)
+            assert_equals(list(registry.loaded), ['users.RetrieveUser'])
+
+    def test_every_name_resolves(self):
+        for translator_type, registry in Translators.items():
+            for category, operations in registry.items():
+                for operation, translator in operations.items():
+                    # RA translators import base_translator as a top level module, so check by name
+                    assert_true(any(base.__name__ == 'BaseTranslator' for base in translator.__mro__),
+                                f'{translator_type}.{category}.{operation}')
+
+    def test_unknown_translator(self):
+        assert_raises(NotImplementedError, TranslatorFactory.get_translator, 'KMES', 'Users', 'Nothing')
+        assert_raises(NotImplementedError, TranslatorFactory.get_translator, 'KMES', 'Nothing', 'Retrieve')
+        assert_raises(NotImplementedError, TranslatorFactory.get_translator, 'Nothing', 'Users', 'Retrieve')
+
+
+class Translator(BaseTranslator):
+    def __init__(self, server_interface):
+        super().__init__(server_interface, 'Misc', 'TEST', {'name': 'NA'}, {'AN': 'status'})
+
+    def preprocess_request(self, request):
+        self.request_only = request['name']
+        return request
+
+
+class TestTranslatorPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = TranslatorPool(max_idle=2)
+
+    def test_reused_without_request_state(self):
+        with self.pool.acquire(Translator, 'server') as translator:
+            translator.translateRequest(translator.preprocess_request({'name': 'alice'}))
+            assert_equals(translator.raw_request, {'name': 'alice'})
+        with self.pool.acquire(Translator, 'server') as reused:
+            assert_is(reused, translator)
+            assert_false(hasattr(reused, 'request_only'))
+            assert_false(hasattr(reused, 'raw_request'))
+            assert_equals(reused.request_map, {'name': 'NA'})
+        stats = self.pool.stats[Translator]
+        assert_equals((stats.constructed, stats.reused, stats.hit_rate), (1, 1, 0.5))
+
+    def test_one_request_at_a_time(self):
+        with self.pool.acquire(Translator, 'server') as first:
+            with self.pool.acquire(Translator, 'server') as second:
+                assert_is_not(first, second)
+        with self.pool.acquire(Translator, 'other server') as other:
+            assert_equals(other.server_interface, 'other server')
+
+    def test_reset_after_error(self):
+        with assert_raises(KeyError):
+            with self.pool.acquire(Translator, 'server') as translator:
+                translator.preprocess_request({'name': 'alice'})
+                raise KeyError('name')
+        with self.pool.acquire(Translator, 'server') as reused:
+            assert_is(reused, translator)
+            assert_false(hasattr(reused, 'request_only'))
+
+    def test_idle_bounded(self):
+        with contextlib.ExitStack() as stack:
+            for _ in range(4):
+                stack.enter_context(self.pool.acquire(Translator, 'server'))
+        assert_equals(len(self.pool.idle[Translator, 'server']), 2)
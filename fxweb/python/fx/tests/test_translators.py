@@ -0,0 +1,122 @@
+"""
+@file      test_translators.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests translating requests and responses with compiled translator maps, shared/bench/translators_bench.py
+times them
+"""
+import random
+import unittest
+from unittest import mock
+from nose.tools import *
+
+import fx
+from base import base_translator
+from base.base_exceptions import SerializationError
+from base.base_translator import BaseTranslator
+from base.translator_factory import Translators
+from lib.utils.data_structures import ExcryptMessage
+
+REQUEST_VALUES = ('value', 'two words', '1', 7, True, False, None, ['a', 'b'], {'nested': 'value'}, 'bad;value')
+RESPONSE_VALUES = ('Y', 'N', '1', '0', 'a,b,c', '20240101', '')
+
+
+def all_translators(server_interface=None):
+    """An instance of every KMES and RA translator with a request or response map"""
+    translators = []
+    for app_type, categories in Translators.items():
+        for category, operations in categories.items():
+            for operation, cls in operations.items():
+                try:
+                    translator = cls(server_interface)
+                except Exception:
+                    continue
+                if getattr(translator, 'request_map', None) or getattr(translator, 'response_map', None):
+                    translators.append((f'{app_type}.{category}.{operation}', translator))
+    return translators
+
+
+def set_path(data, path, value):
+    *parents, key = path.split('.')
+    for parent in parents:
+        data = data.setdefault(parent, {})
+    data[key] = value
+
+
+def synthetic_request(translator, rand):
+    request = {}
+    for field in translator.request_map or ():
+        if rand.random() < 0.8:
+            set_path(request, field, rand.choice(REQUEST_VALUES))
+    return request
+
+
+def synthetic_response(translator, rand):
+    return ExcryptMessage({tag: rand.choice(RESPONSE_VALUES) for tag in translator.response_map or ()
+                           if '.' not in tag and rand.random() < 0.8})
+
+
+def outcome(translate, data):
+    try:
+        return dict(translate(data))
+    except SerializationError as e:
+        return SerializationError, e.field_name, e.message
+    except Exception as e:
+        return type(e)
+
+
+def interpreted():
+    """Translate with the maps interpreted field by field, as before they were compiled"""
+    return mock.patch.object(BaseTranslator, '_compiles_maps', return_value=False)
+
+
+class TestCompiledMaps(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.translators = all_translators()
+
+    def test_translators_found(self):
+        assert_true(any(name.startswith('KMES') for name, _ in self.translators))
+        assert_true(any(name.startswith('RA') for name, _ in self.translators))
+
+    def test_same_as_interpreted(self):
+        rand = random.Random(1234)
+        for name, translator in self.translators:
+            for _ in range(20):
+                request = synthetic_request(translator, rand)
+                response = synthetic_response(translator, rand)
+                compiled = (outcome(translator.translateRequest, request),
+                            outcome(translator.translateResponse, response))
+                with interpreted():
+                    expected = (outcome(translator.translateRequest, request),
+                                outcome(translator.translateResponse, response))
+                assert_equals(compiled, expected, f'{name} {request} {response}')
+
+    def test_plan_reused_across_instances(self):
+        name, translator = self.translators[0]
+        translator.translateRequest({})
+        plans = base_translator._compiled_maps[type(translator), 'request']
+        type(translator)(None).translateRequest({})
+        assert_equals(len(base_translator._compiled_maps[type(translator), 'request']), len(plans))
+
+    def test_lambdas_recreated_by_init(self):
+        class Translator(BaseTranslator):
+            def __init__(self, offset):
+                request_map = {'page': ('CH', lambda s: int(s) - offset), 'name': 'NA'}
+                super().__init__(None, 'Misc', 'TEST', request_map)
+
+        assert_equals(Translator(1).translateRequest({'page': '3', 'name': 'a'}), {'CH': 2, 'NA': 'a'})
+        assert_equals(Translator(1).translateRequest({'page': '3'}), {'CH': 2})
+        assert_equals(len(base_translator._compiled_maps[Translator, 'request']), 1)
+        # A lambda closing over another value must not reuse the plan
+        assert_equals(Translator(0).translateRequest({'page': '3'}), {'CH': 3})
@@ -0,0 +1,165 @@
+"""
+@file      test_view_router.py
+
+@section LICENSE
+
+This program is the property of Futurex, L.P.
+
+No disclosure, reproduction, or use of any part thereof may be made without
+express written permission of Futurex L.P.
+
+Copyright by:  Futurex, LP. 2024
+
+@section DESCRIPTION
+Tests routing requests with the compiled view router lookup tables, shared/bench/view_router_bench.py
+times them
+"""
+import importlib
+import pkgutil
+import random
+import unittest
+from functools import partialmethod
+from nose.tools import *
+
+from flask.views import MethodView
+
+import fx
+import kmes.views
+from lib.utils.view_router import (
+    AmbiguousRequestError, DuplicateRoutesError, LookupView, MissingOptionsError, Route
+)
+from utils.container_filters import dot_notation_get
+
+RA_MODULES = ('regauth.regauth_views',)
+
+
+def routed_views():
+    """Every (class, LookupView) of the Route decorated KMES and RA views"""
+    modules = [f'kmes.views.{name}' for _, name, _ in pkgutil.iter_modules(kmes.views.__path__)]
+    lookups = []
+    for module in map(importlib.import_module, [*modules, *RA_MODULES]):
+        for cls in vars(module).values():
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            for attr in vars(cls).values():
+                if isinstance(attr, partialmethod) and attr.func is LookupView.view:
+                    lookups.append((cls, attr.args[0]))
+    return lookups
+
+
+def reference_lookup(tables, request_data):
+    """The original LookupView.lookup, filtering dicts of views table by table"""
+    matches = {pattern[0]: True for table in tables for pattern in table}
+    for table in tables:
+        new_matches = {}
+        views_in_table = set()
+        for view, path, value in table:
+            if view not in matches:
+                continue
+            views_in_table.add(view)
+            if path == '*':
+                new_matches.setdefault(view, False)
+                continue
+            request_value = dot_notation_get(request_data, path, default=Ellipsis)
+            if request_value is Ellipsis:
+                continue
+            if request_value == value or value == '*':
+                new_matches[view] = matches[view]
+        new_matches.update({view: matches[view] for view in matches.keys() - views_in_table})
+        if not new_matches:
+            raise MissingOptionsError(matches, table)
+        matches = new_matches
+
+    if len(matches) == 1:
+        return matches.popitem()[0]
+    specific_matches = [view for view, specific in matches.items() if specific]
+    if len(specific_matches) == 1:
+        return specific_matches[0]
+    raise AmbiguousRequestError(specific_matches, tables, request_data)
+
+
+def set_path(data, path, value):
+    *parents, key = path.split('.')
+    for parent in parents:
+        data = data.setdefault(parent, {})
+    data[key] = value
+
+
+def synthetic_requests(lookup_view, count, seed=1234):
+    """Requests that match each view, plus random mixes of the paths and values the views look for"""
+    rand = random.Random(seed)
+    patterns = [(path, value) for table in lookup_view.tables for view, path, value in table if path != '*']
+    requests = [{}]
+    for view in lookup_view.views:
+        request_data = {}
+        for table in lookup_view.tables:
+            options = [(path, value) for handler, path, value in table if handler is view and path != '*']
+            if options:
+                path, value = rand.choice(options)
+                set_path(request_data, path, 'anything' if value == '*' else value)
+        requests.append(request_data)
+    while patterns and len(requests) < count:
+        request_data = {}
+        for path, value in rand.sample(patterns, rand.randint(1, min(3, len(patterns)))):
+            set_path(request_data, path, rand.choice((value, 'other', 0)))
+        requests.append(request_data)
+    return requests
+
+
+def outcome(lookup, request_data):
+    try:
+        return lookup(request_data)
+    except (MissingOptionsError, AmbiguousRequestError) as e:
+        return type(e), str(e)
+
+
+class TestViewRouter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.lookups = routed_views()
+
+    def test_views_found(self):
+        assert_true(any(cls.__module__.startswith('kmes') for cls, _ in self.lookups))
+        assert_true(any(cls.__module__.startswith('regauth') for cls, _ in self.lookups))
+
+    def test_same_as_reference(self):
+        for cls, lookup_view in self.lookups:
+            for request_data in synthetic_requests(lookup_view, 200):
+                assert_equals(outcome(lookup_view.lookup, request_data),
+                              outcome(lambda data: reference_lookup(lookup_view.tables, data), request_data),
+                              f'{cls.__name__}.{lookup_view.verb} {request_data}')
+
+    def test_default_and_specific(self):
+        @Route()
+        class View(MethodView):
+            @Route.get('*')
+            def get_list(self):
+                pass
+
+            @Route.get({'id', 'name'})
+            def get_one(self):
+                pass
+
+            @Route.get({'type': 'A'})
+            def get_a(self):
+                pass
+
+        lookup_view = vars(View)['get'].args[0]
+        assert_equals(lookup_view.lookup({}), View.get_list)
+        assert_equals(lookup_view.lookup({'id': '1'}), View.get_one)
+        assert_equals(lookup_view.lookup({'type': 'A'}), View.get_a)
+        assert_equals(lookup_view.lookup({'type': 'B'}), View.get_list)
+        assert_raises(AmbiguousRequestError, lookup_view.lookup, {'id': '1', 'type': 'A'})
+
+    def test_duplicate_routes_rejected(self):
+        with assert_raises(DuplicateRoutesError):
+            @Route()
+            class View(MethodView):
+                @Route.post({'type': 'A'})
+                def create(self):
+                    pass
+
+                @Route.post({'type': 'A'})
+                def create_again(self):
+                    pass
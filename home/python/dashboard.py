@@ -1,4 +1,5 @@
 import os
+import time
 
 from typing import List
 
@@ -15,8 +16,13 @@ blp = Blueprint("dashboard", "dashboard", url_prefix="/dashboard", description="
 def DashboardBlueprint():
     return blp
 
-async def get_features() -> dict:
-    # Get features from server
+async def fetch_features():
+    """
+    Get features from server
+
+    Returns:
+        The features, and whether the server answered with them
+    """
     server = ServerConn()
     msg = ExcryptMsg("[AOSETT;]")
     msg.set_tag("OP", "features:get")
@@ -53,7 +59,42 @@ async def get_features() -> dict:
     else:
         ret["Virtual"] = "1"
 
-    return ret
+    return ret, rsp.get_tag("AN") == "Y"
+
+# Seconds the features are cached for, like the device info
+FEATURES_CACHE_SECONDS = 20
+
+global cached_features
+cached_features = None
+
+global cached_features_key
+cached_features_key = None
+
+global features_time
+features_time = None
+
+async def get_features() -> dict:
+    """
+    Get the features, from the server at most every FEATURES_CACHE_SECONDS
+    """
+    global cached_features
+    global cached_features_key
+    global features_time
+    if features_time and features_time > time.monotonic() - FEATURES_CACHE_SECONDS:
+        return cached_features
+
+    ret, answered = await fetch_features()
+    if not answered:
+        return ret
+
+    # Licenses or features changed, so did the services
+    key = frozenset(ret.items())
+    if key != cached_features_key:
+        cached_services.clear()
+    cached_features = ret
+    cached_features_key = key
+    features_time = time.monotonic()
+    return cached_features
 
 # GET /services
 class Service(Model):
@@ -74,34 +115,41 @@ class Services(Model):
         description="Information about the services available for the logged in context"
     )
 
-def has_config_perm(perms):
-    if any(perm in [
-            'Communication:Ethernet Settings',
-            'Communication:Network Settings',
-            'Communication:Port Settings',
-            'Communication:TCP Settings',
-            'Communication:TLS Settings',
-            'Device:Backup',
-            'Device:Config',
-            'Device:Feature Request',
-            'Device:Firmware Update',
-            'Device:Restore',
-            'Device:Time',
-            'Device:Zeroize',
-            'Major Keys:Load',
-            'Major Keys:Partial Load',
-            'Security:Key Settings',
-            'Security:Secure Mode',
-            'Security:System Settings',
-            'Security:TLS Resign',
-            'Security:TLS Resign',
-            'System:Keys',
-            'System:Orphan Keeper',
-            'System:PKI Settings',
-            'System:Prune File System',
-            ] for perm in perms):
-        return True
-    return False
+# Any of these shows the device configuration service
+CONFIG_PERMS = frozenset([
+    'Communication:Ethernet Settings',
+    'Communication:Network Settings',
+    'Communication:Port Settings',
+    'Communication:TCP Settings',
+    'Communication:TLS Settings',
+    'Device:Backup',
+    'Device:Config',
+    'Device:Feature Request',
+    'Device:Firmware Update',
+    'Device:Restore',
+    'Device:Time',
+    'Device:Zeroize',
+    'Major Keys:Load',
+    'Major Keys:Partial Load',
+    'Security:Key Settings',
+    'Security:Secure Mode',
+    'Security:System Settings',
+    'Security:TLS Resign',
+    'System:Keys',
+    'System:Orphan Keeper',
+    'System:PKI Settings',
+    'System:Prune File System',
+])
+
+def has_config_perm(sess):
+    return sess.has_any(CONFIG_PERMS)
+
+# Sessions with the same permissions and features get the same services
+# (perms, features, user management, hardened, management, hsmweb) -> categories
+MAX_CACHED_SERVICES = 256
+
+global cached_services
+cached_services = {}
 
 async def get_static_services():
     # Verify login
@@ -110,17 +158,35 @@ async def get_static_services():
     # Get licenses from sever
     features = await get_features()
 
+    hsmweb = not await WebConfig.get_virtual() or os.getenv("HSM_WEB_ENABLED") == "1"
+
+    # XXX: Add anything else build_static_services checks to the key
+    key = (
+        auth_sess.perm_set,
+        cached_features_key if features is cached_features else frozenset(features.items()),
+        auth_sess.user_management,
+        auth_sess.hardened,
+        auth_sess.management,
+        hsmweb,
+    )
+    categories = cached_services.get(key)
+    if categories is None:
+        categories = build_static_services(auth_sess, features, hsmweb)
+        if len(cached_services) >= MAX_CACHED_SERVICES:
+            cached_services.clear()
+        cached_services[key] = categories
+    return categories
+
+def build_static_services(auth_sess, features, hsmweb):
     # Some shorthand for building the service_info list
     rd = lambda view : "/rd/#/" + view
 
-    has_perm = lambda perm : perm in auth_sess.perms
-    has_one_perm = lambda perms : any(perm in perms for perm in auth_sess.perms)
+    has_perm = auth_sess.has_perm
+    has_one_perm = auth_sess.has_any
 
     has_feat = lambda feat : feat in features
     has_one_feat = lambda feats : any(feat in feats for feat in features)
 
-    hsmweb = not await WebConfig.get_virtual() or os.getenv("HSM_WEB_ENABLED") == "1"
-
     # All of the possible services
     # Grep REMOTE_DESKTOP_VIEWS
     # XXX: Update DeployServiceCommand.cpp if you add/change a category
@@ -360,7 +426,7 @@ async def get_static_services():
                     'description': 'Configure and manage the server',
                     'icon': '/shared/static/icons/configuration-tasks.svg',
                     'url': rd('Config'),
-                    'perm': has_config_perm(auth_sess.perms),
+                    'perm': has_config_perm(auth_sess),
                 },
                 {
                     'name': 'Encryption Card Web',
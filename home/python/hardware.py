@@ -44,7 +44,7 @@ cache_time = None
 @perm_required("Device:Config")
 async def get():
     # Check perms
-    if not has_config_perm(AuthSession.get().perms):
+    if not has_config_perm(AuthSession.get()):
         unauthorized("Missing device configuration permission")
 
     global data
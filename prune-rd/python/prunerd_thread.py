@@ -9,6 +9,7 @@ from cachelib.file import FileSystemCache
 from flask_session.sessions import FileSystemSession
 
 from rkweb.session_config import get_session_config
+from rkweb.session_index import SessionIndex
 
 from rd.session import DesktopSession
 
@@ -48,6 +49,10 @@ class PruneRDThread(object):
 
         self.cache._get_filename = get_cache_filename
 
+        # Remote desktop sessions by when they expire, and their vnc ports
+        self.index = SessionIndex(self.cache_dir)
+        self.ports = {}
+
     def stop(self) -> None:
         self.running = False
 
@@ -64,38 +69,24 @@ class PruneRDThread(object):
                     break
 
     def cleanup_sessions(self) -> None:
-        # Get all sessions in cache dir
-        sessions = []
+        # Pick up new, changed and removed sessions
         try:
-            sessions = [f for f in os.listdir(self.cache_dir) if os.path.isfile(os.path.join(self.cache_dir, f))]
+            self.index.scan(self.load_session, self.forget_session)
         except Exception as e:
             pass
 
-        # Check each session
-        ports = []
-        for sid in sessions:
-            # Get session
-            try:
-                data = self.cache.get(key=sid)
-            except Exception as e:
-                continue
-            try:
-                web_session = FileSystemSession(data, sid=sid)
-            except Exception as e:
-                continue
-
-            try:
-                session = DesktopSession()
-                session.from_dict(web_session['desktop'])
-            except Exception as e:
-                continue
-
+        # Check the sessions that may have expired
+        now = datetime.datetime.utcnow()
+        for sid in self.index.pop_due(now):
+            expires = self.load_session(sid)
             # Session is expired
-            if (session.last_access + self.session_lifetime) < datetime.datetime.utcnow():
+            if expires is not None and expires < now:
                 self.expire_session(sid)
-            # Add the vnc port to the list
+                self.forget_session(sid)
             else:
-                ports.append(session.vnc_port + 1000)
+                self.index.schedule(sid, expires)
+
+        ports = set(self.ports.values())
 
         # Get all vnc processes
         vncProcs = [proc for proc in psutil.process_iter() if 'x11vnc' in proc.name()]
@@ -115,6 +106,23 @@ class PruneRDThread(object):
                 os.system("sudo /usr/bin/kill-vnc {}".format(port))
                 proc.wait()
 
+    def load_session(self, sid):
+        """ Records the vnc port of a session and returns when it expires """
+        try:
+            data = self.cache.get(key=sid)
+            web_session = FileSystemSession(data, sid=sid)
+            session = DesktopSession()
+            session.from_dict(web_session['desktop'])
+        except Exception as e:
+            self.forget_session(sid)
+            return None
+
+        self.ports[sid] = session.vnc_port + 1000
+        return session.last_access + self.session_lifetime
+
+    def forget_session(self, sid) -> None:
+        self.ports.pop(sid, None)
+
     def expire_session(self, sid) -> None:
         try:
            self.cache.delete(sid)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark of multi command translators with the command pipeline.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/command_pipeline_bench.py [latency ms]
+
+Translates requests whose commands don't depend on each other against a fake
+server answering after a fixed round trip, with the commands pipelined and
+sent one at a time.
+"""
+
+import sys
+import time
+from unittest import mock
+
+import gevent
+
+import fx
+from kmes.translators.key_groups import RetrieveKeyGroup
+from kmes.translators.user_groups import RetrieveUserGroup
+from lib.utils.data_structures import ExcryptMessage
+
+WORKLOAD = [(RetrieveKeyGroup, {'id': 'Payments'}), (RetrieveUserGroup, {'group': 'Admins'})] * 10
+
+RESPONSES = {
+    'RKVS': '[AORKVS;ANY;NAPayments;PAroot;OWadmin;RM0;]',
+    'RKPD': '[AORKPD;ANY;PL;]',
+    'RKPS': '[AORKPS;ANY;TYUser,Key;DSUsers,Keys;]',
+    'RKRP': '[AORKRP;ANY;NU1;SLlocal;]',
+    'RKCS': '[AORKCS;ANY;ID1234;]',
+    'RKPM': '[AORKPM;ANY;]',
+}
+
+class FakeServerInterface(object):
+    """ Answers commands from canned responses after a round trip of latency seconds """
+    def __init__(self, latency):
+        self.latency = latency
+
+    def send_command(self, category, name, request_data):
+        gevent.sleep(self.latency)
+        return ExcryptMessage(RESPONSES[name])
+
+def one_at_a_time(cls):
+    """ Send the commands one after the other, as before they were pipelined """
+    return mock.patch.object(cls, 'command_dependencies', None)
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 20) / 1000
+
+    def run(pipelined):
+        start = time.perf_counter()
+        for cls, request in WORKLOAD:
+            server = FakeServerInterface(latency)
+            if pipelined:
+                cls(server).translate(request)
+            else:
+                with one_at_a_time(cls):
+                    cls(server).translate(request)
+        return time.perf_counter() - start
+
+    sequential_time = run(False)
+    pipelined_time = run(True)
+
+    print("{} translations, {:.0f} ms per command: one at a time {:.1f} ms, pipelined {:.1f} ms".format(
+        len(WORKLOAD), latency * 1000, sequential_time * 1000, pipelined_time * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark of how long the fxweb connection handler takes to wake up for a
+readable connection as the number of open connections grows.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/connection_wakeup_bench.py [samples]
+
+Opens socketpair connections on a MiddlewareConnectionHandler and times from
+a peer's write until the handler dispatches the message, against the select()
+loop the handler used to run over every open connection.
+"""
+
+import sys
+import time
+import random
+import select
+import socket
+import statistics
+from unittest import mock
+
+from gevent.event import Event
+
+import fx
+import connection_handler
+from connection_handler import MiddlewareConnectionHandler
+from middleware_connection import MiddlewareConnection, ConnectionData
+
+# Kept below FD_SETSIZE, the reference select() loop can not go higher
+CONNECTION_COUNTS = (10, 100, 400)
+MESSAGE = b'[AOECHO;]'
+
+def socketpair_connection():
+    """ A connection to a local peer socket, without the TLS setup of a real one """
+    conn, peer = socket.socketpair()
+    connection = MiddlewareConnection.__new__(MiddlewareConnection)
+    connection.conn_data = ConnectionData(conn=conn)
+    return connection, peer
+
+def reference_wakeup(connections, peer):
+    """
+    The select() loop the handler used to run: rebuild the fd list for every open
+    connection and select on all of them, for the one connection that became readable
+    """
+    start = time.perf_counter()
+    peer.sendall(MESSAGE)
+    fds = []
+    fd_to_conn = {}
+    for conn, _ in connections:
+        fd = conn.get_fd()
+        fds.append(fd)
+        fd_to_conn[fd] = conn
+    readable, _, _ = select.select(fds, [], [], 1.0)
+    elapsed = time.perf_counter() - start
+    for fd in readable:
+        fd_to_conn[fd].conn_data.conn.recv(ConnectionData.MAX_RECV)
+    return elapsed
+
+class WakeupListener(object):
+    """ Message listener recording when the handler dispatched the last message """
+    def __init__(self):
+        self.received = Event()
+        self.at = None
+
+    def handle(self, message, conn):
+        self.at = time.perf_counter()
+        self.received.set()
+        return lambda: None
+
+def register(handler, conn):
+    with mock.patch.object(connection_handler.ConnectionFactory, 'create_connection', return_value=conn):
+        assert handler.connect(object())
+
+def wakeup(listener, peer):
+    listener.received.clear()
+    start = time.perf_counter()
+    peer.sendall(MESSAGE)
+    assert listener.received.wait(1.0)
+    return listener.at - start
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    handler = MiddlewareConnectionHandler(None)
+    listener = WakeupListener()
+    handler.add_message_listener(listener)
+    connections = []
+    rand = random.Random(1234)
+
+    print("{:>12} {:>14} {:>16}".format("connections", "select ms", "hub watchers ms"))
+    try:
+        for count in CONNECTION_COUNTS:
+            while len(connections) < count:
+                conn, peer = socketpair_connection()
+                register(handler, conn)
+                connections.append((conn, peer))
+
+            peers = [rand.choice(connections)[1] for _ in range(samples)]
+            handler_latency = statistics.median(wakeup(listener, peer) for peer in peers)
+
+            # Stop the handler from reading while the old loop is measured
+            handler.reset()
+            select_latency = statistics.median(reference_wakeup(connections, peer) for peer in peers)
+            for conn, _ in connections:
+                register(handler, conn)
+
+            print("{:>12} {:>14.3f} {:>16.3f}".format(count, select_latency * 1000, handler_latency * 1000))
+    finally:
+        handler.reset()
+        handler.kill()
+        for conn, peer in connections:
+            conn.close()
+            peer.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the fxweb ExcryptMessage codec.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/excrypt_message_bench.py [rounds]
+
+Parses and rebuilds typical requests and responses with ExcryptMessage and
+with the original dict based implementation it replaced.
+"""
+
+import sys
+import timeit
+
+import fx
+from lib.utils.data_structures import ExcryptMessage
+
+RKY400 = (b'[AORKY400;AG1234;MNKEY;TY3;ID5521;NAProduction key 5521;KT0;KM1;KC4F2A;UG1;'
+          b'UM2024-01-01 00:00:00;CD2023-12-01 00:00:00;OW7;GP12;MK0;SL1;AL3;EX0;FL0;BB;]')
+GDKM = b'[AOGDKM;OPread-cskl-session;SI0f1e2d3c4b5a69788796a5b4c3d2e1f0;IDVMK;ANY;FU1;KC9A1B;ST1;]'
+GDKM_REQUEST = {'AO': 'GDKM', 'OP': 'get-major-key-status', 'SI': '0f1e2d3c4b5a69788796a5b4c3d2e1f0', 'FS': 2}
+
+class ReferenceExcryptMessage(dict):
+    """ The original ExcryptMessage parsing and serialization """
+    def __init__(self, message=None, sanitize=True):
+        self.sanitize = sanitize
+        if message:
+            if isinstance(message, str):
+                self.update({field[:2]: field[2:] for field in message[1:-1].split(';') if field})
+            elif isinstance(message, dict):
+                self.update(message)
+            elif isinstance(message, bytes):
+                self.update(self.parse_bytes(message))
+
+    def parse_bytes(self, msg):
+        tmp = {}
+        for field in msg[1:-1].split(b';'):
+            if field:
+                try:
+                    tmp[field[:2].decode()] = field[2:].decode()
+                except UnicodeDecodeError:
+                    tmp[field[:2].decode('latin')] = field[2:].decode('latin')
+        return tmp
+
+    def getText(self):
+        return '[' + ''.join(f'{tag}{value};' for tag, value in self.items() if value is not None) + ']'
+
+    def __setitem__(self, tag, value):
+        if value in (None, ...):
+            return
+        if self.sanitize and isinstance(value, int):
+            value = int.__str__(value)
+        return super().__setitem__(tag, value)
+
+    def update(self, other, **kwargs):
+        for key, value in other.items():
+            self[key] = value
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    print("{:<16} {:>12} {:>12}".format("message", "original us", "current us"))
+    for name, message in (("RKY400 bytes", RKY400), ("GDKM bytes", GDKM), ("RKY400 str", RKY400.decode()),
+                          ("GDKM str", GDKM.decode()), ("GDKM dict", GDKM_REQUEST)):
+        reference = timeit.timeit(lambda: ReferenceExcryptMessage(message).getText(), number=rounds)
+        current = timeit.timeit(lambda: ExcryptMessage(message).getText(), number=rounds)
+        print("{:<16} {:>12.2f} {:>12.2f}".format(name, reference / rounds * 1e6, current / rounds * 1e6))
+
+    # Messages are often serialized more than once, e.g. for logging
+    reference_em = ReferenceExcryptMessage(RKY400)
+    em = ExcryptMessage(RKY400)
+    reference = timeit.timeit(reference_em.getText, number=rounds)
+    current = timeit.timeit(em.getText, number=rounds)
+    print("{:<16} {:>12.2f} {:>12.2f}".format("RKY400 getText", reference / rounds * 1e6, current / rounds * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Excrypt server sockets, for benchmarking ServerConn
+without a running server.
+
+    PYTHONPATH=shared/python python3 shared/bench/excrypt_standin.py [requests] [concurrency]
+
+Serves web_hapi.sock and rest_hapi.sock from a temporary directory and
+compares pooled ServerConn.send_excrypt against opening a connection per
+request, as send_excrypt used to.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+
+from flask import Flask
+
+from rkweb import rkserver
+from rkweb.rkserver import ServerConn, ExcryptMsg, ExcryptFramer
+
+async def serve(path, one_shot = False, delay = 0):
+    """
+    Answer every Excrypt request on a Unix socket with [AO<command>;ANY;...]
+
+    Args:
+        path: The socket file to serve
+        one_shot: Close each connection after its first response
+        delay: Seconds to wait before each response
+    Returns:
+        asyncio server
+    """
+    async def handle(reader, writer):
+        framer = ExcryptFramer()
+        try:
+            while True:
+                data = await reader.read(32768)
+                if not data:
+                    break
+                for message in framer.feed(data):
+                    req = ExcryptMsg(message.decode('utf-8'))
+                    rsp = ExcryptMsg("[AO{};ANY;]".format(req.get_tag('AO')))
+                    if req.get_tag('AG'):
+                        rsp.set_tag('AG', req.get_tag('AG'))
+                    if delay:
+                        await asyncio.sleep(delay)
+                    writer.write(str(rsp).encode('utf-8'))
+                    if one_shot:
+                        break
+                await writer.drain()
+                if one_shot:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_unix_server(handle, path=path)
+
+def start(directory, **kwargs):
+    """ Serve the hapi sockets in directory from a background thread """
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def run():
+        for name in ('web_hapi.sock', 'rest_hapi.sock'):
+            await serve(os.path.join(directory, name), **kwargs)
+        ready.set()
+
+    threading.Thread(target=lambda: (loop.run_until_complete(run()), loop.run_forever()), daemon=True).start()
+    ready.wait()
+    return loop
+
+async def send_unpooled(path, msg, timeout):
+    """ The old send_excrypt: one connection per request """
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(str(msg).encode('utf-8'))
+    await writer.drain()
+    try:
+        in_data = ""
+        while in_data.find(']') < 0:
+            in_data += (await asyncio.wait_for(reader.read(32768), timeout)).decode('utf-8')
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return ExcryptMsg(in_data)
+
+async def bench(name, send, requests, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            rsp = await send(ExcryptMsg("[AOECHO;ID{};]".format(i)))
+            assert rsp.get_tag('AO') == 'ECHO'
+
+    start = time.monotonic()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.monotonic() - start
+    print("{:<10} {:>6} requests x{:<3} {:8.3f}s {:9.0f} req/s".format(
+        name, requests, concurrency, elapsed, requests / elapsed))
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    with tempfile.TemporaryDirectory() as directory:
+        start(directory)
+        rkserver.SOCKET_DIR = directory + '/'
+
+        app = Flask(__name__)
+        with app.test_request_context():
+            path = ServerConn.get_sockfile()
+            for c in (1, concurrency):
+                asyncio.run(bench("unpooled", lambda msg: send_unpooled(path, msg, 2), requests, c))
+                asyncio.run(bench("pooled", ServerConn().send_excrypt, requests, c))
+        ServerConn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the IPC envelope codecs.
+
+    PYTHONPATH=shared/python python3 shared/bench/ipc_codec_bench.py [rounds]
+
+Encodes and decodes ResponseMessage envelopes carrying pages of log records,
+the largest payloads the web services receive, through JSON as IpcUtils.send
+does and through SerializeToString(), to size what a binary wire format would
+save once the services accept one.
+"""
+
+import sys
+import time
+
+from google.protobuf import json_format
+from google.protobuf import struct_pb2
+
+from rkproto.comm.ResponseMessage_pb2 import ResponseMessage
+
+PAGE_SIZES = (10, 100, 1000, 5000)
+
+def log_page(records):
+    """ A ResponseMessage envelope holding a page of log records """
+    page = struct_pb2.ListValue()
+    for i in range(records):
+        page.values.add().struct_value.update({
+            "uuid": "0f0e{:028d}".format(i),
+            "time": "2024-03-15 10:{:02d}:{:02d}".format(i // 60 % 60, i % 60),
+            "level": i % 5,
+            "source": "rkserver",
+            "user": "admin",
+            "message": "User admin logged in from 10.0.{}.{}".format(i // 255 % 255, i % 255),
+        })
+    response = ResponseMessage()
+    response.success = True
+    response.params.Pack(page, "fx/")
+    return response
+
+def unpack(response):
+    """ Unpack the page as IpcUtils.send does for resp_type """
+    page = struct_pb2.ListValue()
+    response.params.Unpack(page)
+    return page
+
+def json_round_trip(response):
+    data = json_format.MessageToJson(response, including_default_value_fields=True)
+    decoded = ResponseMessage()
+    json_format.Parse(data, decoded)
+    unpack(decoded)
+    return len(data.encode('utf-8'))
+
+def binary_round_trip(response):
+    data = response.SerializeToString()
+    decoded = ResponseMessage()
+    decoded.ParseFromString(data)
+    unpack(decoded)
+    return len(data)
+
+def bench(round_trip, response, rounds):
+    """ Milliseconds per encode and decode, and the encoded size """
+    size = round_trip(response)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        round_trip(response)
+    return (time.perf_counter() - start) / rounds * 1000, size
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    print("{:>8} {:>12} {:>10} {:>12} {:>10} {:>8}".format(
+        "records", "json bytes", "json ms", "binary bytes", "binary ms", "speedup"))
+    for records in PAGE_SIZES:
+        response = log_page(records)
+        json_ms, json_size = bench(json_round_trip, response, rounds)
+        binary_ms, binary_size = bench(binary_round_trip, response, rounds)
+        print("{:>8} {:>12} {:>10.3f} {:>12} {:>10.3f} {:>7.0f}x".format(
+            records, json_size, json_ms, binary_size, binary_ms, json_ms / binary_ms))
+
+if __name__ == '__main__':
+    main()
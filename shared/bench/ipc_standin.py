@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Local echo stand-in for a microservice API port, for benchmarking IpcUtils
+without the services running.
+
+    PYTHONPATH=shared/python python3 shared/bench/ipc_standin.py [requests] [concurrency]
+
+Serves a REP and a ROUTER echo service and compares pooled IpcUtils.send_json
+against opening a REQ socket per request, as send_json used to.
+"""
+
+import sys
+import time
+import asyncio
+import threading
+
+import zmq
+import zmq.asyncio
+
+from rkweb.ipc import IpcUtils
+
+REP_PORT = 15991
+ROUTER_PORT = 15992
+
+def serve(context, port, kind):
+    """ Echo every request on port back to its sender """
+    socket = context.socket(kind)
+    socket.bind("tcp://127.0.0.1:{}".format(port))
+    while True:
+        try:
+            if kind == zmq.REP:
+                socket.send(socket.recv())
+            else:
+                socket.send_multipart(socket.recv_multipart())
+        except zmq.ContextTerminated:
+            socket.close()
+            return
+
+def start(context):
+    """ Serve the echo stand-ins from background threads """
+    for port, kind in ((REP_PORT, zmq.REP), (ROUTER_PORT, zmq.ROUTER)):
+        threading.Thread(target=serve, args=(context, port, kind), daemon=True).start()
+
+async def send_unpooled(context, port, data, timeout = 5000):
+    """ The old send_json: one REQ connection per request """
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect("tcp://127.0.0.1:{}".format(port))
+    try:
+        await socket.send_string(data)
+        if not await socket.poll(timeout=timeout):
+            raise TimeoutError()
+        return await socket.recv_string()
+    finally:
+        # The old code leaked the socket, which ran out of descriptors before the benchmark ended
+        socket.close()
+
+async def bench(name, send, requests, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        data = '{{"id": {}}}'.format(i)
+        async with sem:
+            assert await send(data) == data
+
+    start = time.monotonic()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.monotonic() - start
+    print("{:<16} {:>6} requests x{:<3} {:8.3f}s {:9.0f} req/s".format(
+        name, requests, concurrency, elapsed, requests / elapsed))
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    server_context = zmq.Context()
+    start(server_context)
+    client_context = zmq.asyncio.Context()
+
+    for port, kind in ((REP_PORT, "rep"), (ROUTER_PORT, "router")):
+        for c in (1, concurrency):
+            asyncio.run(bench("unpooled " + kind, lambda data: send_unpooled(client_context, port, data), requests, c))
+            asyncio.run(bench("pooled " + kind, lambda data: IpcUtils.send_json(port, data), requests, c))
+
+    IpcUtils.close()
+    client_context.term()
+    server_context.term()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark of searching a full byok key table.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/key_table_bench.py [slots]
+
+Runs the queries of someone typing into the key slot search against a
+synthetic table, with the original linear KeyTable.search and with the
+KeyTableIndex, asking only for the first page of results.
+"""
+
+import sys
+import time
+import random
+from operator import attrgetter
+
+import fx
+from byok.models.keys import KeySlotSummary
+from byok.utils.key_table import KeyTable, KeyTableIndex
+
+KEY_TYPES = ('AES-128', 'AES-256', '3TDES', 'RSA-2048', 'ECC')
+USAGES = ('Encrypt', 'Decrypt', 'Sign', 'Verify', 'Wrap', 'Unwrap', 'MAC')
+QUERIES = [('', 'slot'), ('', 'label'), ('p', 'label'), ('pa', 'label'), ('pay', 'label'),
+           ('paym', 'label'), ('payments 1', 'label'), ('payments 12', 'kcv'), ('aes-256', 'type')]
+
+def synthetic_table(size, used_every=1, seed=1234):
+    """ A key table like rebuild_table builds, with every used_every-th slot holding a key """
+    rand = random.Random(seed)
+    table = {}
+    for slot in range(size):
+        if slot % used_every:
+            entry = KeySlotSummary(slot=slot, type='Empty', kcv=None, label=None, modifier=None,
+                                   majorKey=None, usage=None, securityUsage=None)
+        else:
+            entry = KeySlotSummary(
+                slot=slot,
+                type=rand.choice(KEY_TYPES),
+                kcv='{:04X}'.format(rand.getrandbits(16)),
+                label='Key {} {}'.format(rand.choice(('Payments', 'Vault', 'Backup', 'Issuer')), slot),
+                modifier=rand.randint(0, 15),
+                majorKey=rand.choice(('PMK', 'MFK', 'KEK')),
+                usage=tuple(rand.sample(USAGES, 2)),
+                securityUsage=('Private',) if rand.random() < 0.5 else (),
+            )
+        table[KeyTable.merged_search_str(entry)] = entry
+    return table
+
+def reference_search(table, substr, order_by, ascending, empty):
+    """ The original linear KeyTable.search """
+    results = [entry for search_str, entry in table.items()
+               if (empty or entry.type != 'Empty') and substr in search_str]
+    return sorted(results, key=attrgetter(order_by), reverse=not ascending)
+
+def main():
+    slots = int(sys.argv[1]) if len(sys.argv) > 1 else 25450
+    table = synthetic_table(slots)
+
+    start = time.perf_counter()
+    for substr, order_by in QUERIES:
+        reference_search(table, substr, order_by, True, False)
+    reference_time = time.perf_counter() - start
+
+    index = KeyTableIndex(table)
+    start = time.perf_counter()
+    for substr, order_by in QUERIES:
+        index.search(substr, order_by, True, False)[0:50]
+    first_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for substr, order_by in QUERIES:
+        index.search(substr, order_by, True, False)[0:50]
+    indexed_time = time.perf_counter() - start
+
+    print("{} slots, {} queries: linear {:.1f} ms, indexed {:.1f} ms ({:.1f} ms on first use)".format(
+        slots, len(QUERIES), reference_time * 1000, indexed_time * 1000, first_time * 1000))
+
+if __name__ == '__main__':
+    main()
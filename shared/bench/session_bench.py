@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark of rkweb sessions with many active users.
+
+    PYTHONPATH=shared/python python3 shared/bench/session_bench.py [sessions] [requests]
+
+Logs in the given number of sessions in a temporary session directory, then
+serves requests calling AuthSession.get() for randomly picked sessions with
+flask_session's plain filesystem sessions and with the hot tier.
+"""
+
+import sys
+import time
+import random
+import tempfile
+
+from flask import Flask
+from flask_session import Session
+from werkzeug.test import EnvironBuilder
+
+from rkweb.session import AuthSession
+from rkweb.session_config import init_session_config
+
+def make_app(directory, hot):
+    app = Flask(__name__)
+    init_session_config(app)
+    app.config['SESSION_FILE_DIR'] = directory
+    if hot:
+        from rkweb.session_store import HotFileSystemSessionInterface
+        app.session_interface = HotFileSystemSessionInterface.from_config(app.config)
+    else:
+        Session().init_app(app)
+
+    @app.route('/login')
+    def login():
+        auth = AuthSession()
+        auth.users = ['Admin1', 'Admin2']
+        auth.save()
+        return ''
+
+    @app.route('/request')
+    def request():
+        return str(len(AuthSession.get().users))
+
+    return app
+
+def bench(name, directory, hot, cookies, requests):
+    app = make_app(directory, hot)
+    rand = random.Random(1234)
+    environs = [EnvironBuilder(path = '/request', headers = {'Cookie': 'fxsession=' + cookie}).get_environ()
+                for cookie in cookies]
+
+    def start_response(status, headers):
+        assert status.startswith('200')
+
+    start = time.monotonic()
+    for _ in range(requests):
+        assert b''.join(app.wsgi_app(dict(rand.choice(environs)), start_response)) == b'2'
+    elapsed = time.monotonic() - start
+    print("{:<12} {:>6} sessions {:>6} requests {:8.3f}s {:9.0f} req/s".format(
+        name, len(cookies), requests, elapsed, requests / elapsed))
+
+    if hot:
+        app.session_interface.cache.flush(force = True)
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    with tempfile.TemporaryDirectory() as directory:
+        client = make_app(directory, False).test_client()
+        cookies = []
+        for _ in range(sessions):
+            client.cookie_jar.clear()
+            client.get('/login')
+            cookies.append(next(c.value for c in client.cookie_jar if c.name == 'fxsession'))
+
+        bench("filesystem", directory, False, cookies, requests)
+        bench("hot tier", directory, True, cookies, requests)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the session daemons' pass over the session directory.
+
+    PYTHONPATH=shared/python python3 shared/bench/session_index_bench.py [sessions]
+
+Writes synthetic logged-in session files to a temporary directory, then times
+loading every session on each pass, as token-refresh used to, against
+SessionIndex scans with no and with 1% changed sessions.
+"""
+
+import os
+import sys
+import time
+import random
+import datetime
+import tempfile
+
+from cachelib.file import FileSystemCache
+from flask_session.sessions import FileSystemSession
+
+from rkweb.session import AuthSession
+from rkweb.session_index import SessionIndex
+
+def open_cache(directory):
+    cache = FileSystemCache(cache_dir=directory, threshold=0)
+    cache._get_filename = lambda key: os.path.join(directory, key)
+    return cache
+
+def write_sessions(cache, sids, rand):
+    now = datetime.datetime.utcnow()
+    for sid in sids:
+        session = AuthSession()
+        session.users = ['Admin1', 'Admin2']
+        session.token = 'token-' + sid
+        session.token_expiration = now + datetime.timedelta(seconds = rand.randint(60, 900))
+        cache.set(key=sid, value={'auth': session.to_dict()}, timeout=99 * 60)
+
+def load(cache, sid):
+    try:
+        session = AuthSession()
+        session.from_dict(FileSystemSession(cache.get(key=sid), sid=sid)['auth'])
+    except Exception:
+        return None
+    return session.token_expiration
+
+def full_pass(cache, directory):
+    sessions = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
+    return min(filter(None, (load(cache, sid) for sid in sessions)))
+
+def timed(name, sessions, func):
+    start = time.monotonic()
+    func()
+    elapsed = time.monotonic() - start
+    print("{:<24} {:>6} sessions {:9.1f} ms".format(name, sessions, elapsed * 1000))
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rand = random.Random(1234)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = open_cache(directory)
+        sids = ['{:064x}'.format(rand.getrandbits(256)) for _ in range(sessions)]
+        write_sessions(cache, sids, rand)
+
+        index = SessionIndex(directory)
+        timed("full pass", sessions, lambda: full_pass(cache, directory))
+        timed("index, first scan", sessions, lambda: index.scan(lambda sid: load(cache, sid)))
+        timed("index, unchanged", sessions, lambda: index.scan(lambda sid: load(cache, sid)))
+
+        write_sessions(cache, rand.sample(sids, sessions // 100), rand)
+        timed("index, 1% changed", sessions, lambda: index.scan(lambda sid: load(cache, sid)))
+        assert index.next_due() == full_pass(cache, directory)
+
+if __name__ == '__main__':
+    main()
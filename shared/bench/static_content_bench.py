@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark of finding protected static files.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/static_content_bench.py [lookups]
+
+Builds synthetic web roots about the size of the regauth and fxweb ones in a
+temporary directory, then finds random files by walking the roots, as
+find_file used to, and with the StaticIndex.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+import fx
+from static_content_view import StaticIndex
+
+# About the size of the regauth and fxweb web roots as shipped
+SECTIONS = ('components', 'directives', 'idioms', 'sections', 'landing', 'static', 'images')
+FILES_PER_DIRECTORY = 12
+
+def synthetic_web_root(top, apps=('regauth', 'fxweb'), seed=1234):
+    """ Web roots of nested section directories, some file names appearing in several of them """
+    rand = random.Random(seed)
+    names = ['{}{}.{}'.format(stem, i, ext) for i in range(60)
+             for stem, ext in (('view', 'html'), ('controller', 'js'), ('style', 'css'))]
+    for app in apps:
+        for section in SECTIONS:
+            for sub in range(8):
+                directory = os.path.join(top, app, 'js', section, 'part{}'.format(sub))
+                os.makedirs(directory)
+                for name in rand.sample(names, FILES_PER_DIRECTORY):
+                    with open(os.path.join(directory, name), 'w') as f:
+                        f.write(name * rand.randint(1, 20))
+    return [os.path.join(top, app) for app in apps], names
+
+def reference_find(roots, base_uri, filename):
+    """ The original find_file, walking the web roots """
+    trunc_base_uri = base_uri[:-1] if base_uri.endswith('/') else base_uri
+    for topdir in roots:
+        for curdir, subdirs, files in os.walk(topdir):
+            if not filename in files:
+                continue
+            if curdir.find(trunc_base_uri) == -1:
+                continue
+            return os.path.join(curdir, filename)
+    return None
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    top = tempfile.mkdtemp()
+    try:
+        roots, names = synthetic_web_root(top)
+        rand = random.Random(1234)
+        lookups = [(rand.choice(('', 'components/', 'sections/', 'landing/part2/')), rand.choice(names))
+                   for _ in range(count)]
+
+        start = time.perf_counter()
+        for base_uri, filename in lookups:
+            reference_find(roots, base_uri, filename)
+        walk_time = time.perf_counter() - start
+
+        index = StaticIndex(roots)
+        start = time.perf_counter()
+        index.refresh()
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for base_uri, filename in lookups:
+            index.find(base_uri, filename)
+        index_time = time.perf_counter() - start
+
+        files = sum(len(found) for found in index.files.values())
+        print("{} files, {} lookups: walking {:.1f} ms, indexed {:.2f} ms ({:.1f} ms building)".format(
+            files, len(lookups), walk_time * 1000, index_time * 1000, build_time * 1000))
+    finally:
+        shutil.rmtree(top)
+
+if __name__ == '__main__':
+    main()
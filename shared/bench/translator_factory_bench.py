@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the lazy translator registry and the translator pool.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/translator_factory_bench.py [rounds]
+
+Times importing every KMES translator module against the first lookup of the
+lazy registry, as a new worker would, then compares time and allocations of
+constructing a translator per request with acquiring one from a TranslatorPool.
+"""
+
+import sys
+import time
+import contextlib
+import tracemalloc
+
+import fx
+from base.translator_factory import TranslatorPool, TranslatorRegistry, Translators
+
+@contextlib.contextmanager
+def cold_kmes_translators():
+    """ Import the KMES translator modules again, as a new worker would """
+    names = [name for name in sys.modules if name == 'kmes.kmes_translators' or name.startswith('kmes.translators')]
+    saved = {name: sys.modules.pop(name) for name in names}
+    try:
+        yield
+    finally:
+        sys.modules.update(saved)
+        for name, module in saved.items():
+            parent, _, child = name.rpartition('.')
+            setattr(sys.modules[parent], child, module)
+
+def cold_start():
+    with cold_kmes_translators():
+        start = time.perf_counter()
+        for category in Translators['KMES']:
+            TranslatorRegistry('kmes.kmes_translators')[category]
+        eager_time = time.perf_counter() - start
+
+    with cold_kmes_translators():
+        start = time.perf_counter()
+        TranslatorRegistry('kmes.kmes_translators').get_translator('Users', 'Retrieve')
+        lazy_time = time.perf_counter() - start
+
+    print("KMES translators: importing all {:.1f} ms, first lookup {:.1f} ms".format(
+        eager_time * 1000, lazy_time * 1000))
+
+def constructible_translators():
+    translators = []
+    for registry in Translators.values():
+        for operations in registry.values():
+            for translator in operations.values():
+                try:
+                    translator(None)
+                except Exception:
+                    continue
+                translators.append(translator)
+    return translators
+
+@contextlib.contextmanager
+def construct(translator):
+    yield translator(None)
+
+def timed(acquire, translators, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for translator in translators:
+            with acquire(translator):
+                pass
+    return time.perf_counter() - start
+
+def allocated(acquire, translators):
+    """ Bytes allocated while acquiring and releasing each translator once """
+    total = 0
+    tracemalloc.start()
+    for translator in translators:
+        # Resets both the traced and the peak size, reset_peak() needs Python 3.9
+        tracemalloc.clear_traces()
+        with acquire(translator):
+            pass
+        total += tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return total
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    cold_start()
+
+    translators = constructible_translators()
+    pool = TranslatorPool()
+    pooled = lambda translator: pool.acquire(translator, None)
+    timed(pooled, translators, 1)  # warm up
+
+    print("{} translators, {} requests:".format(len(translators), rounds * len(translators)))
+    for name, acquire in (("constructing", construct), ("pooled", pooled)):
+        print("  {:<13} {:8.1f} ms {:8} KiB per round".format(
+            name, timed(acquire, translators, rounds) * 1000, allocated(acquire, translators) // 1024))
+
+if __name__ == '__main__':
+    main()
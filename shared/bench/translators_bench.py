@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark of translating requests and responses with the KMES and RA translators.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/translators_bench.py [per-translator]
+
+Instantiates every translator with a request or response map per request, as
+the views do, and translates random requests and responses with the compiled
+maps and with the maps interpreted field by field.
+"""
+
+import sys
+import time
+import random
+from unittest import mock
+
+import fx
+from base.base_exceptions import SerializationError
+from base.base_translator import BaseTranslator
+from base.translator_factory import Translators
+from lib.utils.data_structures import ExcryptMessage
+
+REQUEST_VALUES = ('value', 'two words', '1', 7, True, False, None, ['a', 'b'], {'nested': 'value'}, 'bad;value')
+RESPONSE_VALUES = ('Y', 'N', '1', '0', 'a,b,c', '20240101', '')
+
+def all_translators(server_interface=None):
+    """ An instance of every KMES and RA translator with a request or response map """
+    translators = []
+    for app_type, categories in Translators.items():
+        for category, operations in categories.items():
+            for operation, cls in operations.items():
+                try:
+                    translator = cls(server_interface)
+                except Exception:
+                    continue
+                if getattr(translator, 'request_map', None) or getattr(translator, 'response_map', None):
+                    translators.append((f'{app_type}.{category}.{operation}', translator))
+    return translators
+
+def set_path(data, path, value):
+    *parents, key = path.split('.')
+    for parent in parents:
+        data = data.setdefault(parent, {})
+    data[key] = value
+
+def synthetic_request(translator, rand):
+    request = {}
+    for field in translator.request_map or ():
+        if rand.random() < 0.8:
+            set_path(request, field, rand.choice(REQUEST_VALUES))
+    return request
+
+def synthetic_response(translator, rand):
+    return ExcryptMessage({tag: rand.choice(RESPONSE_VALUES) for tag in translator.response_map or ()
+                           if '.' not in tag and rand.random() < 0.8})
+
+def outcome(translate, data):
+    try:
+        return dict(translate(data))
+    except SerializationError as e:
+        return SerializationError, e.field_name, e.message
+    except Exception as e:
+        return type(e)
+
+def interpreted():
+    """ Translate with the maps interpreted field by field, as before they were compiled """
+    return mock.patch.object(BaseTranslator, '_compiles_maps', return_value=False)
+
+def main():
+    per_translator = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    translators = all_translators()
+    rand = random.Random(1234)
+    workload = [(type(translator), synthetic_request(translator, rand), synthetic_response(translator, rand))
+                for _, translator in translators for _ in range(per_translator)]
+
+    def run():
+        start = time.perf_counter()
+        for cls, request, response in workload:
+            translator = cls(None)
+            outcome(translator.translateRequest, request)
+            outcome(translator.translateResponse, response)
+        return time.perf_counter() - start
+
+    with interpreted():
+        interpreted_time = run()
+    compiled_time = run()
+
+    print("{} translators, {} translations: interpreted {:.1f} ms, compiled {:.1f} ms".format(
+        len(translators), len(workload), interpreted_time * 1000, compiled_time * 1000))
+
+if __name__ == '__main__':
+    main()
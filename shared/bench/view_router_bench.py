@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark of routing requests to the KMES and RA views.
+
+    PYTHONPATH=fxweb/python python3 shared/bench/view_router_bench.py [rounds]
+
+Looks up the view for requests matching every Route decorated view, and for
+random mixes of the fields they route on, with the compiled LookupView tables
+and with the original table by table filtering.
+"""
+
+import sys
+import time
+import random
+import pkgutil
+import importlib
+from functools import partialmethod
+
+import fx
+import kmes.views
+from lib.utils.view_router import AmbiguousRequestError, LookupView, MissingOptionsError
+from utils.container_filters import dot_notation_get
+
+RA_MODULES = ('regauth.regauth_views',)
+
+def routed_views():
+    """ Every (class, LookupView) of the Route decorated KMES and RA views """
+    modules = [f'kmes.views.{name}' for _, name, _ in pkgutil.iter_modules(kmes.views.__path__)]
+    lookups = []
+    for module in map(importlib.import_module, [*modules, *RA_MODULES]):
+        for cls in vars(module).values():
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            for attr in vars(cls).values():
+                if isinstance(attr, partialmethod) and attr.func is LookupView.view:
+                    lookups.append((cls, attr.args[0]))
+    return lookups
+
+def reference_lookup(tables, request_data):
+    """ The original LookupView.lookup, filtering dicts of views table by table """
+    matches = {pattern[0]: True for table in tables for pattern in table}
+    for table in tables:
+        new_matches = {}
+        views_in_table = set()
+        for view, path, value in table:
+            if view not in matches:
+                continue
+            views_in_table.add(view)
+            if path == '*':
+                new_matches.setdefault(view, False)
+                continue
+            request_value = dot_notation_get(request_data, path, default=Ellipsis)
+            if request_value is Ellipsis:
+                continue
+            if request_value == value or value == '*':
+                new_matches[view] = matches[view]
+        new_matches.update({view: matches[view] for view in matches.keys() - views_in_table})
+        if not new_matches:
+            raise MissingOptionsError(matches, table)
+        matches = new_matches
+
+    if len(matches) == 1:
+        return matches.popitem()[0]
+    specific_matches = [view for view, specific in matches.items() if specific]
+    if len(specific_matches) == 1:
+        return specific_matches[0]
+    raise AmbiguousRequestError(specific_matches, tables, request_data)
+
+def set_path(data, path, value):
+    *parents, key = path.split('.')
+    for parent in parents:
+        data = data.setdefault(parent, {})
+    data[key] = value
+
+def synthetic_requests(lookup_view, count, seed=1234):
+    """ Requests that match each view, plus random mixes of the paths and values the views look for """
+    rand = random.Random(seed)
+    patterns = [(path, value) for table in lookup_view.tables for view, path, value in table if path != '*']
+    requests = [{}]
+    for view in lookup_view.views:
+        request_data = {}
+        for table in lookup_view.tables:
+            options = [(path, value) for handler, path, value in table if handler is view and path != '*']
+            if options:
+                path, value = rand.choice(options)
+                set_path(request_data, path, 'anything' if value == '*' else value)
+        requests.append(request_data)
+    while patterns and len(requests) < count:
+        request_data = {}
+        for path, value in rand.sample(patterns, rand.randint(1, min(3, len(patterns)))):
+            set_path(request_data, path, rand.choice((value, 'other', 0)))
+        requests.append(request_data)
+    return requests
+
+def outcome(lookup, request_data):
+    try:
+        return lookup(request_data)
+    except (MissingOptionsError, AmbiguousRequestError) as e:
+        return type(e), str(e)
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    lookups = routed_views()
+    workload = [(lookup_view, request_data) for _, lookup_view in lookups
+                for request_data in synthetic_requests(lookup_view, 200)]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for lookup_view, request_data in workload:
+            outcome(lambda data: reference_lookup(lookup_view.tables, data), request_data)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for lookup_view, request_data in workload:
+            outcome(lookup_view.lookup, request_data)
+    compiled_time = time.perf_counter() - start
+
+    print("{} routed views, {} lookups: reference {:.1f} ms, compiled {:.1f} ms".format(
+        len(lookups), rounds * len(workload), reference_time * 1000, compiled_time * 1000))
+
+if __name__ == '__main__':
+    main()
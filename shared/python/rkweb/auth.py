@@ -124,7 +124,7 @@ def perm_required(perm):
             # Get login state
             sess = await check_csrf_login()
             # Check permissions
-            if len(sess.perms) == 0 or len(sess.users) == 0 or not perm in sess.perms:
+            if len(sess.perms) == 0 or len(sess.users) == 0 or not sess.has_perm(perm):
                 unauthorized("Missing permission {}".format(perm))
             # Forward to view
             return await func(*args, **kwargs)
@@ -139,7 +139,7 @@ def perms_required(perms):
             # Get login state
             sess = await check_csrf_login()
             # Check permissions
-            if len(sess.perms) == 0 or len(sess.users) == 0 or not all(perm in sess.perms for perm in perms):
+            if len(sess.perms) == 0 or len(sess.users) == 0 or not sess.has_all(perms):
                 unauthorized("Missing permission set ({})".format(",".join(perms)))
             # Forward to view
             return await func(*args, **kwargs)
@@ -154,7 +154,7 @@ def one_perm_required(perms):
             # Get login state
             sess = await check_csrf_login()
             # Check permissions
-            if len(sess.perms) == 0 or len(sess.users) == 0 or not any(perm in sess.perms for perm in perms):
+            if len(sess.perms) == 0 or len(sess.users) == 0 or not sess.has_any(perms):
                 unauthorized("Missing one permission of ({})".format(",".join(perms)))
             # Forward to view
             return await func(*args, **kwargs)
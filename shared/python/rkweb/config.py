@@ -1,14 +1,38 @@
 import os
-import datetime
+import time
+import asyncio
+import threading
 
-from asyncio import Lock
 from urllib.parse import urlsplit
 
 from rkweb.rkserver import ServerConn, ExcryptMsg
 
+# Seconds the web configuration is served before it is refreshed in the background
+WEB_CONFIG_REFRESH = 5 * 60
+# Seconds before retrying a failed refresh, doubled on each failure up to WEB_CONFIG_REFRESH
+WEB_CONFIG_RETRY = 5
+
 class WebConfig(object):
-    lock = Lock()
+    """
+    Web configuration from the server's [AOWEBI;] response.
+
+    Reads never wait on a lock: the cached values are served until they are
+    due, then refreshed on a background thread while callers keep getting the
+    previous ones. Only the first load is waited for. Concurrent callers share
+    one request, and failed refreshes are retried with backoff.
+    """
+    # time.monotonic() of the last successful refresh
     last_update = None
+    # time.monotonic() when the configuration is refreshed next
+    next_refresh = 0
+    # Consecutive failed refreshes
+    failures = 0
+    # The refresh in flight, and the background event loop running it
+    refreshing = None
+    loop = None
+    # Process that started the loop's thread
+    pid = None
+    lock = threading.Lock()
 
     origins = []
     jwt_headers = ["Authorization"]
@@ -52,41 +76,91 @@ class WebConfig(object):
         return cls.is_virtual
 
     @classmethod
-    async def _refresh(cls):
-        await cls.lock.acquire()
-        try:
-            # Only refresh once every 5 minutes
-            if cls.last_update and (cls.last_update + datetime.timedelta(minutes=5)) > datetime.datetime.utcnow():
-                return None
+    def invalidate(cls):
+        """ Refresh on the next read, for callers that changed the configuration """
+        cls.next_refresh = 0
 
-            # Try to get config from server
-            server = ServerConn()
-            rsp = await server.send_excrypt("[AOWEBI;]")
-            if not rsp or rsp.get_tag("AN") != "Y":
-                return None
-
-            # Is docker
-            cls.is_virtual = rsp.get_tag("VR") == "1"
+    @classmethod
+    def fresh(cls):
+        return time.monotonic() < cls.next_refresh
 
-            # Get max sessions
-            cls.max_sessions = int(rsp.get_tag("MS"))
+    @classmethod
+    async def _refresh(cls):
+        if cls.fresh():
+            return
+        refresh = cls._start_refresh()
+        if cls.last_update is None:
+            # Nothing to serve yet
+            await asyncio.shield(asyncio.wrap_future(refresh))
 
-            # Get custom headers
-            cls.jwt_headers = rsp.get_tag("JH").split(",")
-            cls.api_headers = rsp.get_tag("AP").split(",")
+    @classmethod
+    async def ensure_fresh(cls):
+        """ Wait for the refresh if one is due, for callers that don't keep an event loop running """
+        if cls.fresh():
+            return
+        await asyncio.shield(asyncio.wrap_future(cls._start_refresh()))
 
-            # Get origins
-            cls.origins = WebConfig.parse_origins(rsp)
+    @classmethod
+    def _start_refresh(cls):
+        """
+        Start a refresh unless one is in flight. Flask runs each async view on its
+        own event loop and cancels whatever is left on it when the view returns,
+        so the refresh runs on a loop owned by a background thread instead.
+        """
+        # The socket depends on the request's client, the refresh thread has no request
+        sockfile = ServerConn.get_sockfile()
+        with cls.lock:
+            # uWSGI forks workers after import, the thread doesn't carry over
+            if cls.pid != os.getpid():
+                cls.pid = os.getpid()
+                cls.loop = asyncio.new_event_loop()
+                cls.refreshing = None
+                threading.Thread(target=cls.loop.run_forever, name="WebConfig", daemon=True).start()
+            if cls.refreshing is None or cls.refreshing.done():
+                cls.refreshing = asyncio.run_coroutine_threadsafe(cls._load(sockfile), cls.loop)
+            return cls.refreshing
 
-            # Get features
-            cls.features = WebConfig.parse_features(rsp.get_tag("FE"))
+    @classmethod
+    def _retry_later(cls, reason):
+        cls.failures += 1
+        retry = min(WEB_CONFIG_RETRY * 2 ** (cls.failures - 1), WEB_CONFIG_REFRESH)
+        cls.next_refresh = time.monotonic() + retry
+        print("Failed to refresh web configuration, retrying in {}s: {}".format(retry, reason))
 
-            # Updated
-            cls.last_update = datetime.datetime.utcnow()
-        except:
-            pass
-        finally:
-            cls.lock.release()
+    @classmethod
+    async def _load(cls, sockfile):
+        try:
+            # Try to get config from server
+            server = ServerConn(sockfile=sockfile)
+            rsp = await server.send_excrypt("[AOWEBI;]")
+            if not rsp or rsp.get_tag("AN") != "Y":
+                raise ValueError("WEBI failed: {}".format(rsp.get_tag("BB") if rsp else "no response"))
+
+            # Parse everything before changing anything
+            is_virtual = rsp.get_tag("VR") == "1"
+            max_sessions = int(rsp.get_tag("MS"))
+            jwt_headers = rsp.get_tag("JH").split(",")
+            api_key_headers = rsp.get_tag("AP").split(",")
+            origins = WebConfig.parse_origins(rsp)
+            features = WebConfig.parse_features(rsp.get_tag("FE"))
+        except asyncio.CancelledError:
+            # Not an Exception since Python 3.8, back off all the same
+            cls._retry_later("cancelled")
+            raise
+        except Exception as e:
+            cls._retry_later(e)
+            return
+
+        cls.is_virtual = is_virtual
+        cls.max_sessions = max_sessions
+        cls.jwt_headers = jwt_headers
+        cls.api_key_headers = api_key_headers
+        cls.origins = origins
+        cls.features = features
+
+        cls.failures = 0
+        cls.last_update = time.monotonic()
+        cls.next_refresh = cls.last_update + WEB_CONFIG_REFRESH
 
     # Parse valid web origins from response
     def parse_origins(rsp: ExcryptMsg):
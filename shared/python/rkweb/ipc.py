@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 
+import os
+import time
+import atexit
+import asyncio
+import itertools
+import threading
+import collections
+
 import zmq
-import zmq.asyncio
 
 # protobuf imports
 from rkproto.comm.RequestMessage_pb2 import RequestMessage
@@ -13,7 +20,17 @@ from google.protobuf import json_format
 from rkweb.session import AuthSession
 from rkweb.flaskutils import abort, respond
 
-zmq_context = zmq.asyncio.Context()
+# Maximum requests in flight on one service connection before callers queue
+IPC_WINDOW = 32
+# Time allowed for a request to get onto the wire (ms)
+IPC_SEND_TIMEOUT = 1000
+# I/O thread wakeup interval when idle (ms)
+IPC_POLL_INTERVAL = 250
+# Reconnect backoff bounds (ms)
+IPC_RECONNECT_MIN = 100
+IPC_RECONNECT_MAX = 5000
+# Consecutive response timeouts before a connection is reset
+IPC_MAX_TIMEOUTS = 3
 
 class IpcError(RuntimeError):
     """
@@ -29,25 +46,269 @@ class IpcError(RuntimeError):
         self.field = field
         self.msg = msg
 
-class IpcUtils(object):
-    @staticmethod
-    def __localhost():
-        """ Retrieve the IP to use for ZMQ TCP/IPC """
-        return "127.0.0.1"
+class IpcRequest(object):
+    """ A single request waiting on an IpcChannel """
+    __slots__ = ('id', 'data', 'loop', 'future', 'send_deadline', 'sent')
 
-    @staticmethod
-    def __new_conn(port, verbose = False):
-        """ Open new connection to service """
+    def __init__(self, req_id: bytes, data: str, loop):
+        self.id = req_id
+        self.data = data
+        self.loop = loop
+        self.future = loop.create_future()
+        self.send_deadline = time.monotonic() + IPC_SEND_TIMEOUT / 1000
+        self.sent = False
 
-        ip = IpcUtils.__localhost()
-        # Open ZMQ connection
-        socket = zmq_context.socket(zmq.REQ)
-        dest = "tcp://{}:{}".format(ip, port)
-        if verbose:
-            print("Connecting to {}.".format(dest))
-        socket.connect(dest)
+    def resolve(self, result = None, error = None):
+        """ Complete the request from the channel I/O thread """
+        def complete():
+            if self.future.done():
+                return
+            if error:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+
+        try:
+            self.loop.call_soon_threadsafe(complete)
+        except RuntimeError:
+            # Caller gave up and its event loop is already closed
+            pass
+
+class IpcChannel(object):
+    """
+    Persistent DEALER connection to a single microservice port.
+
+    Every request is sent as [request ID, '', data]. REP and ROUTER services
+    hand the routing frames before the delimiter back unchanged, so responses
+    are matched by ID and many requests can share the connection.
+
+    Flask runs each async view on its own event loop and zmq sockets can not
+    be shared between threads, so the socket is owned by an I/O thread and
+    callers are completed through their own loop.
+    """
+    def __init__(self, context, port, window = IPC_WINDOW):
+        """
+        Open the connection
+
+        Args:
+            context: The zmq context to create the socket with
+            port: The microservice API port
+            window: Maximum number of requests in flight at once
+        """
+        self.context = context
+        self.port = port
+        self.window = window
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.backlog = collections.deque()
+        self.pending = {}
+        self.timeouts = 0
+        self.reconnect_delay = IPC_RECONNECT_MIN
+        self.running = True
+        self.wake_r, self.wake_w = os.pipe()
+        self.thread = threading.Thread(target=self.__run, name="ipc-{}".format(port), daemon=True)
+        self.thread.start()
+
+    def address(self):
+        """ The ZMQ TCP address of the service """
+        return "tcp://127.0.0.1:{}".format(self.port)
+
+    async def request(self, data: str, timeout: int) -> str:
+        """
+        Send a request and wait for its response
+
+        Args:
+            data: The request string
+            timeout: Milliseconds to wait for the response once sent
+        Returns:
+            The response string
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if not self.running:
+                raise IpcError(RC.IpcError, "pysend", "Failed to send IPC request from web service.")
+            req = IpcRequest(next(self.ids).to_bytes(8, 'big'), data, loop)
+            self.backlog.append(req)
+        self.__wake()
+
+        try:
+            return await asyncio.wait_for(req.future, timeout=(IPC_SEND_TIMEOUT + timeout) / 1000)
+        except asyncio.TimeoutError:
+            self.__abandon(req, timed_out=True)
+            if not req.sent:
+                raise IpcError(RC.IpcError, "pysend", "Failed to send IPC request from web service.")
+            raise IpcError(RC.Timeout, "pyrecv", "Timeout waiting for IPC response to web service.")
+        except asyncio.CancelledError:
+            self.__abandon(req, timed_out=False)
+            raise
+
+    def close(self):
+        """ Stop the I/O thread and close the socket """
+        with self.lock:
+            self.running = False
+        self.__wake()
+        self.thread.join(timeout=IPC_POLL_INTERVAL * 4 / 1000)
+
+    def __wake(self):
+        try:
+            os.write(self.wake_w, b'\0')
+        except OSError:
+            pass
+
+    def __abandon(self, req, timed_out):
+        """ Forget a request the caller stopped waiting on """
+        with self.lock:
+            try:
+                self.backlog.remove(req)
+            except ValueError:
+                pass
+            if self.pending.pop(req.id, None) and timed_out:
+                self.timeouts += 1
+
+    def __fail_all(self, error):
+        """ Fail every queued and in flight request """
+        with self.lock:
+            reqs = list(self.backlog) + list(self.pending.values())
+            self.backlog.clear()
+            self.pending = {}
+        for req in reqs:
+            req.resolve(error=error)
+
+    def __connect(self):
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        # Don't queue requests to a service that isn't connected
+        socket.setsockopt(zmq.IMMEDIATE, 1)
+        socket.setsockopt(zmq.RECONNECT_IVL, IPC_RECONNECT_MIN)
+        socket.setsockopt(zmq.RECONNECT_IVL_MAX, IPC_RECONNECT_MAX)
+        socket.connect(self.address())
         return socket
 
+    def __run(self):
+        socket = None
+        reconnect_at = 0
+        poller = zmq.Poller()
+        poller.register(self.wake_r, zmq.POLLIN)
+
+        while self.running:
+            # Service stopped answering, drop the connection and back off
+            if socket and self.timeouts >= IPC_MAX_TIMEOUTS:
+                print("IPC connection to port {} reset after {} timeouts.".format(self.port, self.timeouts))
+                poller.unregister(socket)
+                socket.close()
+                socket = None
+                self.__fail_all(IpcError(RC.IpcError, "pyrecv", "IPC connection to web service was reset."))
+                reconnect_at = time.monotonic() + self.reconnect_delay / 1000
+                self.reconnect_delay = min(self.reconnect_delay * 2, IPC_RECONNECT_MAX)
+                self.timeouts = 0
+
+            # (Re)connect
+            if not socket and time.monotonic() >= reconnect_at:
+                socket = self.__connect()
+                poller.register(socket, zmq.POLLIN)
+
+            events = dict(poller.poll(timeout=IPC_POLL_INTERVAL))
+            if self.wake_r in events:
+                os.read(self.wake_r, 4096)
+            if socket and socket in events:
+                self.__recv(socket)
+            self.__flush(socket)
+
+        # Shutdown
+        if socket:
+            socket.close()
+        self.__fail_all(IpcError(RC.IpcError, "pysend", "IPC connection to web service was closed."))
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+    def __recv(self, socket):
+        """ Dispatch every response waiting on the socket """
+        while True:
+            try:
+                frames = socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+
+            # [request ID, '', response]
+            if len(frames) != 3:
+                continue
+            with self.lock:
+                req = self.pending.pop(frames[0], None)
+                if req:
+                    self.timeouts = 0
+                    self.reconnect_delay = IPC_RECONNECT_MIN
+            # Late response to an abandoned request
+            if not req:
+                continue
+            req.resolve(result=frames[2].decode('utf-8'))
+
+    def __flush(self, socket):
+        """ Send queued requests while the in flight window allows """
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            while socket and self.backlog and len(self.pending) < self.window:
+                req = self.backlog[0]
+                try:
+                    socket.send_multipart([req.id, b'', req.data.encode('utf-8')], zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                self.backlog.popleft()
+                req.sent = True
+                self.pending[req.id] = req
+
+            # Requests queue in order, so expired ones are at the front
+            while self.backlog and self.backlog[0].send_deadline < now:
+                expired.append(self.backlog.popleft())
+
+        for req in expired:
+            req.resolve(error=IpcError(RC.IpcError, "pysend", "Failed to send IPC request from web service."))
+
+class IpcPool(object):
+    """ Per-process IPC connections, one per microservice port """
+    lock = threading.Lock()
+    pid = None
+    context = None
+    channels = {}
+
+    @classmethod
+    def channel(cls, port) -> IpcChannel:
+        """
+        Get the connection for a port, opening it on first use
+
+        Args:
+            port: The microservice API port
+        Returns:
+            IpcChannel
+        """
+        with cls.lock:
+            # uWSGI forks workers after import, connections and threads don't carry over
+            if cls.pid != os.getpid():
+                cls.pid = os.getpid()
+                cls.context = zmq.Context()
+                cls.channels = {}
+            channel = cls.channels.get(port)
+            if not channel:
+                channel = IpcChannel(cls.context, port)
+                cls.channels[port] = channel
+            return channel
+
+    @classmethod
+    def close(cls):
+        """ Close every connection owned by this process """
+        with cls.lock:
+            if cls.pid != os.getpid():
+                return
+            for channel in cls.channels.values():
+                channel.close()
+            cls.channels = {}
+            cls.context.term()
+            cls.context = None
+            cls.pid = None
+
+atexit.register(IpcPool.close)
+
+class IpcUtils(object):
     @staticmethod
     async def send(port, msg, resp_type = None, auth_token = None, verbose = False, timeout = 5 * 1000):
         """
@@ -98,30 +359,23 @@ class IpcUtils(object):
 
     @staticmethod
     async def send_json(port, data, verbose = False, timeout = 5000):
-        """ Send string data to a microservice synchronously """
+        """ Send string data to a microservice over its pooled connection """
 
-        socket = IpcUtils.__new_conn(port=port, verbose=verbose)
+        channel = IpcPool.channel(port)
         if verbose:
-            print("Sending: {}".format(data))
-
-        # Send poll (Static 1s timeout)
-        poller = zmq.asyncio.Poller()
-        poller.register(socket, zmq.POLLOUT)
-        if not await poller.poll(timeout=1000):
-            raise IpcError(RC.IpcError, "pysend", "Failed to send IPC request from web service.")
-        await socket.send_string(data)
-
-        # Recv poll (default 5s timeout)
-        poller.unregister(socket)
-        poller.register(socket, zmq.POLLIN)
-        if not await poller.poll(timeout=timeout):
-            raise IpcError(RC.Timeout, "pyrecv", "Timeout waiting for IPC response to web service.")
-        response_data = await socket.recv_string()
+            print("Sending to {}: {}".format(channel.address(), data))
+
+        response_data = await channel.request(data, timeout)
 
         if verbose:
             print("Received: {}".format(response_data))
         return response_data
 
+    @staticmethod
+    def close():
+        """ Close all pooled microservice connections for this process """
+        IpcPool.close()
+
 def handle_ipc_error(error):
     # Default is internal error if we don't know how to categorize the error
     code = 500 # INTERNAL ERROR
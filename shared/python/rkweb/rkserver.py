@@ -1,7 +1,29 @@
+import os
+import atexit
 import asyncio
+import itertools
+import selectors
+import socket
+import threading
+import collections
 
 from rkweb.security import is_api_user
 
+# Directory holding the Excrypt server sockets
+SOCKET_DIR = '/var/run/fx/sockets/server/'
+# Default time to wait for an Excrypt response (s)
+EXCRYPT_TIMEOUT = float(os.getenv('RKWEB_EXCRYPT_TIMEOUT', 2))
+# Persistent connections per server socket
+EXCRYPT_POOL_SIZE = 4
+# Maximum requests in flight on one connection before callers queue
+EXCRYPT_WINDOW = 16
+# Time allowed to connect to the server socket (s)
+EXCRYPT_CONNECT_TIMEOUT = 1
+# Consecutive response timeouts before a connection is reset
+EXCRYPT_MAX_TIMEOUTS = 3
+# Tag the server echoes back, used to match responses to requests
+EXCRYPT_ECHO_TAG = 'AG'
+
 class ExcryptMsg(object):
     def __init__(self, data = ''):
         self.tags = {}
@@ -70,59 +92,429 @@ class ExcryptMsg(object):
     def __str__(self):
         return self.to_string()
 
-class ServerConn(object):
-    async def read_response(self, reader):
-        in_data = ""
-        complete = False
-        while not complete:
-            in_data += (await reader.read(32768)).decode('utf-8')
-            complete = in_data.find(']') >= 0
+class ExcryptFramer(object):
+    """
+    Splits a stream of received data into complete [...] Excrypt messages.
+    Data before a message's '[' is dropped, as is an unterminated message
+    that is followed by another '['.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        # Position up to which the buffer holds no ']'
+        self.scan = 0
+
+    def feed(self, data: bytes):
+        """
+        Add received data
+
+        Args:
+            data: The received bytes
+        Returns:
+            List of complete messages (bytes)
+        """
+        buf = self.buffer
+        buf += data
+        messages = []
+        pos = 0
+        while True:
+            end = buf.find(b']', max(pos, self.scan))
+            if end < 0:
+                break
+            start = buf.rfind(b'[', pos, end)
+            if start >= 0:
+                messages.append(bytes(buf[start:end + 1]))
+            pos = end + 1
+            self.scan = pos
+
+        # Keep only a message that is still being received
+        start = buf.rfind(b'[', pos)
+        del buf[:start if start >= 0 else len(buf)]
+        self.scan = len(buf)
+        return messages
+
+class ExcryptRequest(object):
+    """ A single request waiting on an ExcryptChannel """
+    __slots__ = ('tag', 'data', 'loop', 'future', 'offset')
+
+    def __init__(self, tag: str, data: bytes, loop):
+        self.tag = tag
+        self.data = data
+        self.loop = loop
+        self.future = loop.create_future()
+        # Position of the request in the bytes sent on its connection
+        self.offset = None
+
+    def resolve(self, result = None, error = None):
+        """ Complete the request from the channel I/O thread """
+        def complete():
+            if self.future.done():
+                return
+            if error:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+
+        try:
+            self.loop.call_soon_threadsafe(complete)
+        except RuntimeError:
+            # Caller gave up and its event loop is already closed
+            pass
+
+class ExcryptChannel(object):
+    """
+    Persistent connection to an Excrypt server socket.
+
+    Every request is tagged with a unique echo tag (AG) so responses are
+    matched back to their request and many requests can share the connection.
+    A response without the tag is only accepted while it can answer nothing
+    but the one request in flight. Otherwise the connection is reset and sends
+    one request at a time, rather than guessing which request it answers.
+
+    Flask runs each async view on its own event loop, so the socket is owned
+    by an I/O thread and callers are completed through their own loop.
+    """
+    def __init__(self, path, window = EXCRYPT_WINDOW):
+        """
+        Start the connection I/O thread, the socket is connected on first use
+
+        Args:
+            path: The server socket file
+            window: Maximum number of requests in flight at once
+        """
+        self.path = path
+        self.window = window
+        self.lock = threading.Lock()
+        self.tags = itertools.count(1)
+        self.backlog = collections.deque()
+        self.pending = collections.OrderedDict()
+        # Tags of sent requests the caller stopped waiting on, their response may still arrive
+        self.abandoned = set()
+        # A response arrived that can't be matched to a request
+        self.unmatched = False
+        self.timeouts = 0
+        self.running = True
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        self.thread = threading.Thread(target=self.__run, name="excrypt-{}".format(os.path.basename(path)), daemon=True)
+        self.thread.start()
+
+    def load(self):
+        """ Number of requests queued or in flight """
+        return len(self.backlog) + len(self.pending)
+
+    async def request(self, data: str, timeout: float) -> str:
+        """
+        Send a request and wait for its response
+
+        Args:
+            data: The Excrypt request, without an echo tag
+            timeout: Seconds to wait for the response
+        Returns:
+            The Excrypt response
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if not self.running:
+                raise ConnectionError("Excrypt connection to {} is closed.".format(self.path))
+            tag = "W{}".format(next(self.tags))
+            req = ExcryptRequest(tag, data[:-1].encode('utf-8') + "{}{};]".format(EXCRYPT_ECHO_TAG, tag).encode('utf-8'), loop)
+            self.backlog.append(req)
+        self.__wake()
+
+        try:
+            return await asyncio.wait_for(req.future, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.__abandon(req, timed_out=True)
+            raise RuntimeError("Timeout waiting for Excrypt response from server.")
+        except asyncio.CancelledError:
+            self.__abandon(req, timed_out=False)
+            raise
+
+    def close(self):
+        """ Stop the I/O thread and close the socket """
+        with self.lock:
+            self.running = False
+        self.__wake()
+        self.thread.join(timeout=EXCRYPT_CONNECT_TIMEOUT)
+
+    def __wake(self):
+        try:
+            os.write(self.wake_w, b'\0')
+        except OSError:
+            pass
 
-        return in_data, complete
+    def __abandon(self, req, timed_out):
+        """ Forget a request the caller stopped waiting on """
+        with self.lock:
+            try:
+                self.backlog.remove(req)
+            except ValueError:
+                pass
+            if self.pending.pop(req.tag, None):
+                self.abandoned.add(req.tag)
+                if timed_out:
+                    self.timeouts += 1
+        self.__wake()
+
+    def __fail(self, reqs, error):
+        for req in reqs:
+            req.resolve(error=error)
+
+    def __connect(self):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.settimeout(EXCRYPT_CONNECT_TIMEOUT)
+            conn.connect(self.path)
+            conn.setblocking(False)
+        except OSError:
+            conn.close()
+            raise
+        return conn
+
+    def __run(self):
+        sel = selectors.DefaultSelector()
+        sel.register(self.wake_r, selectors.EVENT_READ)
+        conn = None
+        framer = None
+        out = bytearray()
+        queued = 0
+        written = 0
+        answered = 0
+
+        while self.running:
+            with self.lock:
+                # Server stopped answering or sent a response that can't be matched, a late
+                # response could otherwise be given to the wrong request
+                unmatched = self.unmatched
+                reset = conn is not None and (unmatched or self.timeouts >= EXCRYPT_MAX_TIMEOUTS)
+                if reset:
+                    self.timeouts = 0
+                    self.unmatched = False
+                    self.abandoned.clear()
+                    failed = list(self.pending.values())
+                    self.pending.clear()
+                wanted = conn is None and self.backlog
+            if reset:
+                if unmatched:
+                    print("Excrypt connection to {} reset after an untagged response.".format(self.path))
+                else:
+                    print("Excrypt connection to {} reset after {} timeouts.".format(self.path, EXCRYPT_MAX_TIMEOUTS))
+                sel.unregister(conn)
+                conn.close()
+                conn = None
+                self.__fail(failed, RuntimeError("Excrypt connection to server was reset."))
+
+            # Connect when there is something to send
+            if wanted:
+                try:
+                    conn = self.__connect()
+                except OSError as e:
+                    with self.lock:
+                        failed = list(self.backlog)
+                        self.backlog.clear()
+                    self.__fail(failed, ConnectionError("Failed to connect to Excrypt server: {}".format(e)))
+                else:
+                    framer = ExcryptFramer()
+                    out = bytearray()
+                    queued = 0
+                    written = 0
+                    answered = 0
+                    sel.register(conn, selectors.EVENT_READ)
+
+            # Move queued requests into the window
+            if conn is not None:
+                with self.lock:
+                    while self.backlog and len(self.pending) < self.window:
+                        req = self.backlog.popleft()
+                        self.pending[req.tag] = req
+                        req.offset = queued
+                        queued += len(req.data)
+                        out += req.data
+
+            if conn is not None:
+                sel.modify(conn, selectors.EVENT_READ | (selectors.EVENT_WRITE if out else 0))
+
+            closed = False
+            for key, events in sel.select():
+                if key.fileobj == self.wake_r:
+                    try:
+                        os.read(self.wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                try:
+                    if events & selectors.EVENT_WRITE and out:
+                        sent = conn.send(out)
+                        del out[:sent]
+                        written += sent
+                    if events & selectors.EVENT_READ:
+                        data = conn.recv(32768)
+                        if not data:
+                            closed = True
+                        else:
+                            answered += self.__dispatch(framer.feed(data))
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError:
+                    closed = True
+
+            # Server closed the connection
+            if closed:
+                sel.unregister(conn)
+                conn.close()
+                conn = None
+                with self.lock:
+                    unanswered = list(self.pending.values())
+                    self.pending.clear()
+                    self.abandoned.clear()
+                    self.unmatched = False
+                    # A request that reached the server may have been executed, sending it
+                    # again could repeat a write. Only requests never written are sent again,
+                    # and only if the connection was answering.
+                    requeue = [req for req in unanswered if answered and req.offset >= written]
+                    failed = [req for req in unanswered if req not in requeue]
+                    self.backlog.extendleft(reversed(requeue))
+                    # It hung up on pipelined requests, so it only serves one request per
+                    # connection. Send the rest one connection at a time.
+                    notify = answered and unanswered and self.window > 1
+                    if notify:
+                        self.window = 1
+                if notify:
+                    print("Excrypt server at {} closes connections after one request.".format(self.path))
+                self.__fail(failed, ConnectionError("Excrypt connection to server was closed."))
+
+        # Shutdown
+        if conn is not None:
+            conn.close()
+        sel.close()
+        with self.lock:
+            failed = list(self.backlog) + list(self.pending.values())
+            self.backlog.clear()
+            self.pending.clear()
+        self.__fail(failed, ConnectionError("Excrypt connection to {} is closed.".format(self.path)))
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+    def __dispatch(self, messages):
+        """
+        Complete the requests the received messages answer
+
+        Returns:
+            Number of messages received
+        """
+        for message in messages:
+            rsp = ExcryptMsg(message.decode('utf-8', 'replace'))
+            tag = rsp.get_tag(EXCRYPT_ECHO_TAG)
+            with self.lock:
+                if tag:
+                    req = self.pending.pop(tag, None)
+                    if req:
+                        self.timeouts = 0
+                    else:
+                        # Late response to an abandoned request
+                        self.abandoned.discard(tag)
+                elif len(self.pending) == 1 and not self.abandoned and not self.unmatched:
+                    # No echo tag, but there is only one request it can answer
+                    req = self.pending.popitem()[1]
+                else:
+                    # The server doesn't echo tags, send it one request at a time
+                    req = None
+                    self.unmatched = True
+                    self.window = 1
+            if req:
+                req.resolve(result=rsp)
+        return len(messages)
+
+class ExcryptPool(object):
+    """ Per-process persistent connections to the Excrypt server sockets """
+    lock = threading.Lock()
+    pid = None
+    channels = {}
+
+    @classmethod
+    def channel(cls, path) -> ExcryptChannel:
+        """
+        Get the least busy connection to a server socket, opening another
+        one while all of them are busy and the pool isn't full
+
+        Args:
+            path: The server socket file
+        Returns:
+            ExcryptChannel
+        """
+        with cls.lock:
+            # uWSGI forks workers after import, connections and threads don't carry over
+            if cls.pid != os.getpid():
+                cls.pid = os.getpid()
+                cls.channels = {}
+            channels = cls.channels.setdefault(path, [])
+            channel = min(channels, key=ExcryptChannel.load, default=None)
+            if channel is None or (channel.load() and len(channels) < EXCRYPT_POOL_SIZE):
+                channel = ExcryptChannel(path)
+                channels.append(channel)
+            return channel
+
+    @classmethod
+    def close(cls):
+        """ Close every connection owned by this process """
+        with cls.lock:
+            if cls.pid != os.getpid():
+                return
+            for channels in cls.channels.values():
+                for channel in channels:
+                    channel.close()
+            cls.channels = {}
+            cls.pid = None
+
+atexit.register(ExcryptPool.close)
+
+class ServerConn(object):
+    def __init__(self, timeout = None, sockfile = None):
+        # Seconds to wait for a response, defaults to EXCRYPT_TIMEOUT
+        self.timeout = timeout
+        # Server socket file, defaults to the one for the current request's client
+        self.sockfile = sockfile
 
     @staticmethod
     def get_sockfile(client = False):
-        directory = '/var/run/fx/sockets/server/'
+        directory = SOCKET_DIR
         if client:
             socketfile = 'rest_client.sock' if is_api_user() else 'web_client.sock'
         else:
             socketfile = 'rest_hapi.sock' if is_api_user() else 'web_hapi.sock'
         return directory + socketfile
 
-    async def send_excrypt(self, msg, verbose = False):
+    async def send_excrypt(self, msg, verbose = False, timeout = None):
 
-        # Serialize
-        out_data = str(msg)
+        # Serialize, the echo tag is used to match the response
+        request = ExcryptMsg(str(msg))
+        echo = request.tags.pop(EXCRYPT_ECHO_TAG, None)
+        out_data = str(request)
 
         # Print debug
         if verbose:
             print("Send: {}".format(out_data))
 
-        # Open connection to socket
-        reader, writer = await asyncio.open_unix_connection(ServerConn.get_sockfile())
-
-        # Lazily forcing everything to get sent at once or fail
-        sent = writer.write(out_data.encode('utf-8'))
-        await writer.drain()
+        if timeout is None:
+            timeout = self.timeout if self.timeout is not None else EXCRYPT_TIMEOUT
 
-        # hardcode 2 second timeout
-        in_data = ""
-        complete = False
-        try:
-            in_data, complete = await asyncio.wait_for(self.read_response(reader), timeout=2)
-        except asyncio.TimeoutError as e:
-            pass
-        finally:
-            writer.close()
-            await writer.wait_closed()
+        # Send over a pooled connection to the socket
+        channel = ExcryptPool.channel(self.sockfile or ServerConn.get_sockfile())
+        rsp = await channel.request(out_data, timeout)
 
-        # Did we get a response?
-        if not complete:
-            raise RuntimeError("Timeout waiting for Excrypt response from server.")
+        # Hand back the caller's own echo tag
+        rsp.tags.pop(EXCRYPT_ECHO_TAG, None)
+        if echo is not None:
+            rsp.tags[EXCRYPT_ECHO_TAG] = echo
 
         # Print debug
         if verbose:
-            print("Recv: {}".format(in_data))
+            print("Recv: {}".format(rsp))
 
-        return ExcryptMsg(in_data)
+        return rsp
 
+    @staticmethod
+    def close():
+        """ Close all pooled server connections for this process """
+        ExcryptPool.close()
@@ -17,6 +17,8 @@ class AuthSession():
         self.unexpired = []
         self.last_user = None
         self.perms = []
+        # The perms as a set, for checking them
+        self.perm_set = frozenset()
         self.auth_perms = []
         self.service_perms = []
         self.roles = []
@@ -50,6 +52,27 @@ class AuthSession():
     def get_perms(self):
         return self.perms
 
+    def has_perm(self, perm):
+        return perm in self.perm_set
+
+    def has_all(self, perms):
+        """
+        Checks the session has every one of the permissions
+
+        Args:
+            perms: Iterable of permission strings
+        """
+        return self.perm_set.issuperset(perms)
+
+    def has_any(self, perms):
+        """
+        Checks the session has at least one of the permissions
+
+        Args:
+            perms: Iterable of permission strings
+        """
+        return not self.perm_set.isdisjoint(perms)
+
     def get_token(self):
         return self.token
 
@@ -143,11 +166,14 @@ class AuthSession():
         self.hardened = role['hardened'] if role['hardened'] else self.hardened
         self.management = role['management'] if role['management'] else self.management
         # Combine perms
+        perm_set = set(self.perm_set)
         for perm in role['perms']:
-            if perm not in self.perms:
+            if perm not in perm_set:
+                perm_set.add(perm)
                 self.perms.append(perm)
                 if role['id'] > 0:
                     self.auth_perms.append(perm)
+        self.perm_set = frozenset(perm_set)
         for service in role['services']:
             if service not in self.service_perms:
                 self.service_perms.append(service)
@@ -361,6 +387,7 @@ class AuthSession():
         self.user_management = False
         self.fully_logged_in = False
         self.perms = []
+        self.perm_set = frozenset()
         self.auth_perms = []
         self.service_perms = []
         self.roles = []
@@ -504,6 +531,7 @@ class AuthSession():
         self.unexpired = serial['unexpired']
         self.last_user = serial['last_user']
         self.perms = serial['perms']
+        self.perm_set = frozenset(self.perms)
         self.auth_perms = serial['auth_perms']
         self.service_perms = serial['service_perms']
         self.roles = serial['roles']
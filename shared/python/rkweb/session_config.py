@@ -1,4 +1,5 @@
 from flask_session import Session
+from rkweb.session_store import HotFileSystemSessionInterface
 from datetime import timedelta
 
 def get_session_config():
@@ -14,6 +15,10 @@ def get_session_config():
         'SESSION_FILE_MODE': 0o600,
         'SESSION_PERMANENT': True,
         'PERMANENT_SESSION_LIFETIME': timedelta(minutes = 99),
+        # Sessions each worker keeps in memory in front of the files
+        'SESSION_HOT_TIER_SIZE': 20 * 1000,
+        # Seconds an unchanged session or a new last access time may wait to be written
+        'SESSION_WRITE_BEHIND': 30,
     }
 
 def get_session_key():
@@ -33,6 +38,7 @@ def init_session_config(app):
     # Flask sessions
     app.sess = Session()
     app.sess.init_app(app)
+    app.session_interface = HotFileSystemSessionInterface.from_config(app.config)
 
     # Static key all of the apps will share
     app.secret_key = get_session_key()
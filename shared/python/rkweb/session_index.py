@@ -0,0 +1,125 @@
+import os
+import heapq
+import itertools
+
+class SessionIndex(object):
+    """
+    Index of the session files in the session directory, ordered by when each
+    session next needs attention.
+
+    Sessions are written by replacing their file, so a file whose inode is
+    unchanged was not written. Each scan only reads the directory entries and
+    loads the files that are new or replaced since the last one; everything
+    else is served from a min-heap of due times. Due times only ever move
+    later, so a missed change only makes a session due early, where the
+    caller loads it again anyway.
+    """
+    def __init__(self, cache_dir):
+        """
+        Args:
+            cache_dir: The session directory
+        """
+        self.cache_dir = cache_dir
+        # sid -> [inode, heap sequence number or None]
+        self.entries = {}
+        # (due, sequence number, sid)
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def scan(self, load, forget = None):
+        """
+        Pick up session files that were added, changed or removed
+
+        Args:
+            load: Called with the sid of each new or changed session, returns
+                  when the session is due or None if it never is
+            forget: Called with the sid of each removed session
+        Returns:
+            Number of sessions loaded
+        """
+        seen = set()
+        loaded = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    try:
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    sid = entry.name
+                    version = entry.inode()
+                    seen.add(sid)
+
+                    current = self.entries.get(sid)
+                    if current is not None and current[0] == version:
+                        continue
+                    loaded += 1
+                    self.entries[sid] = [version, None]
+                    self.schedule(sid, load(sid))
+        except OSError:
+            return loaded
+
+        for sid in self.entries.keys() - seen:
+            del self.entries[sid]
+            if forget:
+                forget(sid)
+        return loaded
+
+    def schedule(self, sid, due):
+        """
+        Set when a session is next due, replacing its previous due time
+
+        Args:
+            sid: Session file name
+            due: When the session is due, None if it never is
+        """
+        entry = self.entries.get(sid)
+        if entry is None:
+            return
+        if due is None:
+            entry[1] = None
+            return
+        entry[1] = next(self.counter)
+        heapq.heappush(self.heap, (due, entry[1], sid))
+
+        # Superseded due times are only dropped once they reach the top
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [item for item in self.heap if self.entries.get(item[2], (None, None))[1] == item[1]]
+            heapq.heapify(self.heap)
+
+    def next_due(self):
+        """ When the soonest session is due, None if none are """
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """
+        Take all sessions due by now. They are not due again until they are
+        scheduled again or their file changes.
+
+        Args:
+            now: The current time
+        Returns:
+            List of sids
+        """
+        due = []
+        while True:
+            self._drop_stale()
+            if not self.heap or self.heap[0][0] > now:
+                return due
+            _, _, sid = heapq.heappop(self.heap)
+            self.entries[sid][1] = None
+            due.append(sid)
+
+    def _drop_stale(self):
+        heap = self.heap
+        while heap:
+            _, seq, sid = heap[0]
+            entry = self.entries.get(sid)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(heap)
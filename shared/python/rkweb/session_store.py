@@ -0,0 +1,266 @@
+import os
+import time
+import atexit
+import pickle
+import threading
+import collections
+
+from cachelib.base import BaseCache
+from cachelib.file import FileSystemCache
+from flask_session.sessions import FileSystemSessionInterface
+
+# Number of sessions each process keeps in memory
+SESSION_HOT_TIER_SIZE = 20 * 1000
+# Seconds a session may go without its file being rewritten when only
+# coalesced fields changed (or nothing did)
+SESSION_WRITE_BEHIND = 30
+# Session fields whose changes alone are written behind, as (key, field)
+SESSION_COALESCED_FIELDS = (('auth', 'last_access'), ('desktop', 'last_access'))
+
+class HotSession(object):
+    """ A session held in memory along with the version of its file """
+    __slots__ = ('blob', 'version', 'timeout', 'written', 'trusted_until', 'dirty')
+
+    def __init__(self, blob, version, timeout, trusted_until):
+        self.blob = blob
+        self.version = version
+        self.timeout = timeout
+        self.written = time.monotonic()
+        self.trusted_until = trusted_until
+        self.dirty = False
+
+class HotFileSystemCache(FileSystemCache):
+    """
+    FileSystemCache with an in-process LRU hot tier in front of the files.
+
+    Reads are served from memory as long as the session file still has the
+    inode and mtime it had when it was last read or written here, so writes
+    from the other uWSGI workers, the other apps sharing the session directory,
+    token-refresh and prune-rd are always seen. Writes that do not change the
+    session, or only change coalesced fields such as the last access time, are
+    kept in memory and written behind at most every write_behind seconds.
+    Everything else is written through immediately.
+    """
+    def __init__(self, cache_dir, threshold = 500, default_timeout = 300, mode = 0o600,
+                 hot_size = SESSION_HOT_TIER_SIZE, write_behind = SESSION_WRITE_BEHIND,
+                 coalesced = SESSION_COALESCED_FIELDS):
+        """
+        Args:
+            cache_dir: Directory holding the session files
+            threshold: Maximum number of session files
+            default_timeout: Default session lifetime in seconds
+            mode: File mode of the session files
+            hot_size: Number of sessions to keep in memory
+            write_behind: Seconds coalesced updates may be held back
+            coalesced: (key, field) pairs whose changes alone are written behind
+        """
+        super().__init__(cache_dir, threshold = threshold, default_timeout = default_timeout, mode = mode)
+        self.hot_size = hot_size
+        self.write_behind = write_behind
+        self.coalesced = coalesced
+        self.lock = threading.Lock()
+        self._reset()
+        atexit.register(self.flush, force = True)
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.hot = collections.OrderedDict()
+        self.dirty = set()
+        self.flusher = None
+
+    def _check_fork(self):
+        # Sessions held by the parent must not be written behind twice
+        if self.pid != os.getpid():
+            self.lock = threading.Lock()
+            self._reset()
+
+    def _version(self, filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _seconds(self, timeout):
+        """ Session lifetime in seconds, 0 if it never expires """
+        return BaseCache._normalize_timeout(self, timeout)
+
+    def _expires(self, seconds):
+        return time.time() + seconds if seconds else float('inf')
+
+    def _masked(self, value):
+        """ The session without its coalesced fields """
+        if not isinstance(value, dict):
+            return value
+        masked = None
+        for key, field in self.coalesced:
+            inner = value.get(key)
+            if isinstance(inner, dict) and field in inner:
+                if masked is None:
+                    masked = dict(value)
+                masked[key] = {k: v for k, v in inner.items() if k != field}
+        return value if masked is None else masked
+
+    def _drop(self, key):
+        self.hot.pop(key, None)
+        self.dirty.discard(key)
+
+    def _store(self, key, entry):
+        """ Insert an entry, evicting the least recently used ones """
+        evicted = []
+        with self.lock:
+            self.hot[key] = entry
+            self.hot.move_to_end(key)
+            while len(self.hot) > self.hot_size:
+                old_key, old = self.hot.popitem(last = False)
+                if old.dirty:
+                    self.dirty.discard(old_key)
+                    evicted.append((old_key, old))
+        for old_key, old in evicted:
+            self._write_behind(old_key, old)
+
+    def get(self, key):
+        if key == self._fs_count_file:
+            return super().get(key)
+        self._check_fork()
+
+        filename = self._get_filename(key)
+        version = self._version(filename)
+        with self.lock:
+            if version is None:
+                self._drop(key)
+                return None
+            entry = self.hot.get(key)
+            if entry is not None:
+                if entry.version == version and time.time() < entry.trusted_until:
+                    self.hot.move_to_end(key)
+                    return pickle.loads(entry.blob)
+                # Changed by another process, which wins over anything held back here
+                self._drop(key)
+
+        value = super().get(key)
+        if value is None:
+            return None
+        # The file may have been replaced while it was read
+        if self._version(filename) == version:
+            # The file's own expiry is unknown, check it again after a while
+            self._store(key, HotSession(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), version,
+                                        self._seconds(None), time.time() + self.write_behind))
+        return value
+
+    def set(self, key, value, timeout = None, mgmt_element = False):
+        if mgmt_element or key == self._fs_count_file:
+            return super().set(key, value, timeout = timeout, mgmt_element = mgmt_element)
+        self._check_fork()
+
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        timeout = self._seconds(timeout)
+        with self.lock:
+            entry = self.hot.get(key)
+            if entry is not None and self.write_behind > 0 and \
+                    (blob == entry.blob or self._masked(value) == self._masked(pickle.loads(entry.blob))):
+                entry.blob = blob
+                entry.timeout = timeout
+                entry.trusted_until = self._expires(timeout)
+                self.hot.move_to_end(key)
+                if not entry.dirty:
+                    entry.dirty = True
+                    self.dirty.add(key)
+                self._start_flusher()
+                return True
+
+        return self._write_through(key, value, blob, timeout)
+
+    def _write_through(self, key, value, blob, timeout):
+        if not super().set(key, value, timeout = timeout):
+            with self.lock:
+                self._drop(key)
+            return False
+        version = self._version(self._get_filename(key))
+        if version is not None:
+            self._store(key, HotSession(blob, version, timeout, self._expires(timeout)))
+        return True
+
+    def delete(self, key, mgmt_element = False):
+        if not mgmt_element:
+            self._check_fork()
+            with self.lock:
+                self._drop(key)
+        return super().delete(key, mgmt_element = mgmt_element)
+
+    def clear(self):
+        with self.lock:
+            self._reset()
+        return super().clear()
+
+    def _write_behind(self, key, entry):
+        """ Write a held back session unless its file changed in the meantime """
+        filename = self._get_filename(key)
+        if self._version(filename) != entry.version:
+            # Replaced or removed by another process, whose write wins
+            with self.lock:
+                if self.hot.get(key) is entry:
+                    self._drop(key)
+            return
+        value = pickle.loads(entry.blob)
+        blob = entry.blob
+        if not super().set(key, value, timeout = entry.timeout):
+            return
+        version = self._version(filename)
+        with self.lock:
+            # Only update the entry if the session did not change while writing
+            if self.hot.get(key) is entry and entry.blob is blob:
+                entry.version = version
+                entry.written = time.monotonic()
+                entry.dirty = False
+                self.dirty.discard(key)
+
+    def flush(self, force = False):
+        """
+        Write held back sessions
+
+        Args:
+            force: Write all of them, not just the ones due
+        """
+        if self.pid != os.getpid():
+            return
+        now = time.monotonic()
+        with self.lock:
+            due = [(key, self.hot[key]) for key in self.dirty
+                   if force or now - self.hot[key].written >= self.write_behind]
+        for key, entry in due:
+            try:
+                self._write_behind(key, entry)
+            except Exception as e:
+                print("Failed to write session: {}".format(e))
+
+    def _start_flusher(self):
+        # Called with the lock held
+        if self.flusher is None:
+            self.flusher = threading.Thread(target = self._run_flusher, daemon = True)
+            self.flusher.start()
+
+    def _run_flusher(self):
+        interval = max(1, self.write_behind / 6)
+        while True:
+            time.sleep(interval)
+            if self.pid != os.getpid():
+                return
+            self.flush()
+
+class HotFileSystemSessionInterface(FileSystemSessionInterface):
+    """ flask_session's filesystem sessions backed by HotFileSystemCache """
+    def __init__(self, cache_dir, threshold, mode, key_prefix, use_signer = False, permanent = True,
+                 hot_size = SESSION_HOT_TIER_SIZE, write_behind = SESSION_WRITE_BEHIND):
+        super().__init__(cache_dir, threshold, mode, key_prefix, use_signer = use_signer, permanent = permanent)
+        self.cache = HotFileSystemCache(cache_dir, threshold = threshold, mode = mode,
+                                        hot_size = hot_size, write_behind = write_behind)
+
+    @staticmethod
+    def from_config(config):
+        return HotFileSystemSessionInterface(
+            config['SESSION_FILE_DIR'], config['SESSION_FILE_THRESHOLD'], config['SESSION_FILE_MODE'],
+            config['SESSION_KEY_PREFIX'], use_signer = config['SESSION_USE_SIGNER'],
+            permanent = config['SESSION_PERMANENT'],
+            hot_size = config.get('SESSION_HOT_TIER_SIZE', SESSION_HOT_TIER_SIZE),
+            write_behind = config.get('SESSION_WRITE_BEHIND', SESSION_WRITE_BEHIND))
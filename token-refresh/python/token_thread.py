@@ -10,9 +10,15 @@ from flask_session.sessions import FileSystemSession
 from rkweb.ipc import IpcUtils
 from rkweb.session import AuthSession
 from rkweb.session_config import get_session_config
+from rkweb.session_index import SessionIndex
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+# Token refreshes sent to the auth service at once
+REFRESH_CONCURRENCY = 32
+# Seconds before a session whose refresh failed is tried again
+REFRESH_RETRY = 2
+
 # Attempt to assume www-data
 try:
     import grp
@@ -56,6 +62,9 @@ class TokenThread(object):
 
         self.cache._get_filename = get_cache_filename
 
+        # Sessions by when their token needs refreshing or they expire
+        self.index = SessionIndex(self.cache_dir)
+
     def stop(self) -> None:
         self.running = False
 
@@ -93,41 +102,24 @@ class TokenThread(object):
         self.shutdown()
 
     def refresh_tokens(self):
-        min_refresh = None
-
-        # Get all sessions in cache dir
-        sessions = []
+        # Pick up new and changed sessions
         try:
-            sessions = [f for f in os.listdir(self.cache_dir) if os.path.isfile(os.path.join(self.cache_dir, f))]
+            changed = self.index.scan(self.session_due)
+            debug(str(changed) + " sessions loaded, " + str(len(self.index)) + " indexed")
         except Exception as e:
             debug(e)
-        debug(sessions)
 
-        # Check each session
+        # Check the sessions that are due
+        now = datetime.datetime.utcnow()
         requests = []
-        for sid in sessions:
-            # Get session
+        for sid in self.index.pop_due(now):
             debug("SID: " + sid)
-            try:
-                data = self.cache.get(key=sid)
-            except Exception as e:
-                debug(e)
-                continue
-            try:
-                web_session = FileSystemSession(data, sid=sid)
-            except Exception as e:
-                debug(e)
-                continue
-
-            try:
-                session = AuthSession()
-                session.from_dict(web_session['auth'])
-            except Exception as e:
-                debug(e)
+            loaded = self.load_session(sid)
+            if loaded is None:
+                # Not due again until its file changes, try again in case it was unreadable for a moment
+                self.index.schedule(sid, now + datetime.timedelta(seconds = REFRESH_RETRY))
                 continue
-
-            now = datetime.datetime.utcnow()
-            refresh_starts = (session.token_expiration - TokenThread.refresh_window())
+            web_session, session = loaded
 
             debug("TOKEN: " + str(session.get_token()))
             debug("EXPIRES: " + str(session.token_expiration))
@@ -140,21 +132,52 @@ class TokenThread(object):
             elif (session.token_expiration + TokenThread.leeway()) < now:
                 self.expire_session(sid)
             # Token is within renewal threshold
-            elif refresh_starts < now:
+            elif (session.token_expiration - TokenThread.refresh_window()) < now:
                 requests.append(self.refresh_token(sid, web_session, session))
-            # Record soonest to come, but not yet here token refresh times
-            elif not min_refresh or refresh_starts < min_refresh:
-                min_refresh = refresh_starts
+                # Saving the new token reschedules the session, try again if it isn't
+                self.index.schedule(sid, now + datetime.timedelta(seconds = REFRESH_RETRY))
+            else:
+                self.index.schedule(sid, self.due(session))
 
         # Process token updates
         debug(str(len(requests)) + " async to perform")
         if len(requests) > 0:
             try:
-                asyncio.get_event_loop().run_until_complete(asyncio.wait(requests, return_when=asyncio.ALL_COMPLETED))
+                asyncio.get_event_loop().run_until_complete(self.run_limited(requests))
             except Exception as e:
                 debug(e)
 
-        return min_refresh
+        return self.index.next_due()
+
+    async def run_limited(self, requests):
+        limit = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def run(request):
+            async with limit:
+                await request
+
+        await asyncio.gather(*[run(r) for r in requests], return_exceptions=True)
+
+    def load_session(self, sid):
+        """ Returns (web_session, session) of a session file, or None """
+        try:
+            data = self.cache.get(key=sid)
+            web_session = FileSystemSession(data, sid=sid)
+            session = AuthSession()
+            session.from_dict(web_session['auth'])
+        except Exception as e:
+            debug(e)
+            return None
+        return web_session, session
+
+    def due(self, session):
+        """ When a session needs its token refreshed or expires """
+        return min(session.last_access + self.session_lifetime,
+                   session.token_expiration - TokenThread.refresh_window())
+
+    def session_due(self, sid):
+        loaded = self.load_session(sid)
+        return self.due(loaded[1]) if loaded else None
 
     def save_session(self, sid, web_session, session) -> None:
         try: